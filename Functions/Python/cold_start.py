@@ -0,0 +1,231 @@
+"""Created By: Andrew Ryan DeFilippis"""
+
+import argparse
+import ast
+import os
+import subprocess
+import sys
+from json import dumps
+
+# Define the init time budget of each Function in milliseconds, checked by "python cold_start.py --check".  The
+# budgets leave room for slower machines, and only catch init work that grows well beyond what it is today.
+DEFAULT_BUDGETS_MS = {
+    'template': 50,
+    'echo': 50,
+    'echo_apigw_lambda_proxy': 50,
+    'roll_the_dice': 50,
+    'ses_inbound_forwarder': 600,
+    'url_shortening_service': 100
+}
+
+# Executed in a new Python process with "-X importtime", so that nothing is imported already, as in a new container.
+# The top-level statements of 'lambda_function.py' are executed one at a time, as the init steps of the Function.
+# The profiler only uses 'sys', 'os', and 'time', which are imported by Python at startup or built in, so that the
+# imports of the Function are neither made by the profiler first nor reported for it.  STATEMENTS and PATH are
+# defined above it by 'profile'.
+PROFILER = r'''
+import os
+import sys
+import time
+
+imported = sorted(sys.modules)
+
+with open(PATH, 'r') as f:
+    lines = f.read().splitlines(True)
+
+module = type(sys)('lambda_function')
+module.__file__ = PATH
+sys.modules['lambda_function'] = module
+steps = []
+stdout = sys.stdout
+sys.stdout = open(os.devnull, 'w')
+
+try:
+    for start, end in STATEMENTS:
+        code = compile('\n' * (start - 1) + ''.join(lines[start - 1:end]), PATH, 'exec')
+        started = time.perf_counter()
+        exec(code, module.__dict__)
+        elapsed = time.perf_counter() - started
+        steps.append({'line': start, 'statement': lines[start - 1].rstrip(), 'ms': elapsed * 1000})
+finally:
+    sys.stdout.close()
+    sys.stdout = stdout
+
+print(repr({'imported': imported, 'steps': steps}))
+'''
+
+
+def init_statements(path):
+    # type: (str) -> list
+    """Find the top-level statements of a Function, which are its init steps.
+
+    :param path: Path of the Function's 'lambda_function.py'
+    :return: List of the first and last line of each statement, including the decorators of functions and classes
+    """
+
+    with open(path, 'r') as f:
+        nodes = ast.parse(f.read(), path).body
+
+    return [
+        (min([node.lineno] + [decorator.lineno for decorator in getattr(node, 'decorator_list', [])]), node.end_lineno)
+        for node in nodes
+    ]
+
+
+def parse_importtime(stderr, imported=()):
+    # type: (str, iter) -> list
+    """Parse the output of "python -X importtime" into the modules imported, excluding those already imported.
+
+    :param stderr: Output of "python -X importtime"
+    :param imported: Names of the modules imported before the Function
+    :return: List of the modules imported, with their depth, and self and cumulative import times in milliseconds
+    """
+
+    imported = set(imported)
+    imports = []
+
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'imported package' in line:
+            continue
+
+        self_us, cumulative_us, name = line[len('import time:'):].split('|', 2)
+        module_name = name.strip()
+
+        if module_name in imported:
+            continue
+
+        imports.append({
+            'module': module_name,
+            'depth': (len(name) - len(name.lstrip()) - 1) // 2,
+            'self_ms': int(self_us) / 1000,
+            'cumulative_ms': int(cumulative_us) / 1000
+        })
+
+    return imports
+
+
+def profile(function_dir):
+    # type: (str) -> dict
+    """Profile the cold start of a Function in a new Python process.
+
+    :param function_dir: Directory of the Function
+    :return: The init steps and imports of the Function, with their times in milliseconds
+    """
+
+    env = dict(os.environ)
+    env.setdefault('AWS_DEFAULT_REGION', 'us-west-2')  # Required by boto3 clients created at import
+
+    path = os.path.abspath(os.path.join(function_dir, 'lambda_function.py'))
+    profiler = 'PATH = {!r}\nSTATEMENTS = {!r}\n{}'.format(path, init_statements(path), PROFILER)
+
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', profiler],
+        cwd=function_dir,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        universal_newlines=True
+    )
+
+    if process.returncode != 0:
+        raise RuntimeError('Profiling {} failed: {}'.format(function_dir, process.stderr.strip().splitlines()[-1]))
+
+    result = ast.literal_eval(process.stdout.strip().splitlines()[-1])
+
+    return {
+        'init_ms': sum(step['ms'] for step in result['steps']),
+        'steps': result['steps'],
+        'imports': parse_importtime(process.stderr, result['imported'])
+    }
+
+
+def report(function_dir, repeat=1, top=10, budget_ms=None):
+    # type: (str, int, int, float) -> dict
+    """Build the cold start report of a Function, from the fastest of a number of profiles.
+
+    :param function_dir: Directory of the Function
+    :param repeat: Number of profiles, of which the fastest is reported (default 1)
+    :param top: Number of the slowest init steps and top-level imports reported (default 10)
+    :param budget_ms: Init time budget in milliseconds, or None (default None)
+    :return: Report of the cold start
+    """
+
+    fastest = min((profile(function_dir) for _ in range(repeat)), key=lambda result: result['init_ms'])
+    function_report = {
+        'function': os.path.basename(os.path.abspath(function_dir)),
+        'init_ms': round(fastest['init_ms'], 3),
+        'steps': [
+            dict(step, ms=round(step['ms'], 3))
+            for step in sorted(fastest['steps'], key=lambda step: step['ms'], reverse=True)[:top]
+        ],
+        'imports': sorted(
+            (module for module in fastest['imports'] if module['depth'] == 0),
+            key=lambda module: module['cumulative_ms'],
+            reverse=True
+        )[:top]
+    }
+
+    if budget_ms is not None:
+        function_report['budget_ms'] = budget_ms
+        function_report['over_budget'] = fastest['init_ms'] > budget_ms
+
+    return function_report
+
+
+def main(argv=None):
+    """Report the cold start of Functions from the command line.
+
+    :param argv: Command line arguments (default sys.argv)
+    :return: Exit status, 1 if a Function is over its budget
+    """
+
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    parser = argparse.ArgumentParser(description='Report where the cold start time of Functions goes.')
+    parser.add_argument('functions', nargs='*', help='Directories of the Functions (default: every Function)')
+    parser.add_argument('--check', action='store_true', help='Exit with status 1 if a Function is over its budget')
+    parser.add_argument('--budget-ms', type=float, help='Init time budget for every Function, overriding the defaults')
+    parser.add_argument('--repeat', type=int, default=3, help='Number of profiles, of which the fastest is reported')
+    parser.add_argument('--top', type=int, default=10, help='Number of the slowest steps and imports reported')
+    parser.add_argument('--json', action='store_true', help='Print each report as a single JSON log line')
+    args = parser.parse_args(argv)
+
+    functions = args.functions or [os.path.join(here, name) for name in sorted(DEFAULT_BUDGETS_MS)]
+    over_budget = []
+
+    for function_dir in functions:
+        name = os.path.basename(os.path.abspath(function_dir))
+        budget_ms = args.budget_ms if args.budget_ms is not None else DEFAULT_BUDGETS_MS.get(name)
+        function_report = report(function_dir, args.repeat, args.top, budget_ms)
+
+        if function_report.get('over_budget'):
+            over_budget.append(name)
+
+        if args.json:
+            print('COLDSTART {}'.format(dumps(function_report)))
+            continue
+
+        print('{}: init {:.1f} ms{}'.format(
+            name,
+            function_report['init_ms'],
+            '' if budget_ms is None else ' (budget {:.0f} ms{})'.format(
+                budget_ms,
+                ', OVER BUDGET' if function_report['over_budget'] else ''
+            )
+        ))
+
+        for step in function_report['steps']:
+            print('  {:>9.3f} ms  line {:<5} {}'.format(step['ms'], step['line'], step['statement'][:80]))
+
+        for module in function_report['imports']:
+            print('  {:>9.3f} ms  import {}'.format(module['cumulative_ms'], module['module']))
+
+    if args.check and over_budget:
+        print('Over budget: {}'.format(', '.join(over_budget)), file=sys.stderr)
+        return 1
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
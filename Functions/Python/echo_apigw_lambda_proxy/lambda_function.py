@@ -3,38 +3,126 @@
 print('Lambda cold-start...')
 
 from json import dumps, loads
+from threading import Lock
 
 # Disable 'testing_locally' when deploying to AWS Lambda
 testing_locally = True
 verbose = True
 
+# Define the logging of events: DEBUG level events are only logged when 'verbose' is enabled, and
+# events are printed together once per invocation, or sooner when LOG_BUFFER_SIZE events are waiting
+LOG_LEVEL = 'DEBUG' if verbose else 'INFO'
+LOG_BUFFER_SIZE = 100
+
 
 class CWLogs(object):
     """Define the structure of log events to match all other CloudWatch Log Events logged by AWS Lambda.
     """
 
-    def __init__(self, context):
-        """Define the instance of the context object.
+    # Log levels, in increasing order of severity
+    LEVELS = {'DEBUG': 10, 'INFO': 20, 'ERROR': 40}
+
+    # Events waiting to be printed, shared by every instance as they share the same stdout stream
+    buffer = []
+    buffer_lock = Lock()
+
+    def __init__(self, context, level='INFO', buffer_size=0):
+        """Define the instance of the context object, the lowest level logged, and the size of the buffer.
 
         :param context: Lambda context object
+        :param level: Events below this level are neither formatted nor printed (default 'INFO')
+        :param buffer_size: Number of events held before they are printed together (default 0, unbuffered)
         """
 
         self.context = context
+        self.level = self.LEVELS[level]
+        self.buffer_size = int(buffer_size)
 
-    def event(self, message, event_prefix='LOG'):
-        # type: (any, str) -> None
+    def enabled(self, level):
+        # type: (str) -> bool
+        """Is an event of the specified level logged?
+
+        :param level: The level of the event (required)
+        :return: True if the event would be logged
+        """
+
+        return self.LEVELS[level] >= self.level
+
+    def event(self, message, *args, event_prefix='LOG', level='INFO'):
+        # type: (any, any, str, str) -> None
         """Print an event into the CloudWatch Logs stream for the Function's invocation.
 
-        :param message: The information to be logged (required)
+        The message is only rendered when the level is enabled, so a callable returning the message, or a
+        %-style format string with its arguments, defers any costly formatting until it is known to be needed.
+
+        :param message: The information to be logged, or a callable returning it (required)
+        :param args: Arguments for %-style formatting of the message
         :param event_prefix: The prefix that appears before the 'RequestId' (default 'LOG')
+        :param level: The level of the event (default 'INFO')
+        :return:
+        """
+
+        if self.LEVELS[level] < self.level:
+            return None
+
+        if callable(message):
+            message = message()
+
+        if args:
+            message = message % args
+
+        with self.buffer_lock:
+            self.buffer.append('{} RequestId: {}\t{}'.format(
+                event_prefix,
+                self.context.aws_request_id,
+                message
+            ))
+
+            full = len(self.buffer) >= self.buffer_size
+
+        if full:
+            self.flush()
+
+        return None
+
+    def debug(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event that is only needed for debugging.
+
+        :param message: The information to be logged, or a callable returning it (required)
+        :param args: Arguments for %-style formatting of the message
+        :return:
+        """
+
+        if self.level > self.LEVELS['DEBUG']:
+            return None
+
+        return self.event(message, *args, level='DEBUG')
+
+    def error(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event describing an error.
+
+        :param message: The information to be logged, or a callable returning it (required)
+        :param args: Arguments for %-style formatting of the message
         :return:
         """
 
-        print('{} RequestId: {}\t{}'.format(
-            event_prefix,
-            self.context.aws_request_id,
-            message
-        ))
+        return self.event(message, *args, level='ERROR')
+
+    def flush(self):
+        # type: () -> None
+        """Print all buffered events with a single write to stdout.
+
+        :return:
+        """
+
+        with self.buffer_lock:
+            lines = self.buffer[:]
+            del self.buffer[:]
+
+        if lines:
+            print('\n'.join(lines))
 
         return None
 
@@ -72,8 +160,7 @@ class APIGWProxy(object):
             response_object['isBase64Encoded'] = bool(body_is_base64_encoded)
 
         # Log the API Gateway Lambda Proxy response object
-        if verbose:
-            self.log.event('Response: {}'.format(dumps(response_object)))
+        self.log.debug(lambda: 'Response: {}'.format(dumps(response_object)))
 
         return response_object
 
@@ -87,24 +174,30 @@ def lambda_handler(event, context):
     """
 
     # Instantiate our CloudWatch logging class
-    log = CWLogs(context)
+    log = CWLogs(context, level=LOG_LEVEL, buffer_size=LOG_BUFFER_SIZE)
 
     # Instantiate our API Gateway Lambda Proxy class
     apigw = APIGWProxy(log)
 
-    # Log the event object provided to the Lambda Function at invocation
-    if verbose:
-        log.event('Event: {}'.format(dumps(event)))
+    # Serialize the event once, for both the log and the response body
+    event_json = dumps(event)
 
-    # Return a Lambda Proxy API response to API Gateway
-    return apigw.response(
-        status_code=200,
-        headers={
-            'Content-Type': 'application/json'
-        },
-        body=dumps(event),
-        body_is_base64_encoded=False
-    )
+    # Log the event object provided to the Lambda Function at invocation
+    log.debug('Event: %s', event_json)
+
+    try:
+        # Return a Lambda Proxy API response to API Gateway
+        return apigw.response(
+            status_code=200,
+            headers={
+                'Content-Type': 'application/json'
+            },
+            body=event_json,
+            body_is_base64_encoded=False
+        )
+    finally:
+        # Print the buffered log events once per invocation
+        log.flush()
 
 
 def local_test():
@@ -121,5 +214,5 @@ def local_test():
     lambda_handler(event, context)
 
 
-if testing_locally is True:
+if testing_locally and __name__ == '__main__':
     local_test()
@@ -0,0 +1,265 @@
+"""Created By: Andrew Ryan DeFilippis"""
+
+import argparse
+import contextlib
+import importlib.util
+import itertools
+import os
+import sys
+import threading
+import time
+from json import dumps, loads
+from random import randrange
+from uuid import uuid4 as uuid
+
+
+class LocalContext(object):
+    """An emulated AWS Lambda Python Context Object, following the model of each Function's 'context.py', with a new
+    request ID for every invocation.
+    """
+
+    def __init__(self, function_name, timeout=3, memory_limit_in_mb=128):
+        """Define the context of a single invocation.
+
+        :param function_name: Name of the Function being invoked
+        :param timeout: Number of seconds before the invocation would time out (default 3)
+        :param memory_limit_in_mb: Memory configured for the Function (default 128)
+        """
+
+        self.aws_request_id = str(uuid())
+        self.function_name = function_name
+        self.function_version = '$LATEST'
+        self.invoked_function_arn = 'arn:aws:lambda:us-west-2:123412341234:function:{}'.format(function_name)
+        self.memory_limit_in_mb = str(memory_limit_in_mb)
+        self.log_group_name = '/aws/lambda/{}'.format(function_name)
+        self.log_stream_name = '2016/12/15/[$LATEST]{}'.format(('%032x' % randrange(16 ** 32))[:32])
+        self.identity = None
+        self.client_context = None
+        self.deadline = time.perf_counter() + timeout
+
+    def get_remaining_time_in_millis(self):
+        # type: () -> int
+        """Number of milliseconds before the invocation would time out.
+
+        :return: Remaining time in milliseconds
+        """
+
+        return max(0, int((self.deadline - time.perf_counter()) * 1000))
+
+
+def load_function(function_dir, module_name):
+    # type: (str, str) -> object
+    """Import the 'lambda_function.py' of a Function as a new module, as a new container would.
+
+    The Functions only run their 'local_test' when executed directly, so importing one has no side effects other than
+    its own initialization code.
+
+    :param function_dir: Directory of the Function
+    :param module_name: Unique name of the module, so that every container has its own module state
+    :return: The imported module
+    """
+
+    spec = importlib.util.spec_from_file_location(module_name, os.path.join(function_dir, 'lambda_function.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+
+def load_events(paths):
+    # type: (list) -> list
+    """Load the events from JSON files, holding an event or a list of events, or JSONL files, holding an event per
+    line.  A path of '-' reads JSONL from stdin.
+
+    :param paths: Paths of the event files
+    :return: List of events
+    """
+
+    events = []
+
+    for path in paths:
+        if path == '-':
+            lines = sys.stdin.read().splitlines()
+        elif path.endswith('.jsonl'):
+            with open(path, 'r') as f:
+                lines = f.read().splitlines()
+        else:
+            with open(path, 'r') as f:
+                document = loads(f.read())
+
+            events.extend(document if isinstance(document, list) else [document])
+            continue
+
+        events.extend(loads(line) for line in lines if line.strip())
+
+    return events
+
+
+def percentile(values, percent):
+    # type: (list, float) -> float
+    """Nearest-rank percentile of sorted values.
+
+    :param values: Sorted values
+    :param percent: Percentile from 0 to 100
+    :return: The value at the percentile, or None if there are no values
+    """
+
+    if not values:
+        return None
+
+    return values[max(0, -(-len(values) * percent // 100) - 1)]
+
+
+def run(function_dir, events, invocations=100, concurrency=1, timeout=3):
+    # type: (str, list, int, int, int) -> dict
+    """Replay the events against a Function, with a container per concurrent invocation.
+
+    Each container is a separate import of the Function's module, and invokes 'lambda_handler' one event at a time,
+    as AWS Lambda does.  The first import of a Function also imports its dependencies, so it is reported as the cold
+    start, while the other containers share the dependencies that are already imported.
+
+    :param function_dir: Directory of the Function
+    :param events: Events to replay, in order and repeated until there have been enough invocations
+    :param invocations: Total number of invocations (default 100)
+    :param concurrency: Number of containers invoked at once (default 1)
+    :param timeout: Number of seconds before an invocation would time out (default 3)
+    :return: Report of the latencies, throughput, and cold start of the Function
+    """
+
+    function_dir = os.path.abspath(function_dir)
+    function_name = os.path.basename(function_dir)
+
+    # The Functions import 'context' and their own modules relative to their directory
+    if function_dir not in sys.path:
+        sys.path.insert(0, function_dir)
+
+    init_times = []
+    containers = []
+
+    for number in range(concurrency):
+        start = time.perf_counter()
+        containers.append(load_function(function_dir, 'lambda_function_{}'.format(number)))
+        init_times.append(time.perf_counter() - start)
+
+    event_queue = itertools.islice(itertools.cycle(events), invocations)
+    event_lock = threading.Lock()
+    first_times = []
+    warm_times = []
+    errors = []
+    results_lock = threading.Lock()
+
+    def invoke(container):
+        first = True
+
+        while True:
+            with event_lock:
+                event = next(event_queue, None)
+
+            if event is None:
+                return
+
+            error = None
+            start = time.perf_counter()
+
+            try:
+                container.lambda_handler(event, LocalContext(function_name, timeout))
+            except Exception as e:
+                error = '{}: {}'.format(type(e).__name__, e)
+
+            elapsed = time.perf_counter() - start
+
+            with results_lock:
+                (first_times if first else warm_times).append(elapsed)
+
+                if error is not None:
+                    errors.append(error)
+
+            first = False
+
+    threads = [threading.Thread(target=invoke, args=(container,)) for container in containers]
+    start = time.perf_counter()
+
+    for thread in threads:
+        thread.start()
+
+    for thread in threads:
+        thread.join()
+
+    wall_time = time.perf_counter() - start
+    all_times = sorted(first_times + warm_times)
+    warm_times.sort()
+
+    def milliseconds(seconds):
+        return None if seconds is None else round(seconds * 1000, 3)
+
+    return {
+        'function': function_name,
+        'invocations': len(all_times),
+        'concurrency': concurrency,
+        'errors': len(errors),
+        'error_samples': sorted(set(errors))[:5],
+        'throughput_per_second': round(len(all_times) / wall_time, 1) if wall_time else None,
+        'latency_ms': {
+            'p50': milliseconds(percentile(all_times, 50)),
+            'p95': milliseconds(percentile(all_times, 95)),
+            'p99': milliseconds(percentile(all_times, 99)),
+            'max': milliseconds(all_times[-1] if all_times else None)
+        },
+        'cold_start_ms': {
+            'init': milliseconds(init_times[0]),
+            'first_invocation': milliseconds(first_times[0] if first_times else None),
+            'other_containers_init': milliseconds(sum(init_times[1:]) / len(init_times[1:]) if init_times[1:] else None)
+        },
+        'warm_ms': {
+            'p50': milliseconds(percentile(warm_times, 50)),
+            'p95': milliseconds(percentile(warm_times, 95)),
+            'p99': milliseconds(percentile(warm_times, 99))
+        }
+    }
+
+
+def main(argv=None):
+    """Run a Function from the command line, and print its report.
+
+    :param argv: Command line arguments (default sys.argv)
+    """
+
+    parser = argparse.ArgumentParser(description='Replay events against a Function, and report its performance.')
+    parser.add_argument('function_dir', help='Directory of the Function, such as "roll_the_dice"')
+    parser.add_argument('-e', '--events', nargs='+', help=(
+        'JSON (an event or a list of events) or JSONL (an event per line) files, or "-" for JSONL from stdin '
+        '(default: the Function\'s event.json)'
+    ))
+    parser.add_argument('-n', '--invocations', type=int, default=100, help='Total number of invocations')
+    parser.add_argument('-c', '--concurrency', type=int, default=1, help='Number of containers invoked at once')
+    parser.add_argument('-t', '--timeout', type=int, default=3, help='Seconds before an invocation would time out')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print the log output of the Function')
+    parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+    args = parser.parse_args(argv)
+
+    events = load_events(args.events or [os.path.join(args.function_dir, 'event.json')])
+
+    if args.verbose:
+        report = run(args.function_dir, events, args.invocations, args.concurrency, args.timeout)
+    else:
+        # The log output of the Function is discarded, so that terminal output does not dominate the timings
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            report = run(args.function_dir, events, args.invocations, args.concurrency, args.timeout)
+
+    if args.json:
+        print(dumps(report, indent=2))
+        return
+
+    print('{function}: {invocations} invocations, concurrency {concurrency}, {errors} errors'.format(**report))
+    print('  throughput     {} invocations/second'.format(report['throughput_per_second']))
+    print('  latency (ms)   p50 {p50}  p95 {p95}  p99 {p99}  max {max}'.format(**report['latency_ms']))
+    print('  warm (ms)      p50 {p50}  p95 {p95}  p99 {p99}'.format(**report['warm_ms']))
+    print('  cold (ms)      init {init}  first invocation {first_invocation}  other containers init '
+          '{other_containers_init}'.format(**report['cold_start_ms']))
+
+    for error in report['error_samples']:
+        print('  error          {}'.format(error))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""Created By: Andrew Ryan DeFilippis"""
+
+import timeit
+
+import lambda_function
+
+
+def run(count=100000, sides=6, number=5, repeat=5):
+    # type: (int, int, int, int) -> dict
+    """Time the throughput of each random number generator rolling dice in bulk.
+
+    :param count: Number of dice rolled per call.
+    :param sides: Number of sides per dice.
+    :param number: Number of calls timed per generator.
+    :param repeat: Number of timings taken per generator, of which the fastest is kept.
+    :return: Dictionary of each generator and its throughput in dice per second.
+    """
+
+    results = {}
+
+    for name in lambda_function.RNG_BACKENDS:
+        generator, _ = lambda_function.rng_backend(name, seed='benchmark' if name == 'seeded' else None)
+
+        seconds = min(timeit.repeat(
+            lambda: lambda_function.roll_list(count, sides, generator),
+            number=number,
+            repeat=repeat
+        ))
+        results[name] = count * number / seconds
+
+    return results
+
+
+if __name__ == '__main__':
+    print('NumPy is {}installed'.format('' if lambda_function.load_numpy() is not None else 'not '))
+
+    for name, dice_per_second in run().items():
+        print('{:<10}{:>14,.0f} dice/second'.format(name, dice_per_second))
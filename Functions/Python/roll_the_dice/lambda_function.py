@@ -2,40 +2,204 @@
 
 print('Lambda cold-start...')
 
+from collections import Counter, namedtuple
+from functools import lru_cache
 from json import dumps, loads
-from random import randint
+from math import comb
+import re
+from threading import Lock
+from os import urandom
+from random import Random, choices
+from secrets import randbelow, randbits
+from array import array
+
+# NumPy is optional, and imported by the first request rolling NUMPY_MIN_DICE dice at once, as importing it costs more
+# than rolling fewer dice with the standard library, which rolls the dice whenever NumPy is not installed
+numpy = None
+numpy_rng = None
+numpy_loaded = False
+numpy_lock = Lock()
 
 # Disable 'testing_locally' when deploying to AWS Lambda
 testing_locally = True
 verbose = True
 
+# Define the logging of events: DEBUG level events are only logged when 'verbose' is enabled, and
+# events are printed together once per invocation, or sooner when LOG_BUFFER_SIZE events are waiting
+LOG_LEVEL = 'DEBUG' if verbose else 'INFO'
+LOG_BUFFER_SIZE = 100
+
+# Define the formats of the rolled dice in the response, selected by the "output" query string:
+#   'dice'    - Each die and its roll, {"dice": {"1": {"roll": 4}, ...}} (default)
+#   'array'   - The rolls in order, {"sides": 6, "rolls": [4, ...]}
+#   'summary' - Only the aggregates of the rolls: count, sum, min, max, mean, and a histogram of each face
+#   'distribution' - The exact probability of each outcome, with the mean and percentiles, without rolling the dice
+OUTPUT_FORMATS = ('dice', 'array', 'summary', 'distribution')
+
+# Define the fewest dice rolled at once with NumPy, when it is installed; fewer dice are rolled as fast by the standard
+# library as NumPy's import at the first of them pays back
+NUMPY_MIN_DICE = 10000
+
+# Define the random number generators that roll the dice, selected by the "rng" query string:
+#   'fast'   - NumPy's generator for NUMPY_MIN_DICE dice or more when NumPy is installed, otherwise Python's
+#              Mersenne Twister (default)
+#   'seeded' - A Mersenne Twister seeded by the "seed" query string, or a random seed, which is echoed back in the
+#              response so that the same request rolls the same dice again (default when a "seed" is given, which
+#              the other generators refuse rather than ignore)
+#   'secure' - The operating system's cryptographically secure source, with 'secrets.randbelow' per die
+#   'bytes'  - Random bytes read at once with 'os.urandom', and mapped to the faces by rejection sampling
+RNG_BACKENDS = ('fast', 'seeded', 'secure', 'bytes')
+
+# Define the dice expressions of the "expr" query string, rolled "rolls" times, such as '4d6kh3+2' or '2d20adv':
+#   'NdS'           - Roll N dice (default 1) of S sides
+#   '!'             - Roll the dice rolling the highest face again and add it, up to EXPRESSION_MAX_EXPLOSIONS times
+#   'rV'            - Reroll the dice rolling V or lower once
+#   'khK' / 'klK'   - Keep the K highest / lowest dice
+#   'dhK' / 'dlK'   - Drop the K highest / lowest dice
+#   'adv' / 'dis'   - Keep the highest / lowest die, as in '2d20adv'
+#   '+' / '-'       - Add or subtract dice terms and integer constants
+# The modifiers of a dice term follow in the order above, as in '4d6!r1kh3'.
+EXPRESSION_MAX_LENGTH = 100
+EXPRESSION_MAX_TERMS = 10
+EXPRESSION_MAX_DICE = 100
+EXPRESSION_MAX_SIDES = 1000
+EXPRESSION_MAX_EXPLOSIONS = 100
+# Define the number of compiled dice expressions cached by each container.
+EXPRESSION_CACHE_SIZE = 256
+# Define the largest response body listing each result, below the 6 MB AWS Lambda response payload limit, with room
+# for the headers and the escaping of the body as a JSON string
+RESULTS_MAX_BYTES = 5000000
+
+# Define the limits of exact distributions: the number of possible outcomes, the dice of a term that keeps or
+# drops some of its dice, and the cost of those terms (see 'keep_cost'), which keeps each request to tens of
+# milliseconds.  Each container caches the distributions of DISTRIBUTION_CACHE_SIZE dice expressions.
+DISTRIBUTION_MAX_OUTCOMES = 10000
+DISTRIBUTION_MAX_KEPT_DICE = 20
+DISTRIBUTION_MAX_KEEP_COST = 20000000
+DISTRIBUTION_CACHE_SIZE = 64
+DISTRIBUTION_PERCENTILES = (1, 5, 25, 50, 75, 95, 99)
+
+DICE_TERM_PATTERN = re.compile(
+    r'\s*(?P<sign>[+-]?)\s*(?:'
+    r'(?P<count>\d*)d(?P<sides>\d+)(?P<explode>!?)(?:r(?P<reroll>\d+))?'
+    r'(?:(?P<keep>kh|kl|dh|dl)(?P<keep_count>\d+)|(?P<advantage>adv|dis))?'
+    r'|(?P<constant>\d+))\s*'
+)
+
+# The compiled dice expression: its dice terms, the sum of its constants, and the number of dice in one roll
+DicePlan = namedtuple('DicePlan', ['expression', 'terms', 'constant', 'dice'])
+# A dice term: 'keep' is None to keep all of the dice, or the number of dice kept and if they are the highest
+DiceTerm = namedtuple('DiceTerm', ['sign', 'count', 'sides', 'explode', 'reroll', 'keep'])
+
 
 class CWLogs(object):
     """Define the structure of log events to match all other CloudWatch Log Events logged by AWS Lambda.
     """
 
-    def __init__(self, context):
-        """Define the instance of the context object.
+    # Log levels, in increasing order of severity
+    LEVELS = {'DEBUG': 10, 'INFO': 20, 'ERROR': 40}
+
+    # Events waiting to be printed, shared by every instance as they share the same stdout stream
+    buffer = []
+    buffer_lock = Lock()
+
+    def __init__(self, context, level='INFO', buffer_size=0):
+        """Define the instance of the context object, the lowest level logged, and the size of the buffer.
 
         :param context: Lambda context object
+        :param level: Events below this level are neither formatted nor printed (default 'INFO')
+        :param buffer_size: Number of events held before they are printed together (default 0, unbuffered)
         """
 
         self.context = context
+        self.level = self.LEVELS[level]
+        self.buffer_size = int(buffer_size)
+
+    def enabled(self, level):
+        # type: (str) -> bool
+        """Is an event of the specified level logged?
 
-    def event(self, message, event_prefix='LOG'):
-        # type: (any, str) -> None
+        :param level: The level of the event (required)
+        :return: True if the event would be logged
+        """
+
+        return self.LEVELS[level] >= self.level
+
+    def event(self, message, *args, event_prefix='LOG', level='INFO'):
+        # type: (any, any, str, str) -> None
         """Print an event into the CloudWatch Logs stream for the Function's invocation.
 
-        :param message: The information to be logged (required)
+        The message is only rendered when the level is enabled, so a callable returning the message, or a
+        %-style format string with its arguments, defers any costly formatting until it is known to be needed.
+
+        :param message: The information to be logged, or a callable returning it (required)
+        :param args: Arguments for %-style formatting of the message
         :param event_prefix: The prefix that appears before the 'RequestId' (default 'LOG')
+        :param level: The level of the event (default 'INFO')
         :return:
         """
 
-        print('{} RequestId: {}\t{}'.format(
-            event_prefix,
-            self.context.aws_request_id,
-            message
-        ))
+        if self.LEVELS[level] < self.level:
+            return None
+
+        if callable(message):
+            message = message()
+
+        if args:
+            message = message % args
+
+        with self.buffer_lock:
+            self.buffer.append('{} RequestId: {}\t{}'.format(
+                event_prefix,
+                self.context.aws_request_id,
+                message
+            ))
+
+            full = len(self.buffer) >= self.buffer_size
+
+        if full:
+            self.flush()
+
+        return None
+
+    def debug(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event that is only needed for debugging.
+
+        :param message: The information to be logged, or a callable returning it (required)
+        :param args: Arguments for %-style formatting of the message
+        :return:
+        """
+
+        if self.level > self.LEVELS['DEBUG']:
+            return None
+
+        return self.event(message, *args, level='DEBUG')
+
+    def error(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event describing an error.
+
+        :param message: The information to be logged, or a callable returning it (required)
+        :param args: Arguments for %-style formatting of the message
+        :return:
+        """
+
+        return self.event(message, *args, level='ERROR')
+
+    def flush(self):
+        # type: () -> None
+        """Print all buffered events with a single write to stdout.
+
+        :return:
+        """
+
+        with self.buffer_lock:
+            lines = self.buffer[:]
+            del self.buffer[:]
+
+        if lines:
+            print('\n'.join(lines))
 
         return None
 
@@ -44,17 +208,19 @@ class APIGWProxyIntegration(object):
     """Define the unique formatting of a response to API Gateway for Proxy Integration.
     """
 
-    def __init__(self, context):
-        """Instantiate logging class and define the default response headers.
+    # The default response headers, completed by the request ID of each invocation
+    default_response_headers = {
+        'Content-Type': 'application/json'  # JSON all the things, or at least the default Content-Type
+    }
 
-        :param context: Lambda context object
+    def __init__(self, log):
+        """Define the instance of the log object, which is shared by the invocations of the container.
+
+        :param log: CloudWatch Logs object
         """
 
-        self.log = CWLogs(context)
-        self.default_response_headers = {
-            'Content-Type': 'application/json',  # JSON all the things, or at least the default Content-Type
-            'Internal-Request-ID': '{}'.format(context.aws_request_id)  # Pass back the Lambda Function request ID
-        }
+        self.log = log
+        self.context = None  # Lambda context object, of the current invocation
 
     def response(self, status_code, body=None, headers=None):
         # type: (int, str, dict) -> dict
@@ -69,47 +235,559 @@ class APIGWProxyIntegration(object):
         response_data = {'statusCode': int(status_code)}  # "statusCode" must be an integer
 
         if headers is None:  # Override the default headers if custom headers are specified
-            headers = self.default_response_headers
+            headers = self.default_response_headers.copy()
+            headers['Internal-Request-ID'] = '{}'.format(self.context.aws_request_id)  # Pass back the request ID
+        else:
+            headers = dict(headers)
 
-        if headers is not None:     # Although not required with the above "self.default_response_headers"
-                                    # assigned to "headers", it is good to have the check in place.
-            response_data['headers'] = loads(dumps(headers))  # "headers" must be a dictionary
+        response_data['headers'] = headers  # "headers" must be a dictionary
 
         if body is not None:
             response_data['body'] = str(body)  # "body" must be a string
 
-        if verbose is True:
-            self.log.event('Response: {}'.format(dumps(response_data)))
+        # The body is logged as the string it already is, rather than encoding the response as JSON again
+        if self.log.enabled('DEBUG'):
+            self.log.debug('Response: HTTP status code is %s, headers are %s, body is %s', status_code, headers, body)
         else:
-            self.log.event('Response: HTTP status code is {}'.format(status_code))
+            self.log.event('Response: HTTP status code is %s', status_code)
 
         return response_data
 
 
+def load_numpy():
+    # type: () -> any
+    """Import NumPy and create its random number generator, once per container.
+
+    :return: The NumPy module, or None when it is not installed
+    """
+
+    global numpy, numpy_rng, numpy_loaded
+
+    if not numpy_loaded:
+        with numpy_lock:
+            if not numpy_loaded:
+                try:
+                    import numpy as module
+                    numpy_rng = module.random.default_rng()
+                    numpy = module
+                except ImportError:
+                    pass
+
+                numpy_loaded = True
+
+    return numpy
+
+
+def roll_bulk(count, sides):
+    # type: (int, int) -> list
+    """Roll many dice with a single call to the random number generator, rather than one call per die.
+
+    :param count: The number of dice being rolled (required)
+    :param sides: The number of sides per dice (required)
+    :return: The rolls, as a NumPy array for NUMPY_MIN_DICE dice or more when NumPy is installed, otherwise a list
+    """
+
+    if count >= NUMPY_MIN_DICE and load_numpy() is not None:
+        return numpy_rng.integers(1, sides + 1, size=count)
+
+    return choices(range(1, sides + 1), k=count)
+
+
+def seeded_rng(seed):
+    # type: (str) -> callable
+    """Create a generator that rolls the same dice every time it is created with the same seed.
+
+    :param seed: The seed of the generator (required)
+    :return: The generator, rolling 'count' dice of 'sides' sides like 'roll_bulk'
+    """
+
+    generator = Random(seed)
+
+    def roll(count, sides):
+        return generator.choices(range(1, sides + 1), k=count)
+
+    return roll
+
+
+def secure_rng(count, sides):
+    # type: (int, int) -> list
+    """Roll the dice with the operating system's cryptographically secure source, without any bias between faces.
+
+    :param count: The number of dice being rolled (required)
+    :param sides: The number of sides per dice (required)
+    :return: The rolls
+    """
+
+    return [randbelow(sides) + 1 for _ in range(count)]
+
+
+def bytes_rng(count, sides):
+    # type: (int, int) -> list
+    """Roll the dice from random bytes read at once from the operating system.  The values of one or two bytes at or
+    above the largest multiple of 'sides' are rejected, so that every face is equally likely.
+
+    :param count: The number of dice being rolled (required)
+    :param sides: The number of sides per dice (required)
+    :return: The rolls
+    """
+
+    typecode, values_range = ('B', 256) if sides <= 256 else ('H', 65536)
+    limit = values_range - values_range % sides
+    rolls = []
+
+    while len(rolls) < count:
+        # Read enough bytes for the dice still needed, with some to spare for the values that are rejected
+        needed = (count - len(rolls)) * values_range // limit + 16
+        values = array(typecode, urandom(needed * array(typecode).itemsize))
+        rolls.extend(value % sides + 1 for value in values if value < limit)
+
+    del rolls[count:]
+
+    return rolls
+
+
+def rng_backend(name, seed=None):
+    # type: (str, str) -> tuple
+    """Select the random number generator that rolls the dice.
+
+    :param name: One of RNG_BACKENDS (required)
+    :param seed: The seed of the 'seeded' generator, or None for a random seed (default None)
+    :return: The generator, rolling 'count' dice of 'sides' sides like 'roll_bulk', and the seed of a 'seeded' generator
+    """
+
+    if name == 'seeded':
+        if seed is None:
+            seed = '{}'.format(randbits(64))
+
+        return seeded_rng(seed), seed
+
+    generators = {'fast': roll_bulk, 'secure': secure_rng, 'bytes': bytes_rng}
+
+    if name not in generators:
+        raise ValueError('The value for "rng" must be one of "{}".'.format('", "'.join(RNG_BACKENDS)))
+
+    # A seed that would be ignored is refused, rather than echoed back as though the dice could be rolled again
+    if seed is not None:
+        raise ValueError('The value for "seed" may only be used with "rng=seeded".')
+
+    return generators[name], None
+
+
+def roll_list(count, sides, rng=roll_bulk):
+    # type: (int, int, callable) -> list
+    """Roll many dice at once, as a list.
+
+    :param count: The number of dice being rolled (required)
+    :param sides: The number of sides per dice (required)
+    :param rng: The generator from 'rng_backend' (default 'roll_bulk')
+    :return: The rolls
+    """
+
+    rolls = rng(count, sides)
+
+    return rolls.tolist() if numpy is not None and isinstance(rolls, numpy.ndarray) else rolls
+
+
+def summarize(rolls, sides=None):
+    # type: (list, int) -> dict
+    """Aggregate the rolls from a histogram of their values, without another pass over the rolls.
+
+    :param rolls: The rolls from 'roll_bulk', or the results of a dice expression (required)
+    :param sides: The number of sides per dice, to include the faces that were not rolled in the histogram
+    :return: The count, sum, min, max, mean, and histogram of the rolls
+    """
+
+    if sides is not None and numpy is not None and isinstance(rolls, numpy.ndarray):
+        counts = numpy.bincount(rolls, minlength=sides + 1).tolist()
+        histogram = {face: counts[face] for face in range(1, sides + 1)}
+    else:
+        counter = Counter(rolls)
+        histogram = {value: counter[value] for value in (range(1, sides + 1) if sides else sorted(counter))}
+
+    rolled = [value for value, value_count in histogram.items() if value_count]
+    count = sum(histogram.values())
+    total = sum(value * histogram[value] for value in rolled)
+
+    return {
+        'count': count,
+        'sum': total,
+        'min': rolled[0],
+        'max': rolled[-1],
+        'mean': total / count,
+        'histogram': histogram
+    }
+
+
+@lru_cache(maxsize=EXPRESSION_CACHE_SIZE)
+def compile_expression(expression):
+    # type: (str) -> DicePlan
+    """Parse a dice expression into the plan that evaluates it.  Plans are cached by expression, so an expression
+    that is rolled again is not parsed again.
+
+    :param expression: Dice expression, such as '4d6kh3+2' (required)
+    :return: The plan of the dice expression
+    """
+
+    text = expression.lower()
+    parts = []
+    terms = []
+    constant = 0
+    position = 0
+
+    if not 0 < len(text.strip()) <= EXPRESSION_MAX_LENGTH:
+        raise ValueError('The dice expression must be from 1 to {} characters.'.format(EXPRESSION_MAX_LENGTH))
+
+    while position < len(text):
+        match = DICE_TERM_PATTERN.match(text, position)
+
+        # Every term after the first must start with a sign
+        if match is None or match.end() == position or (position and not match.group('sign')):
+            raise ValueError('The dice expression "{}" is not valid at "{}".'.format(
+                expression,
+                text[position:].strip()
+            ))
+
+        position = match.end()
+        parts.append(''.join(match.group(0).split()))
+        sign = -1 if match.group('sign') == '-' else 1
+
+        if match.group('constant'):
+            constant += sign * int(match.group('constant'))
+            continue
+
+        count = int(match.group('count') or 1)
+        sides = int(match.group('sides'))
+        reroll = int(match.group('reroll') or 0)
+        keep = None
+
+        if match.group('keep'):
+            keep_count = int(match.group('keep_count'))
+            keep = {
+                'kh': (keep_count, True),
+                'kl': (keep_count, False),
+                'dh': (count - keep_count, False),
+                'dl': (count - keep_count, True)
+            }[match.group('keep')]
+        elif match.group('advantage'):
+            keep = (1, match.group('advantage') == 'adv')
+
+        if not 1 <= count <= EXPRESSION_MAX_DICE or not 2 <= sides <= EXPRESSION_MAX_SIDES:
+            raise ValueError('The dice count must be from "1" to "{}", and the number of sides must be from "2" to '
+                             '"{}".'.format(EXPRESSION_MAX_DICE, EXPRESSION_MAX_SIDES))
+
+        if reroll >= sides:
+            raise ValueError('The dice rerolled must be lower than the number of sides.')
+
+        if keep is not None and not 1 <= keep[0] <= count:
+            raise ValueError('The dice kept must be from "1" to the dice count.')
+
+        terms.append(DiceTerm(sign, count, sides, bool(match.group('explode')), reroll, keep))
+
+    if len(terms) > EXPRESSION_MAX_TERMS:
+        raise ValueError('The dice expression must have up to {} dice terms.'.format(EXPRESSION_MAX_TERMS))
+
+    return DicePlan(''.join(parts), tuple(terms), constant, sum(term.count for term in terms))
+
+
+def pack(counts, width):
+    # type: (list, int) -> int
+    """Pack the coefficients of a polynomial into the digits of an integer, so that multiplying the integers
+    multiplies (convolves) the polynomials, as long as no coefficient overflows its 'width' bytes.
+
+    :param counts: The coefficients, lowest power first (required)
+    :param width: The number of bytes of each coefficient (required)
+    :return: The packed polynomial
+    """
+
+    return int.from_bytes(b''.join(count.to_bytes(width, 'little') for count in counts), 'little')
+
+
+def unpack(value, width, length):
+    # type: (int, int, int) -> list
+    """Unpack the coefficients of a polynomial from the digits of an integer.
+
+    :param value: The packed polynomial (required)
+    :param width: The number of bytes of each coefficient (required)
+    :param length: The number of coefficients (required)
+    :return: The coefficients, lowest power first
+    """
+
+    data = value.to_bytes(width * length, 'little')
+
+    return [int.from_bytes(data[i:i + width], 'little') for i in range(0, width * length, width)]
+
+
+def term_faces(term):
+    # type: (DiceTerm) -> tuple
+    """Count the ways each face of a dice term's dice is rolled, of 'sides' ** 2 when rerolled, as a rerolled face
+    is rolled once more.
+
+    :param term: The dice term (required)
+    :return: The ways of each face, and the number of bytes that holds the ways to roll all of the dice
+    """
+
+    if term.reroll:
+        faces = [term.reroll + (term.sides if face > term.reroll else 0) for face in range(1, term.sides + 1)]
+    else:
+        faces = [1] * term.sides
+
+    return faces, (sum(faces) ** term.count).bit_length() // 8 + 1
+
+
+def keep_cost(term):
+    # type: (DiceTerm) -> int
+    """Estimate the work of the distribution of a dice term that keeps or drops some of its dice: the sides times
+    the dice times the dice kept, each shifting and adding integers of the dice kept times the sides times the width.
+
+    :param term: The dice term (required)
+    :return: The estimated cost, which is 0 when every die is kept
+    """
+
+    if term.keep is None:
+        return 0
+
+    keep_count = term.keep[0]
+
+    return term.count * keep_count ** 2 * term.sides ** 2 * term_faces(term)[1]
+
+
+def term_distribution(term):
+    # type: (DiceTerm) -> tuple
+    """Count the ways each total of a dice term can be rolled.
+
+    :param term: The dice term (required)
+    :return: The lowest total, and the number of ways to roll each total from it
+    """
+
+    if term.explode:
+        raise ValueError('Exploding dice have no finite distribution.')
+
+    # No coefficient is larger than the ways to roll all of the dice
+    faces, width = term_faces(term)
+
+    if term.keep is None:
+        counts = unpack(pack(faces, width) ** term.count, width, term.count * (term.sides - 1) + 1)
+        return term.count, counts
+
+    keep_count, highest = term.keep
+
+    if term.count > DISTRIBUTION_MAX_KEPT_DICE:
+        raise ValueError('Exact distributions keep or drop dice from up to {} dice.'.format(
+            DISTRIBUTION_MAX_KEPT_DICE
+        ))
+
+    # Assign the dice to the faces from the first face kept, where 'ways[n]' are the ways the first 'n' dice are
+    # assigned by the total of the dice kept.  Once every kept die is assigned, the remaining dice are all dropped,
+    # and may roll any of the faces not yet assigned, so their ways are added to 'kept_ways' at once.
+    ways = [1] + [0] * (keep_count - 1)
+    kept_ways = 0
+    order = range(term.sides, 0, -1) if highest else range(1, term.sides + 1)
+    unassigned_ways = sum(faces)
+
+    for face in order:
+        face_ways = faces[face - 1]
+        unassigned_ways -= face_ways
+        next_ways = [0] * keep_count
+
+        for assigned, assigned_ways in enumerate(ways):
+            if not assigned_ways:
+                continue
+
+            remaining = term.count - assigned
+
+            for dice in range(remaining + 1):
+                kept = min(dice, keep_count - assigned)
+                dice_ways = (assigned_ways * comb(remaining, dice) * face_ways ** dice) << (kept * face * width * 8)
+
+                if assigned + dice < keep_count:
+                    next_ways[assigned + dice] += dice_ways
+                else:
+                    kept_ways += dice_ways * unassigned_ways ** (remaining - dice)
+
+        ways = next_ways
+
+    counts = unpack(kept_ways, width, keep_count * term.sides + 1)
+
+    return keep_count, counts[keep_count:]
+
+
+@lru_cache(maxsize=DISTRIBUTION_CACHE_SIZE)
+def distribution(plan):
+    # type: (DicePlan) -> dict
+    """Calculate the exact distribution of a dice expression by the convolution of the distributions of its terms,
+    as the product of polynomials whose coefficients count the ways each total is rolled.
+
+    :param plan: The plan from 'compile_expression' (required)
+    :return: The probability of each outcome, the mean, and the percentiles of the dice expression
+    """
+
+    outcomes = 1 + sum(
+        (term.keep[0] if term.keep else term.count) * (term.sides - 1) for term in plan.terms
+    )
+
+    if outcomes > DISTRIBUTION_MAX_OUTCOMES:
+        raise ValueError('Exact distributions have up to {} possible outcomes.'.format(DISTRIBUTION_MAX_OUTCOMES))
+
+    # Checked before any term is calculated, so that a request over the limit costs nothing
+    if sum(keep_cost(term) for term in plan.terms) > DISTRIBUTION_MAX_KEEP_COST:
+        raise ValueError('Exact distributions keeping or dropping dice are limited to fewer, smaller dice, such as '
+                         '"20d20kh10" or "2d1000adv".')
+
+    low = plan.constant
+    counts = [1]
+
+    for term in plan.terms:
+        term_low, term_counts = term_distribution(term)
+
+        if term.sign < 0:
+            term_low = -(term_low + len(term_counts) - 1)
+            term_counts = term_counts[::-1]
+
+        width = (sum(counts) * sum(term_counts)).bit_length() // 8 + 1
+        counts = unpack(
+            pack(counts, width) * pack(term_counts, width),
+            width,
+            len(counts) + len(term_counts) - 1
+        )
+        low += term_low
+
+    total = sum(counts)
+    percentiles = {}
+    cumulative = 0
+
+    for outcome, outcome_count in enumerate(counts, low):
+        cumulative += outcome_count
+
+        for percentile in DISTRIBUTION_PERCENTILES:
+            if percentile not in percentiles and cumulative * 100 >= percentile * total:
+                percentiles[percentile] = outcome
+
+    return {
+        'expression': plan.expression,
+        'min': low,
+        'max': low + len(counts) - 1,
+        'mean': sum(outcome * outcome_count for outcome, outcome_count in enumerate(counts, low)) / total,
+        'percentiles': percentiles,
+        'distribution': {
+            outcome: outcome_count / total for outcome, outcome_count in enumerate(counts, low) if outcome_count
+        }
+    }
+
+
+def roll_term(term, rolls, rng=roll_bulk):
+    # type: (DiceTerm, int, callable) -> list
+    """Roll a dice term of a dice expression a number of times, with all of the dice drawn at once.
+
+    :param term: The dice term (required)
+    :param rolls: The number of times the term is rolled (required)
+    :param rng: The generator from 'rng_backend' (default 'roll_bulk')
+    :return: The total of the dice kept by each roll of the term
+    """
+
+    dice = roll_list(term.count * rolls, term.sides, rng)
+
+    # Dice at or below the reroll value are rolled once more, keeping the new roll
+    if term.reroll:
+        rerolled = [i for i, roll in enumerate(dice) if roll <= term.reroll]
+
+        for i, roll in zip(rerolled, roll_list(len(rerolled), term.sides, rng)):
+            dice[i] = roll
+
+    # Dice rolling the highest face are rolled again and added, for as long as they keep rolling it
+    if term.explode:
+        exploded = [i for i, roll in enumerate(dice) if roll == term.sides]
+
+        for _ in range(EXPRESSION_MAX_EXPLOSIONS):
+            if not exploded:
+                break
+
+            rolled = roll_list(len(exploded), term.sides, rng)
+
+            for i, roll in zip(exploded, rolled):
+                dice[i] += roll
+
+            exploded = [i for i, roll in zip(exploded, rolled) if roll == term.sides]
+
+    # Each roll of the term is the next 'count' dice
+    groups = zip(*[iter(dice)] * term.count)
+
+    if term.keep is not None:
+        keep_count, highest = term.keep
+        groups = (sorted(group)[-keep_count:] if highest else sorted(group)[:keep_count] for group in groups)
+
+    return list(map(sum, groups))
+
+
+def evaluate(plan, rolls=1, rng=roll_bulk):
+    # type: (DicePlan, int, callable) -> list
+    """Roll a dice expression a number of times.
+
+    :param plan: The plan from 'compile_expression' (required)
+    :param rolls: The number of times the expression is rolled (default 1)
+    :param rng: The generator from 'rng_backend' (default 'roll_bulk')
+    :return: The result of each roll of the expression
+    """
+
+    results = [plan.constant] * rolls
+
+    for term in plan.terms:
+        if term.sign > 0:
+            results = [result + total for result, total in zip(results, roll_term(term, rolls, rng))]
+        else:
+            results = [result - total for result, total in zip(results, roll_term(term, rolls, rng))]
+
+    return results
+
+
 class RollTheDice(object):
     """Roll the dice to find out what you get.
     """
 
-    def __init__(self, context):
-        """Instantiate logging and response classes.
+    def __init__(self, log, apigw):
+        """Define the instances of the logging and response classes.
 
-        :param context: Lambda context object
+        :param log: CloudWatch Logs object
+        :param apigw: API Gateway Proxy Integration object
         """
 
-        self.log = CWLogs(context)
-        self.apigw = APIGWProxyIntegration(context)
+        self.log = log
+        self.apigw = apigw
 
-    def roll(self, count, sides):
-        # type: (int, int) -> dict
+    def roll(self, count, sides, output='dice', rng='fast', seed=None):
+        # type: (int, int, str, str, str) -> dict
         """Roll the dice using the integer values for count and sides.
 
         :param count: The number of dice being rolled (required)
         :param sides: The number of sides per dice (required)
+        :param output: The format of the rolled dice, one of OUTPUT_FORMATS (default 'dice')
+        :param rng: The random number generator, one of RNG_BACKENDS (default 'fast')
+        :param seed: The seed of the 'seeded' generator, echoed back in the response (default None, a random seed)
         :return: Fully built response to be returned as the final response from Lambda
         """
 
+        if output not in OUTPUT_FORMATS:
+            err_code = 400
+            err_body = dumps({'errorMessage': 'The value for "output" must be one of "{}".'.format(
+                '", "'.join(OUTPUT_FORMATS)
+            )})
+
+            self.log.debug('Error: %s - %s', err_code, err_body)
+
+            return self.apigw.response(err_code, err_body)
+
+        try:
+            generator, seed = rng_backend(rng, seed)
+        except ValueError as e:
+            err_code = 400
+            err_body = dumps({'errorMessage': '{}'.format(e)})
+
+            self.log.debug('Error: %s - %s', err_code, err_body)
+
+            return self.apigw.response(err_code, err_body)
+
         min_dice = 1  # Hopefully we want at least 1 dice
         max_dice = 10  # Max number of dice is an artificial limitation which can be increased.
+        max_bulk_dice = 1000000  # Dice rolled in bulk are not listed one by one, so many more can be rolled.
         min_sides = 2  # Yes, "2" sides means you can produce a coin-flip.
         max_sides = 120  # Max sides/dice matches physical limitation of sides/dice.
 
@@ -118,6 +796,11 @@ class RollTheDice(object):
             count = int(count)
             sides = int(sides)
 
+            if output == 'distribution':
+                max_dice = EXPRESSION_MAX_DICE
+            elif output != 'dice':
+                max_dice = max_bulk_dice
+
             if not min_dice <= count <= max_dice or not min_sides <= sides <= max_sides:
                 err_code = 400
                 err_str = (
@@ -132,18 +815,44 @@ class RollTheDice(object):
 
                 err_body = dumps({'errorMessage': '{}'.format(err_str)})
 
-                if verbose is True:
-                    self.log.event('Error: {} - {}'.format(err_code, err_body))
+                self.log.debug('Error: %s - %s', err_code, err_body)
 
                 return self.apigw.response(err_code, err_body)
 
+            elif output == 'distribution':
+                return self.roll_expression('{}d{}'.format(count, sides), output=output)
+
+            elif output == 'summary':
+                rolls = summarize(generator(count, sides), sides)
+                rolls['sides'] = sides
+
+                if seed is not None:
+                    rolls['seed'] = seed
+
+                rolls = dumps(rolls)
+
+                return self.apigw.response(200, rolls)
+
+            elif output == 'array':
+                rolls = {'sides': sides, 'rolls': roll_list(count, sides, generator)}
+
+                if seed is not None:
+                    rolls['seed'] = seed
+
+                rolls = dumps(rolls, separators=(',', ':'))
+
+                return self.apigw.response(200, rolls)
+
             else:
                 rolls = {'dice': {}}
-                count += 1  # Starts dice count at '1' instead of '0' for pretty printing
 
-                for dice in range(1, count):
+                # Starts dice count at '1' instead of '0' for pretty printing
+                for dice, roll in enumerate(roll_list(count, sides, generator), 1):
                     rolls['dice'][dice] = {}
-                    rolls['dice'][dice]['roll'] = randint(1, sides)
+                    rolls['dice'][dice]['roll'] = roll
+
+                if seed is not None:
+                    rolls['seed'] = seed
 
                 rolls = dumps(rolls)  # Encode the dictionary as a JSON object
 
@@ -153,11 +862,87 @@ class RollTheDice(object):
             err_code = 400
             err_body = dumps({'errorMessage': 'The values for "count" and "sides" must be integers.'})
 
-            if verbose is True:
-                self.log.event('Error: {} - {} {}'.format(err_code, type(e), e))
+            self.log.debug('Error: %s - %s %s', err_code, type(e), e)
+
+            return self.apigw.response(err_code, err_body)
+
+    def roll_expression(self, expression, rolls=1, output='dice', rng='fast', seed=None):
+        # type: (str, int, str, str, str) -> dict
+        """Roll the dice expression a number of times.
+
+        :param expression: Dice expression, such as '4d6kh3+2' (required)
+        :param rolls: The number of times the expression is rolled (default 1)
+        :param output: 'summary' for only the aggregates of the results, 'distribution' for the exact distribution
+            of the results without rolling the dice, otherwise each result (default 'dice')
+        :param rng: The random number generator, one of RNG_BACKENDS (default 'fast')
+        :param seed: The seed of the 'seeded' generator, echoed back in the response (default None, a random seed)
+        :return: Fully built response to be returned as the final response from Lambda
+        """
+
+        max_bulk_dice = 1000000  # Matches the dice rolled in bulk by 'roll'.
+
+        try:
+            if output not in OUTPUT_FORMATS:
+                raise ValueError('The value for "output" must be one of "{}".'.format('", "'.join(OUTPUT_FORMATS)))
+
+            try:
+                rolls = int(rolls)
+            except (TypeError, ValueError):
+                raise ValueError('The value for "rolls" must be an integer.')
+
+            plan = compile_expression(expression)
+            generator, seed = rng_backend(rng, seed)
+
+            # The distribution is calculated, and cached, rather than rolled
+            if output == 'distribution':
+                return self.apigw.response(200, dumps(distribution(plan)))
+
+            max_rolls = max_bulk_dice // max(1, plan.dice)
+
+            # Each result is listed with up to the digits of the largest total, a sign, and a comma
+            if output != 'summary':
+                largest = abs(plan.constant) + sum(
+                    (term.keep[0] if term.keep else term.count) * term.sides *
+                    (EXPRESSION_MAX_EXPLOSIONS + 1 if term.explode else 1) for term in plan.terms
+                )
+                max_rolls = min(max_rolls, RESULTS_MAX_BYTES // (len(str(largest)) + 2))
+
+            if not 1 <= rolls <= max_rolls:
+                raise ValueError('The dice expression may be rolled from "1" to "{}" times{}.'.format(
+                    max(1, max_rolls),
+                    '' if output == 'summary' else ', or more with "output=summary"'
+                ))
+
+        except ValueError as e:
+            err_code = 400
+            err_body = dumps({'errorMessage': '{}'.format(e)})
+
+            self.log.debug('Error: %s - %s', err_code, err_body)
 
             return self.apigw.response(err_code, err_body)
 
+        results = evaluate(plan, rolls, generator)
+
+        if output == 'summary':
+            results = summarize(results)
+            results['expression'] = plan.expression
+        else:
+            results = {'expression': plan.expression, 'results': results}
+
+        if seed is not None:
+            results['seed'] = seed
+
+        results = dumps(results, separators=(',', ':'))
+
+        return self.apigw.response(200, results)
+
+
+# The logging, API Gateway Proxy Integration response building, and rolling of the dice classes are
+# instantiated once per container, and bound to the context of each invocation
+log = CWLogs(None, level=LOG_LEVEL, buffer_size=LOG_BUFFER_SIZE)
+apigw = APIGWProxyIntegration(log)
+rtd = RollTheDice(log, apigw)
+
 
 def lambda_handler(event, context):
     """AWS Lambda executes the 'lambda_handler' function on invocation.
@@ -167,43 +952,60 @@ def lambda_handler(event, context):
     :return: Final response to AWS Lambda, and passed to the invoker if the invocation type is RequestResponse
     """
 
-    # Instantiate our CloudWatch logging, API Gateway Proxy Integration
-    # response building, and rolling of the dice classes.
-    log = CWLogs(context)
-    apigw = APIGWProxyIntegration(context)
-    rtd = RollTheDice(context)
+    log.context = context
+    apigw.context = context
 
     try:
-        if verbose is True:
-            log.event('Event: {}'.format(dumps(event)))
+        log.debug(lambda: 'Event: {}'.format(dumps(event)))
 
         method = event['requestContext']['httpMethod']
 
         try:
-            count = event['queryStringParameters']['count']
-            sides = event['queryStringParameters']['sides']
-        except (TypeError, KeyError) as e:
+            output = event['queryStringParameters'].get('output', 'dice')
+            expression = event['queryStringParameters'].get('expr')
+            seed = event['queryStringParameters'].get('seed')
+            rng = event['queryStringParameters'].get('rng', 'fast' if seed is None else 'seeded')
+
+            if expression is None:
+                count = event['queryStringParameters']['count']
+                sides = event['queryStringParameters']['sides']
+        except (AttributeError, TypeError, KeyError) as e:
             status_code = 400
             err_str = (
-                "Integer values for \"count\" and "
-                "\"sides\" query strings must be provided."
+                "Integer values for \"count\" and \"sides\" query strings, "
+                "or a dice expression for the \"expr\" query string, must be provided."
             )
             err_body = dumps({'errorMessage': '{}'.format(err_str)})
 
-            if verbose is True:
-                log.event('Error: {} - {} {}'.format(status_code, type(e), e))
+            log.debug('Error: %s - %s %s', status_code, type(e), e)
 
             return apigw.response(status_code, err_body)
 
-        if verbose is True:
-            log.event('Request: httpMethod is {}'.format(method))
-            log.event('Request: count is {}'.format(count))
-            log.event('Request: sides is {}'.format(sides))
+        log.debug('Request: httpMethod is %s', method)
+        log.debug('Request: output is %s', output)
+        log.debug('Request: rng is %s', rng)
+
+        if method in ('GET', 'POST') and expression is not None:
+            log.debug('Request: expr is %s', expression)
+
+            return rtd.roll_expression(
+                expression,
+                event['queryStringParameters'].get('rolls', 1),
+                output,
+                rng,
+                seed
+            )
+
+        elif method in ('GET', 'POST'):  # Time to roll
+            log.debug('Request: count is %s', count)
+            log.debug('Request: sides is %s', sides)
 
-        if method in ('GET', 'POST'):  # Time to roll
             return rtd.roll(
                 count,
-                sides
+                sides,
+                output,
+                rng,
+                seed
             )
 
         else:
@@ -211,8 +1013,7 @@ def lambda_handler(event, context):
             status_code = 405
             err_body = dumps({'errorMessage': 'Method Not Allowed'})
 
-            if verbose is True:
-                log.event('Error: {} - {}'.format(status_code, err_body))
+            log.debug('Error: %s - %s', status_code, err_body)
 
             return apigw.response(status_code, err_body)
 
@@ -220,9 +1021,12 @@ def lambda_handler(event, context):
         status_code = 500
         err_body = dumps({'errorMessage': 'Internal Server Error'})
 
-        log.event('Error: {} - {} {}'.format(status_code, type(e), e))
+        log.error('Error: %s - %s %s', status_code, type(e), e)
 
         return apigw.response(status_code, err_body)
+    finally:
+        # Print the buffered log events once per invocation
+        log.flush()
 
 
 def local_test():
@@ -238,5 +1042,5 @@ def local_test():
 
     lambda_handler(event, context)
 
-if testing_locally is True:
+if testing_locally and __name__ == '__main__':
     local_test()
@@ -0,0 +1,317 @@
+"""Created By: Andrew Ryan DeFilippis"""
+
+import contextlib
+import unittest
+from array import array
+from collections import Counter
+from io import StringIO
+from json import loads
+from unittest import mock
+
+import context
+
+with contextlib.redirect_stdout(StringIO()):
+    import lambda_function
+
+
+def invoke(query_string_parameters, method='GET'):
+    """Invoke the Function with the query strings of an API Gateway request, and return its status code and body.
+    """
+
+    event = {'requestContext': {'httpMethod': method}, 'queryStringParameters': query_string_parameters}
+
+    with contextlib.redirect_stdout(StringIO()):
+        response = lambda_function.lambda_handler(event, context)
+
+    return response['statusCode'], loads(response['body'])
+
+
+class TestDistribution(unittest.TestCase):
+    """Test the exact distributions of dice expressions.
+    """
+
+    def setUp(self):
+        lambda_function.distribution.cache_clear()
+
+    def test_keep_distribution(self):
+        """Verify the distribution of a dice term that keeps some of its dice.
+        """
+
+        result = lambda_function.distribution(lambda_function.compile_expression('4d6kh3'))
+
+        self.assertEqual((3, 18), (result['min'], result['max']))
+        self.assertAlmostEqual(15869 / 1296, result['mean'])
+        self.assertAlmostEqual(1 / 1296, result['distribution'][3])
+        self.assertAlmostEqual(21 / 1296, result['distribution'][18])
+
+    def test_keep_cost_limit(self):
+        """Verify that the most costly keep or drop expression allowed is within the limit, and that costlier ones are
+        refused with "400: Bad Request".
+        """
+
+        plan = lambda_function.compile_expression('20d87r86kh2')
+        self.assertLessEqual(lambda_function.keep_cost(plan.terms[0]), lambda_function.DISTRIBUTION_MAX_KEEP_COST)
+
+        for expression in ('20d1000kh10', '20d500kh19', '10d1000r999kh10'):
+            with self.subTest(expression=expression):
+                plan = lambda_function.compile_expression(expression)
+                self.assertGreater(lambda_function.keep_cost(plan.terms[0]), lambda_function.DISTRIBUTION_MAX_KEEP_COST)
+
+                status_code, body = invoke({'expr': expression, 'output': 'distribution'})
+
+                self.assertEqual(400, status_code)
+                self.assertIn('errorMessage', body)
+
+
+class TestOutputs(unittest.TestCase):
+    """Test the array and summary outputs of bulk rolls.
+    """
+
+    def test_array(self):
+        """Verify that the array output lists every roll, within the faces of the dice.
+        """
+
+        status_code, body = invoke({'count': '1000', 'sides': '6', 'output': 'array'})
+
+        self.assertEqual(200, status_code)
+        self.assertEqual(6, body['sides'])
+        self.assertEqual(1000, len(body['rolls']))
+        self.assertTrue(set(body['rolls']) <= set(range(1, 7)))
+        self.assertNotIn('seed', body)
+
+    def test_summary(self):
+        """Verify that the summary output aggregates the rolls, with a histogram of every face.
+        """
+
+        for count in (1, 1000, lambda_function.NUMPY_MIN_DICE):
+            with self.subTest(count=count):
+                status_code, body = invoke({'count': str(count), 'sides': '120', 'output': 'summary'})
+
+                histogram = {int(face): face_count for face, face_count in body['histogram'].items()}
+                rolled = [face for face, face_count in histogram.items() if face_count]
+
+                self.assertEqual(200, status_code)
+                self.assertEqual(list(range(1, 121)), sorted(histogram))
+                self.assertEqual(count, body['count'])
+                self.assertEqual(count, sum(histogram.values()))
+                self.assertEqual(sum(face * face_count for face, face_count in histogram.items()), body['sum'])
+                self.assertEqual((min(rolled), max(rolled)), (body['min'], body['max']))
+                self.assertAlmostEqual(body['sum'] / count, body['mean'])
+
+    def test_summarize(self):
+        """Verify the aggregates of known rolls, from a list or a NumPy array.
+        """
+
+        expected = {'count': 4, 'sum': 10, 'min': 1, 'max': 4, 'mean': 2.5, 'histogram': {1: 1, 2: 1, 3: 1, 4: 1, 5: 0}}
+
+        self.assertEqual(expected, lambda_function.summarize([4, 1, 3, 2], 5))
+        self.assertEqual(dict(expected, histogram={1: 1, 2: 1, 3: 1, 4: 1}), lambda_function.summarize([4, 1, 3, 2]))
+
+        numpy = lambda_function.load_numpy()
+
+        if numpy is not None:
+            self.assertEqual(expected, lambda_function.summarize(numpy.array([4, 1, 3, 2]), 5))
+
+    def test_limits(self):
+        """Verify the dice count limits of each output, and that an unknown output is refused.
+        """
+
+        cases = [
+            ({'count': '10', 'sides': '6'}, 200),
+            ({'count': '11', 'sides': '6'}, 400),
+            ({'count': '1000000', 'sides': '2', 'output': 'summary'}, 200),
+            ({'count': '1000001', 'sides': '6', 'output': 'summary'}, 400),
+            ({'count': '1000001', 'sides': '6', 'output': 'array'}, 400),
+            ({'count': '10', 'sides': '121', 'output': 'array'}, 400),
+            ({'count': 'ten', 'sides': '6', 'output': 'array'}, 400),
+            ({'count': '10', 'sides': '6', 'output': 'csv'}, 400)
+        ]
+
+        for query_string_parameters, expected in cases:
+            with self.subTest(**query_string_parameters):
+                self.assertEqual(expected, invoke(query_string_parameters)[0])
+
+    def test_numpy_on_first_use(self):
+        """Verify that NumPy is only imported by a roll of NUMPY_MIN_DICE dice or more.
+        """
+
+        with mock.patch.object(lambda_function, 'load_numpy', wraps=lambda_function.load_numpy) as load_numpy:
+            invoke({'count': str(lambda_function.NUMPY_MIN_DICE - 1), 'sides': '6', 'output': 'summary'})
+            load_numpy.assert_not_called()
+
+            invoke({'count': str(lambda_function.NUMPY_MIN_DICE), 'sides': '6', 'output': 'summary'})
+            load_numpy.assert_called_once_with()
+
+
+class TestExpression(unittest.TestCase):
+    """Test the grammar of dice expressions, and their error messages.
+    """
+
+    def setUp(self):
+        lambda_function.compile_expression.cache_clear()
+
+    def test_terms(self):
+        """Verify the dice terms and constants that dice expressions compile to.
+        """
+
+        DiceTerm = lambda_function.DiceTerm
+        cases = [
+            ('d20', 'd20', (DiceTerm(1, 1, 20, False, 0, None),), 0),
+            ('4d6kh3 + 2', '4d6kh3+2', (DiceTerm(1, 4, 6, False, 0, (3, True)),), 2),
+            ('4D6KL1', '4d6kl1', (DiceTerm(1, 4, 6, False, 0, (1, False)),), 0),
+            ('5d10dh2', '5d10dh2', (DiceTerm(1, 5, 10, False, 0, (3, False)),), 0),
+            ('5d10dl2', '5d10dl2', (DiceTerm(1, 5, 10, False, 0, (3, True)),), 0),
+            ('2d20adv - 1', '2d20adv-1', (DiceTerm(1, 2, 20, False, 0, (1, True)),), -1),
+            ('2d20dis', '2d20dis', (DiceTerm(1, 2, 20, False, 0, (1, False)),), 0),
+            ('3d6!r1kh2', '3d6!r1kh2', (DiceTerm(1, 3, 6, True, 1, (2, True)),), 0),
+            (
+                '1d8 - 1d4 + 3 - 5',
+                '1d8-1d4+3-5',
+                (DiceTerm(1, 1, 8, False, 0, None), DiceTerm(-1, 1, 4, False, 0, None)),
+                -2
+            )
+        ]
+
+        for expression, normalized, terms, constant in cases:
+            with self.subTest(expression=expression):
+                plan = lambda_function.compile_expression(expression)
+
+                self.assertEqual(normalized, plan.expression)
+                self.assertEqual(terms, plan.terms)
+                self.assertEqual(constant, plan.constant)
+                self.assertEqual(sum(term.count for term in terms), plan.dice)
+
+    def test_errors(self):
+        """Verify the error message of each invalid dice expression.
+        """
+
+        cases = [
+            ('', 'The dice expression must be from 1 to 100 characters.'),
+            ('d6+' * 40, 'The dice expression must be from 1 to 100 characters.'),
+            ('2d6 3', 'The dice expression "2d6 3" is not valid at "3".'),
+            ('2d6+', 'The dice expression "2d6+" is not valid at "+".'),
+            ('2x6', 'The dice expression "2x6" is not valid at "x6".'),
+            ('4d6kh', 'The dice expression "4d6kh" is not valid at "kh".'),
+            ('0d6', 'The dice count must be from "1" to "100", and the number of sides must be from "2" to "1000".'),
+            ('101d6', 'The dice count must be from "1" to "100", and the number of sides must be from "2" to "1000".'),
+            ('1d1', 'The dice count must be from "1" to "100", and the number of sides must be from "2" to "1000".'),
+            ('1d1001', 'The dice count must be from "1" to "100", and the number of sides must be from "2" to "1000".'),
+            ('2d6r6', 'The dice rerolled must be lower than the number of sides.'),
+            ('2d6kh3', 'The dice kept must be from "1" to the dice count.'),
+            ('2d6dl2', 'The dice kept must be from "1" to the dice count.'),
+            ('+'.join(['d6'] * 11), 'The dice expression must have up to 10 dice terms.')
+        ]
+
+        for expression, message in cases:
+            with self.subTest(expression=expression):
+                with self.assertRaises(ValueError) as raised:
+                    lambda_function.compile_expression(expression)
+
+                self.assertEqual(message, str(raised.exception))
+
+    def test_response(self):
+        """Verify the responses of dice expressions, and that invalid ones are answered with "400: Bad Request".
+        """
+
+        status_code, body = invoke({'expr': '2d20adv + 5', 'rolls': '100'})
+
+        self.assertEqual(200, status_code)
+        self.assertEqual('2d20adv+5', body['expression'])
+        self.assertEqual(100, len(body['results']))
+        self.assertTrue(set(body['results']) <= set(range(6, 26)))
+
+        status_code, body = invoke({'expr': '2d6kh3'})
+
+        self.assertEqual(400, status_code)
+        self.assertEqual({'errorMessage': 'The dice kept must be from "1" to the dice count.'}, body)
+
+        for rolls in ('0', 'many', str(lambda_function.RESULTS_MAX_BYTES)):
+            with self.subTest(rolls=rolls):
+                self.assertEqual(400, invoke({'expr': '1d6', 'rolls': rolls})[0])
+
+
+class TestRNG(unittest.TestCase):
+    """Test the random number generators, and the seeds of the 'seeded' generator.
+    """
+
+    def test_seeded(self):
+        """Verify that a seed rolls the same dice again, and is echoed back, for every output.
+        """
+
+        for query_string_parameters in (
+            {'count': '10', 'sides': '6'},
+            {'count': '1000', 'sides': '20', 'output': 'array'},
+            {'count': '1000', 'sides': '20', 'output': 'summary'},
+            {'expr': '4d6kh3+2', 'rolls': '100'}
+        ):
+            with self.subTest(**query_string_parameters):
+                first = invoke(dict(query_string_parameters, seed='abc'))
+                second = invoke(dict(query_string_parameters, seed='abc', rng='seeded'))
+                other = invoke(dict(query_string_parameters, seed='abd'))
+
+                self.assertEqual(200, first[0])
+                self.assertEqual('abc', first[1]['seed'])
+                self.assertEqual(first, second)
+                self.assertNotEqual(first[1], dict(other[1], seed='abc'))
+
+    def test_random_seed(self):
+        """Verify that the 'seeded' generator without a seed echoes back the random seed, which rolls the same dice.
+        """
+
+        status_code, body = invoke({'count': '1000', 'sides': '6', 'output': 'array', 'rng': 'seeded'})
+
+        self.assertEqual(200, status_code)
+        self.assertEqual(body, invoke({'count': '1000', 'sides': '6', 'output': 'array', 'seed': body['seed']})[1])
+
+    def test_seed_refused(self):
+        """Verify that a seed with another generator, or an unknown generator, is answered with "400: Bad Request".
+        """
+
+        for rng in ('fast', 'secure', 'bytes'):
+            with self.subTest(rng=rng):
+                self.assertEqual(400, invoke({'count': '5', 'sides': '6', 'rng': rng, 'seed': '1'})[0])
+                self.assertEqual(400, invoke({'expr': '2d6', 'rng': rng, 'seed': '1'})[0])
+                self.assertEqual(200, invoke({'count': '5', 'sides': '6', 'rng': rng})[0])
+
+        status_code, body = invoke({'count': '5', 'sides': '6', 'rng': 'mt'})
+
+        self.assertEqual(400, status_code)
+        self.assertEqual(
+            {'errorMessage': 'The value for "rng" must be one of "fast", "seeded", "secure", "bytes".'},
+            body
+        )
+
+    def test_bytes_range(self):
+        """Verify that the 'bytes' generator rolls the requested number of dice, within their faces.
+        """
+
+        for sides in (2, 6, 255, 256, 257, 1000):
+            with self.subTest(sides=sides):
+                rolls = lambda_function.bytes_rng(5000, sides)
+
+                self.assertEqual(5000, len(rolls))
+                self.assertTrue(set(rolls) <= set(range(1, sides + 1)))
+
+    def test_bytes_unbiased(self):
+        """Verify that the 'bytes' generator maps every value it keeps to the faces evenly, by rejecting the values at
+        or above the largest multiple of the number of sides.
+        """
+
+        for typecode, sides, values_range in (('B', 6, 256), ('B', 100, 256), ('H', 1000, 65536)):
+            with self.subTest(sides=sides):
+                every_value = array(typecode, range(values_range)).tobytes()
+
+                def urandom(size):
+                    # Every value once, in order, followed by as many of them again as needed
+                    return (every_value * (size // len(every_value) + 1))[:size]
+
+                count = values_range - values_range % sides
+
+                with mock.patch.object(lambda_function, 'urandom', urandom):
+                    rolls = lambda_function.bytes_rng(count, sides)
+
+                self.assertEqual({face: count // sides for face in range(1, sides + 1)}, dict(Counter(rolls)))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -2,18 +2,40 @@
 
 print('Lambda cold-start...')
 
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from fnmatch import translate
 from json import dumps, loads
-from boto3 import resource, client
-from email import message_from_string
+from os import environ
+from threading import Lock
+from time import perf_counter, time
+from boto3 import client
+from botocore.config import Config
+from botocore.exceptions import ClientError
+from email.generator import BytesGenerator
 from email.mime.base import MIMEBase
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
+from email.parser import BytesFeedParser
+from email.policy import default as email_policy
+from io import BytesIO
+import re
+from uuid import uuid4
 
 
 # Disable 'testing_locally' when deploying to AWS Lambda
 testing_locally = True
 verbose = True
 
+# Define the logging of events: DEBUG level events are only logged when 'verbose' is enabled, and
+# events are printed together once per invocation, or sooner when LOG_BUFFER_SIZE events are waiting
+LOG_LEVEL = 'DEBUG' if verbose else 'INFO'
+LOG_BUFFER_SIZE = 100
+
+# Define the CloudWatch Metrics namespace of the metrics logged in Embedded Metric Format
+METRICS_NAMESPACE = 'aws-lambda/ses_inbound_forwarder'
+
 
 # Define the S3 bucket name and key prefix (Ex. 'users/' *Remember to include the trailing slash)
 # Curly-braces "{}" in the key prefix are replaced with the username in the SES Inbound email: 'username'@domain.tld
@@ -24,9 +46,62 @@ s3_key_prefix = 'users/{}/messages/'
 s3_region = 'us-west-2'
 ses_region = 'us-west-2'
 
-# Define where all of the emails will be sent
+# Define the configuration of the S3 and SES clients, which are created once and reused by warm invocations
+aws_config = Config(
+    connect_timeout=2,
+    read_timeout=30,
+    max_pool_connections=10,
+    retries={'max_attempts': 3, 'mode': 'standard'},
+    tcp_keepalive=True
+)
+
+# The S3 and SES clients by service name, created on first use.  Local stand-ins may be assigned for testing,
+# such as "aws_clients['s3'] = LocalS3()", before 'lambda_handler' is invoked.
+aws_clients = {}
+aws_clients_lock = Lock()
+
+# Define how the original message is included in the forwarded email:
+#   'inline' - The original message is parsed, and its parts are added to the forwarded email
+#   'attach' - The original message is attached unchanged as a 'message/rfc822' part, without being parsed, and the
+#              forwarded message heading is built from the 'commonHeaders' of the SES event record
+forward_mode = 'inline'
+
+# The 'inline' original message is parsed and the forwarded email rendered with 'email_policy', which decodes the raw
+# UTF-8 and encoded-word headers of the original message, and encodes the headers of the forwarded email as SES needs.
+
+# Define the size of the largest message that is forwarded, below the 10 MB SES limit to leave room for the
+# forwarded heading.  Larger messages are forwarded as a preview of the first 'preview_size' bytes of the original
+# message, with a presigned S3 link valid for 'presigned_url_expiration' seconds to download all of it.  The link
+# expires sooner when the temporary credentials of the Function's role that sign it do, often within hours, so the
+# forwarded email states no lifetime for it.
+max_forward_size = 9 * 1024 * 1024
+preview_size = 8 * 1024
+presigned_url_expiration = 7 * 24 * 60 * 60
+
+# Define the size of the chunks read from the S3 object, as the message is parsed while it is downloaded
+stream_chunk_size = 64 * 1024
+
+# Define the number of records of an event that are forwarded concurrently (1 forwards them one after another)
+record_workers = 4
+
+# Define where all of the emails will be sent, unless the routing table sends them elsewhere
 dest_email_addr = 'email-addr-goes-here@domain.tld'
 
+# Define the routing table, a JSON object mapping recipients to a list of up to 'max_destinations' destinations,
+# such as '{"sales@domain.tld": ["jane@domain.tld", "john@domain.tld"], "*@support.domain.tld": ["help@domain.tld"]}'.
+# Recipient patterns may use the wildcards '*' and '?', and are matched in order after exact recipients, while
+# recipients without a match are forwarded to 'dest_email_addr'.  An empty list stops emails from being forwarded.
+# The table is set in the Lambda Function environment variable named "ROUTING_TABLE", or read from the S3 object key
+# in "ROUTING_TABLE_S3_KEY" of the S3 bucket, and is loaded once per container and reloaded every
+# 'routing_table_ttl' seconds.
+routing_table_json = environ.get('ROUTING_TABLE')
+routing_table_s3_key = environ.get('ROUTING_TABLE_S3_KEY')
+routing_table_ttl = 300
+
+# Define the number of destinations of each SES request, the SES limit.  An email routed to more destinations is sent
+# by one request per group of 'max_destinations'.
+max_destinations = 50
+
 # The header block above the body of the forwarded email
 forward_statement = (
     "---------- Forwarded message ----------\n"
@@ -37,120 +112,727 @@ forward_statement = (
     "\n"
 )
 
+# The body of the forwarded email, below the header block, when the original message is too large to be forwarded
+oversized_statement = (
+    "The original message ({:,} bytes) is too large to be forwarded.\n"
+    "Download it soon from the link below, which is only valid for a limited time:\n"
+    "{}\n"
+    "\n"
+    "---------- Preview ----------\n"
+    "{}\n"
+)
+
 
 class CWLogs(object):
     """Define the structure of log events to match all other CloudWatch Log Events logged by AWS Lambda.
     """
 
-    def __init__(self, context):
-        """Define the instance of the context object.
+    # Log levels, in increasing order of severity
+    LEVELS = {'DEBUG': 10, 'INFO': 20, 'ERROR': 40}
+
+    # Events waiting to be printed, shared by every instance as they share the same stdout stream
+    buffer = []
+    buffer_lock = Lock()
+
+    def __init__(self, context, level='INFO', buffer_size=0):
+        """Define the instance of the context object, the lowest level logged, and the size of the buffer.
 
         :param context: Lambda context object
+        :param level: Events below this level are neither formatted nor printed (default 'INFO')
+        :param buffer_size: Number of events held before they are printed together (default 0, unbuffered)
         """
 
         self.context = context
+        self.level = self.LEVELS[level]
+        self.buffer_size = int(buffer_size)
+
+    def enabled(self, level):
+        # type: (str) -> bool
+        """Is an event of the specified level logged?
+
+        :param level: The level of the event (required)
+        :return: True if the event would be logged
+        """
+
+        return self.LEVELS[level] >= self.level
 
-    def event(self, message, event_prefix='LOG'):
-        # type: (any, str) -> None
+    def event(self, message, *args, event_prefix='LOG', level='INFO'):
+        # type: (any, any, str, str) -> None
         """Print an event into the CloudWatch Logs stream for the Function's invocation.
 
-        :param message: The information to be logged (required)
+        The message is only rendered when the level is enabled, so a callable returning the message, or a
+        %-style format string with its arguments, defers any costly formatting until it is known to be needed.
+
+        :param message: The information to be logged, or a callable returning it (required)
+        :param args: Arguments for %-style formatting of the message
         :param event_prefix: The prefix that appears before the 'RequestId' (default 'LOG')
+        :param level: The level of the event (default 'INFO')
         :return:
         """
 
-        print('{} RequestId: {}\t{}'.format(
-            event_prefix,
-            self.context.aws_request_id,
-            message
-        ))
+        if self.LEVELS[level] < self.level:
+            return None
+
+        if callable(message):
+            message = message()
+
+        if args:
+            message = message % args
+
+        with self.buffer_lock:
+            self.buffer.append('{} RequestId: {}\t{}'.format(
+                event_prefix,
+                self.context.aws_request_id,
+                message
+            ))
+
+            full = len(self.buffer) >= self.buffer_size
+
+        if full:
+            self.flush()
 
         return None
 
+    def debug(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event that is only needed for debugging.
 
-def lambda_handler(event, context):
-    """AWS Lambda executes the 'lambda_handler' function on invocation.
+        :param message: The information to be logged, or a callable returning it (required)
+        :param args: Arguments for %-style formatting of the message
+        :return:
+        """
 
-    :param event: Ingested JSON event object provided at invocation
-    :param context: Lambda context object, containing information specific to the invocation and Function
-    :return: Final response to AWS Lambda, and passed to the invoker if the invocation type is RequestResponse
+        if self.level > self.LEVELS['DEBUG']:
+            return None
+
+        return self.event(message, *args, level='DEBUG')
+
+    def error(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event describing an error.
+
+        :param message: The information to be logged, or a callable returning it (required)
+        :param args: Arguments for %-style formatting of the message
+        :return:
+        """
+
+        return self.event(message, *args, level='ERROR')
+
+    def flush(self):
+        # type: () -> None
+        """Print all buffered events with a single write to stdout.
+
+        :return:
+        """
+
+        with self.buffer_lock:
+            lines = self.buffer[:]
+            del self.buffer[:]
+
+        if lines:
+            print('\n'.join(lines))
+
+        return None
+
+
+class CWMetrics(object):
+    """Define the aggregation of metrics during an invocation, logged as one CloudWatch Embedded Metric Format event.
     """
 
-    # Instantiate our CloudWatch logging class
-    log = CWLogs(context)
+    def __init__(self, namespace, dimensions=None):
+        """Define the metric namespace and dimensions.
 
-    if verbose is True:
-        log.event('Event: {}'.format(dumps(event)))
+        :param namespace: The CloudWatch Metrics namespace (required)
+        :param dimensions: Dictionary of dimension names and values applied to every metric (default None)
+        """
 
-    log.event('Creating S3 resource and SES client instances')
+        self.namespace = namespace
+        self.dimensions = dict(dimensions or {})
+        self.metrics = OrderedDict()
+        self.lock = Lock()
 
-    # Instantiate the S3 resource and SES client classes
-    s3_resource = resource('s3', region_name=s3_region)
-    ses_client = client('ses', region_name=ses_region)
+    def put(self, name, value, unit='None'):
+        # type: (str, float, str) -> None
+        """Add a value to a metric, which is logged with every other value of the metric in the invocation.
 
-    # There *should* only be one (1) record
-    for record in event['Records']:
-        log.event('Parsing the event record')
+        :param name: The metric name (required)
+        :param value: The metric value (required)
+        :param unit: The CloudWatch unit of the metric (default 'None')
+        :return:
+        """
 
-        # Assign values from the record to variables
-        recipient = record['ses']['receipt']['recipients'][0]
-        username = recipient.split("@")[0]
-        msg_id = record['ses']['mail']['messageId']
+        with self.lock:
+            self.metrics.setdefault(name, (unit, []))[1].append(value)
 
-        # Build the S3 object key from the prefix including the username and the message ID
-        msg_key_prefix = s3_key_prefix.format(username)
-        s3_msg_key = msg_key_prefix + msg_id
+        return None
 
-        log.event('Retrieving email message')
+    def count(self, name, value=1):
+        # type: (str, int) -> None
+        """Increment a counter metric, which is logged as a single value per invocation.
 
-        # Get the message body from the object retrieved from S3
-        s3_obj = s3_resource.Object(ses_inbound_s3_bucket, s3_msg_key)
-        s3_msg_body = s3_obj.get()["Body"].read()
-        msg_body = message_from_string(s3_msg_body)
+        :param name: The metric name (required)
+        :param value: The amount added to the counter (default 1)
+        :return:
+        """
 
-        log.event('Generating new email message.')
+        with self.lock:
+            values = self.metrics.setdefault(name, ('Count', [0]))[1]
+            values[0] += value
 
-        # Create the new email message to be forwarded
-        new_email = MIMEBase("multipart", "mixed")
+        return None
 
-        new_email['Subject'] = 'Fwd: {}'.format(msg_body['subject'])
-        new_email['From'] = recipient
-        new_email['To'] = dest_email_addr
+    @contextmanager
+    def timer(self, name):
+        # type: (str) -> None
+        """Time the enclosed block of code as a metric in milliseconds.
 
-        # Add the 'forwarded' heading to the new message body
-        new_email.attach(MIMEText(forward_statement.format(
-            msg_body['from'],
-            msg_body['date'],
-            msg_body['subject'],
-            msg_body['to']
-        )))
+        :param name: The metric name (required)
+        :return:
+        """
 
-        # Add all the parts from the original message
-        if msg_body.is_multipart():
-            inner_msg = MIMEMultipart("alternative")
-            for part in msg_body.get_payload():
-                inner_msg.attach(part)
-            new_email.attach(inner_msg)
-        else:
-            new_email.attach(MIMEText(msg_body.get_payload()))
+        start = perf_counter()
 
-        if verbose is True:
-            log.event('Email Message: {}'.format(str(new_email).splitlines()))
+        try:
+            yield
+        finally:
+            self.put(name, round((perf_counter() - start) * 1000, 3), unit='Milliseconds')
 
-        log.event('Sending new email message to SES')
+    def render(self):
+        # type: () -> dict
+        """Return the Embedded Metric Format event of the metrics aggregated so far.
 
-        # SES should accept the new message and send it to the recipient
-        ses_response = ses_client.send_raw_email(
-            Source=new_email['From'],
-            Destinations=[new_email['To']],
-            RawMessage={
-                'Data': new_email.as_string()
+        :return: Dictionary of the metric definitions, dimensions, and values
+        """
+
+        emf_event = {
+            '_aws': {
+                'Timestamp': int(time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [list(self.dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, (unit, _) in self.metrics.items()]
+                }]
             }
+        }
+
+        emf_event.update(self.dimensions)
+
+        for name, (_, values) in self.metrics.items():
+            # A metric holds up to 100 values per event
+            emf_event[name] = values[0] if len(values) == 1 else values[:100]
+
+        return emf_event
+
+    def flush(self):
+        # type: () -> None
+        """Print the aggregated metrics as a single log event, which CloudWatch Logs extracts into CloudWatch Metrics.
+
+        :return:
+        """
+
+        with self.lock:
+            emf_event = self.render() if self.metrics else None
+            self.metrics.clear()
+
+        if emf_event is not None:
+            print(dumps(emf_event))
+
+        return None
+
+
+def aws_client(service_name):
+    # type: (str) -> any
+    """Return the shared client for the 's3' or 'ses' service, creating it on first use.
+
+    :param service_name: The AWS service name, 's3' or 'ses' (required)
+    :return: The boto3 client, or the local stand-in assigned to 'aws_clients'
+    """
+
+    try:
+        return aws_clients[service_name]
+    except KeyError:
+        pass
+
+    # Only one client per service is created, even if invocations of the container process records concurrently
+    with aws_clients_lock:
+        if service_name not in aws_clients:
+            region_name = {'s3': s3_region, 'ses': ses_region}[service_name]
+            aws_clients[service_name] = client(service_name, region_name=region_name, config=aws_config)
+
+    return aws_clients[service_name]
+
+
+class RoutingTable(object):
+    """Map the SES Inbound recipients to the email addresses their emails are forwarded to.
+    """
+
+    def __init__(self, ttl):
+        # type: (int) -> None
+        """Define the routing table, which is loaded on first use.
+
+        :param ttl: Number of seconds before the routing table is reloaded (required)
+        """
+
+        self.ttl = ttl
+        self.lock = Lock()
+        self.loaded_at = None
+        self.etag = None
+
+        # Exact recipients by lowercase address, and the compiled recipient patterns in order
+        self.routes = ({}, [])
+
+    @staticmethod
+    def parse(document):
+        # type: (str) -> tuple
+        """Parse the JSON document of the routing table.
+
+        :param document: JSON object mapping recipients to a destination or list of destinations (required)
+        :return: Exact recipients by lowercase address, and the compiled recipient patterns in order
+        :raise ValueError: A recipient has more than 'max_destinations' destinations
+        """
+
+        exact = {}
+        patterns = []
+
+        for recipient, destinations in loads(document).items():
+            if isinstance(destinations, str):
+                destinations = [destinations]
+
+            if len(destinations) > max_destinations:
+                raise ValueError('Recipient {} has {} destinations, more than the limit of {}'.format(
+                    recipient,
+                    len(destinations),
+                    max_destinations
+                ))
+
+            if '*' in recipient or '?' in recipient:
+                patterns.append((re.compile(translate(recipient.lower())), destinations))
+            else:
+                exact[recipient.lower()] = destinations
+
+        return exact, patterns
+
+    def read(self):
+        # type: () -> tuple
+        """Read the JSON document of the routing table.
+
+        :return: JSON document, or None if the S3 object has not changed since it was last read, and its ETag
+        """
+
+        if routing_table_s3_key:
+            kwargs = {'IfNoneMatch': self.etag} if self.etag else {}
+
+            try:
+                s3_obj = aws_client('s3').get_object(
+                    Bucket=ses_inbound_s3_bucket,
+                    Key=routing_table_s3_key,
+                    **kwargs
+                )
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') == '304':
+                    return None, self.etag
+                raise
+
+            return s3_obj['Body'].read().decode('utf-8'), s3_obj.get('ETag')
+
+        return routing_table_json or '{}', None
+
+    def refresh(self, log):
+        # type: (CWLogs) -> None
+        """Load the routing table if it has not been loaded, or was loaded more than 'ttl' seconds ago.  A routing
+        table that fails to reload is kept, while one that fails to load the first time raises the error.
+
+        :param log: CloudWatch Logs object (required)
+        """
+
+        if self.loaded_at is not None and time() - self.loaded_at < self.ttl:
+            return
+
+        with self.lock:
+            if self.loaded_at is not None and time() - self.loaded_at < self.ttl:
+                return
+
+            try:
+                document, etag = self.read()
+
+                # The ETag is kept only once its document is parsed, so that a document that fails to parse is read
+                # again, rather than skipped as unchanged
+                if document is not None:
+                    self.routes = self.parse(document)
+                    self.etag = etag
+                    log.event('Loaded routing table of %s recipients and %s patterns', *map(len, self.routes))
+            except Exception as e:
+                if self.loaded_at is None:
+                    raise
+                log.error('Error: Keeping the current routing table %s %s', type(e), e)
+
+            self.loaded_at = time()
+
+    def destinations(self, recipients):
+        # type: (list) -> list
+        """Look up the destinations of the recipients.
+
+        :param recipients: SES Inbound recipients of an email (required)
+        :return: Destinations of all the recipients, without duplicates
+        """
+
+        exact, patterns = self.routes
+        destinations = []
+
+        for recipient in recipients:
+            recipient = recipient.lower()
+            matched = exact.get(recipient)
+
+            if matched is None:
+                matched = next((dests for pattern, dests in patterns if pattern.match(recipient)), [dest_email_addr])
+
+            for destination in matched:
+                if destination not in destinations:
+                    destinations.append(destination)
+
+        return destinations
+
+
+# The routing table is shared by the invocations of the container
+routing_table = RoutingTable(routing_table_ttl)
+
+
+def common_heading(common_headers):
+    # type: (dict) -> str
+    """Build the 'forwarded' heading from the 'commonHeaders' of an SES event record.
+
+    :param common_headers: The 'commonHeaders' of the SES event record (required)
+    :return: The 'forwarded' heading
+    """
+
+    return forward_statement.format(
+        ', '.join(common_headers.get('from', [])),
+        common_headers.get('date', ''),
+        common_headers.get('subject', ''),
+        ', '.join(common_headers.get('to', []))
+    )
+
+
+def inline_message(recipient, destinations, s3_obj, log, metrics):
+    # type: (str, list, dict, CWLogs, CWMetrics) -> bytes
+    """Build the forwarded email with the parts of the original message, which is parsed as it is downloaded.
+
+    :param recipient: The SES Inbound recipient, who the email is forwarded from (required)
+    :param destinations: The email addresses the email is forwarded to (required)
+    :param s3_obj: Response of the S3 'get_object' request for the original message (required)
+    :param log: CloudWatch Logs object (required)
+    :param metrics: CloudWatch Metrics object (required)
+    :return: The forwarded email
+    """
+
+    # Parse the message as its bytes stream from S3, rather than after reading a complete copy of them
+    with metrics.timer('S3GetObjectLatency'):
+        parser = BytesFeedParser(policy=email_policy)
+
+        for chunk in iter(lambda: s3_obj["Body"].read(stream_chunk_size), b''):
+            parser.feed(chunk)
+
+        msg_body = parser.close()
+
+    # Create the new email message to be forwarded
+    new_email = MIMEBase("multipart", "mixed", policy=email_policy)
+
+    new_email['Subject'] = 'Fwd: {}'.format(msg_body['subject'])
+    new_email['From'] = recipient
+    new_email['To'] = ', '.join(destinations)
+
+    # Add the 'forwarded' heading to the new message body
+    new_email.attach(MIMEText(forward_statement.format(
+        msg_body['from'],
+        msg_body['date'],
+        msg_body['subject'],
+        msg_body['to']
+    ), policy=email_policy))
+
+    # Add all the parts from the original message, which keep their original (encoded) payloads
+    if msg_body.is_multipart():
+        inner_msg = MIMEMultipart("alternative", policy=email_policy)
+        for part in msg_body.get_payload():
+            inner_msg.attach(part)
+        new_email.attach(inner_msg)
+    else:
+        # The original message becomes the part, without the headers that do not describe its content
+        for header in set(msg_body.keys()):
+            if not header.lower().startswith('content-'):
+                del msg_body[header]
+        new_email.attach(msg_body)
+
+    # Log the headers and structure of the message, rather than a copy of its contents
+    log.debug(lambda: 'Email Message: {} {}'.format(
+        new_email.items(),
+        [part.get_content_type() for part in new_email.walk()]
+    ))
+
+    # Render the message as bytes, as they are sent to SES
+    raw_message = BytesIO()
+    BytesGenerator(raw_message, mangle_from_=False, policy=email_policy).flatten(new_email)
+
+    return raw_message.getvalue()
+
+
+def attached_message(recipient, destinations, common_headers, s3_obj, metrics):
+    # type: (str, list, dict, dict, CWMetrics) -> bytearray
+    """Build the forwarded email with the original message attached, which is copied from S3 without being parsed.
+
+    :param recipient: The SES Inbound recipient, who the email is forwarded from (required)
+    :param destinations: The email addresses the email is forwarded to (required)
+    :param common_headers: The 'commonHeaders' of the SES event record (required)
+    :param s3_obj: Response of the S3 'get_object' request for the original message (required)
+    :param metrics: CloudWatch Metrics object (required)
+    :return: The forwarded email
+    """
+
+    # Create the new email message to be forwarded, with the 'forwarded' heading built from the SES event record
+    new_email = MIMEMultipart("mixed", boundary='=_{}'.format(uuid4().hex))
+
+    new_email['Subject'] = 'Fwd: {}'.format(common_headers.get('subject', ''))
+    new_email['From'] = recipient
+    new_email['To'] = ', '.join(destinations)
+
+    new_email.attach(MIMEText(common_heading(common_headers)))
+
+    # Render the new message, and open the part that the original message is copied into
+    raw_message = BytesIO()
+    BytesGenerator(raw_message, mangle_from_=False).flatten(new_email)
+
+    closing_boundary = '--{}--'.format(new_email.get_boundary()).encode('ascii')
+    raw_message = bytearray(raw_message.getvalue().rstrip())
+    del raw_message[-len(closing_boundary):]
+
+    # The original message is copied as it is, so the part declares that it may hold 8-bit data, as raw UTF-8 headers
+    # do, rather than the 7-bit default that a 'message/rfc822' part would otherwise be assumed to use
+    raw_message += (
+        '--{}\n'
+        'Content-Type: message/rfc822\n'
+        'Content-Transfer-Encoding: 8bit\n'
+        'Content-Disposition: attachment; filename="original.eml"\n'
+        '\n'.format(new_email.get_boundary())
+    ).encode('ascii')
+
+    # Copy the original message into the part as it is downloaded
+    with metrics.timer('S3GetObjectLatency'):
+        for chunk in iter(lambda: s3_obj["Body"].read(stream_chunk_size), b''):
+            raw_message += chunk
+
+    raw_message += '\n{}\n'.format(closing_boundary.decode('ascii')).encode('ascii')
+
+    return raw_message
+
+
+def oversized_message(recipient, destinations, common_headers, s3_client, s3_msg_key, msg_size, metrics):
+    # type: (str, list, dict, object, str, int, CWMetrics) -> bytes
+    """Build the forwarded email for a message that is too large to be forwarded, with a preview of the original
+    message read by a ranged GET request, and a presigned S3 link to download all of it.
+
+    :param recipient: The SES Inbound recipient, who the email is forwarded from (required)
+    :param destinations: The email addresses the email is forwarded to (required)
+    :param common_headers: The 'commonHeaders' of the SES event record, or None to read them from the preview (required)
+    :param s3_client: S3 client (required)
+    :param s3_msg_key: S3 object key of the original message (required)
+    :param msg_size: Size of the original message in bytes (required)
+    :param metrics: CloudWatch Metrics object (required)
+    :return: The forwarded email
+    """
+
+    # Read and parse only the start of the original message, which holds its headers and the start of its body.  Like
+    # an 'inline' message, it is parsed with 'email_policy', so that the heading shows the text of encoded headers.
+    with metrics.timer('S3GetObjectLatency'):
+        s3_obj = s3_client.get_object(
+            Bucket=ses_inbound_s3_bucket,
+            Key=s3_msg_key,
+            Range='bytes=0-{}'.format(preview_size - 1)
         )
+        parser = BytesFeedParser(policy=email_policy)
+        parser.feed(s3_obj["Body"].read())
+        msg_preview = parser.close()
+
+    if common_headers is None:
+        common_headers = {
+            'from': [str(msg_preview['from'] or '')],
+            'date': str(msg_preview['date'] or ''),
+            'subject': str(msg_preview['subject'] or ''),
+            'to': [str(msg_preview['to'] or '')]
+        }
+
+    # The preview is the start of the first text part, which may be cut off where the ranged GET request ended
+    preview = ''
+    for part in msg_preview.walk():
+        if part.get_content_maintype() == 'text':
+            payload = part.get_payload(decode=True) or b''
+            preview = payload.decode(part.get_content_charset() or 'utf-8', errors='replace')
+            break
+
+    download_url = s3_client.generate_presigned_url(
+        'get_object',
+        Params={
+            'Bucket': ses_inbound_s3_bucket,
+            'Key': s3_msg_key,
+            'ResponseContentType': 'message/rfc822',
+            'ResponseContentDisposition': 'attachment; filename="original.eml"'
+        },
+        ExpiresIn=presigned_url_expiration
+    )
+
+    new_email = MIMEText(common_heading(common_headers) + oversized_statement.format(
+        msg_size,
+        download_url,
+        preview.strip()
+    ), 'plain', 'utf-8')
+
+    new_email['Subject'] = 'Fwd: {}'.format(common_headers.get('subject', ''))
+    new_email['From'] = recipient
+    new_email['To'] = ', '.join(destinations)
+
+    metrics.count('EmailsOversized')
+
+    raw_message = BytesIO()
+    BytesGenerator(raw_message, mangle_from_=False).flatten(new_email)
+
+    return raw_message.getvalue()
+
+
+def forward_record(record, log, metrics):
+    # type: (dict, CWLogs, CWMetrics) -> dict
+    """Forward the email message of a single SES Inbound event record.
+
+    :param record: SES Inbound event record (required)
+    :param log: CloudWatch Logs object (required)
+    :param metrics: CloudWatch Metrics object (required)
+    :return: Summary of the forwarded message
+    """
+
+    # Retrieve the S3 and SES clients, which are only created by the first invocation of the container
+    s3_client = aws_client('s3')
+    ses_client = aws_client('ses')
+
+    log.event('Parsing the event record')
+
+    # Assign values from the record to variables
+    recipients = record['ses']['receipt']['recipients']
+    recipient = recipients[0]
+    username = recipient.split("@")[0]
+    msg_id = record['ses']['mail']['messageId']
+
+    # Every destination of every recipient receives the same forwarded email
+    destinations = routing_table.destinations(recipients)
+
+    if not destinations:
+        log.event('No destinations for recipients %s, not forwarding', recipients)
+        metrics.count('EmailsNotRouted')
+        return {'MessageId': msg_id, 'Status': 'NotRouted'}
+
+    # Build the S3 object key from the prefix including the username and the message ID
+    msg_key_prefix = s3_key_prefix.format(username)
+    s3_msg_key = msg_key_prefix + msg_id
+
+    log.event('Retrieving email message')
+
+    # The size of the message is known from the response, before any of its body is downloaded
+    s3_obj = s3_client.get_object(Bucket=ses_inbound_s3_bucket, Key=s3_msg_key)
+    msg_size = s3_obj['ContentLength']
+
+    metrics.put('MessageSize', msg_size, unit='Bytes')
+
+    log.event('Generating new email message.')
+
+    common_headers = record['ses']['mail'].get('commonHeaders')
+
+    if msg_size > max_forward_size:
+        log.event('Email message of %s bytes is too large to be forwarded, sending a preview', msg_size)
+        s3_obj['Body'].close()
+        raw_message = oversized_message(recipient, destinations, common_headers, s3_client, s3_msg_key, msg_size, metrics)
+    elif forward_mode == 'attach' and common_headers is not None:
+        raw_message = attached_message(recipient, destinations, common_headers, s3_obj, metrics)
+    else:
+        raw_message = inline_message(recipient, destinations, s3_obj, log, metrics)
+
+    log.event('Sending new email message to SES')
+
+    # SES should accept the new message and send it to up to 'max_destinations' destinations at once, so the recipients
+    # of several table entries are sent the same message by one request per group
+    ses_message_ids = []
+
+    for start in range(0, len(destinations), max_destinations):
+        with metrics.timer('SESSendRawEmailLatency'):
+            ses_response = ses_client.send_raw_email(
+                Source=recipient,
+                Destinations=destinations[start:start + max_destinations],
+                RawMessage={
+                    'Data': raw_message
+                }
+            )
+
+        log.event(lambda: 'SES Response: {}'.format(dumps(ses_response)))
+
+        ses_message_ids.append(ses_response.get('MessageId'))
+
+    metrics.count('EmailsForwarded')
+
+    return {'MessageId': msg_id, 'Status': 'Forwarded', 'SesMessageIds': ses_message_ids}
+
+
+def lambda_handler(event, context):
+    """AWS Lambda executes the 'lambda_handler' function on invocation.
+
+    :param event: Ingested JSON event object provided at invocation
+    :param context: Lambda context object, containing information specific to the invocation and Function
+    :return: Summary of each record, which was forwarded or not routed, passed to the invoker if the invocation type is RequestResponse
+    """
+
+    # Instantiate our CloudWatch logging class
+    log = CWLogs(context, level=LOG_LEVEL, buffer_size=LOG_BUFFER_SIZE)
+
+    # Instantiate our CloudWatch metrics class
+    metrics = CWMetrics(METRICS_NAMESPACE, {'FunctionName': context.function_name})
+
+    log.debug(lambda: 'Event: {}'.format(dumps(event)))
+
+    def forward(record):
+        # A failed record is logged and summarized, without affecting the other records
+        try:
+            return forward_record(record, log, metrics)
+        except Exception as e:
+            log.error('Error: %s %s', type(e), e)
+            metrics.count('EmailsFailed')
+
+            try:
+                msg_id = record['ses']['mail']['messageId']
+            except (TypeError, KeyError):
+                msg_id = None
+
+            return {'MessageId': msg_id, 'Status': 'Failed', 'Error': '{}'.format(e)}
+
+    try:
+        routing_table.refresh(log)
+
+        records = event['Records']
+
+        # Records are forwarded concurrently, so a batch takes about as long as its slowest record
+        if record_workers > 1 and len(records) > 1:
+            with ThreadPoolExecutor(max_workers=min(record_workers, len(records))) as executor:
+                results = list(executor.map(forward, records))
+        else:
+            results = [forward(record) for record in records]
+
+        log.event('Forwarded %s of %s records', sum(result['Status'] == 'Forwarded' for result in results), len(results))
+
+        # SES invokes the Function asynchronously and ignores its response, so only a failed invocation is retried by
+        # AWS Lambda, and sent to the dead-letter queue or failure destination once the retries are exhausted
+        failed = [result for result in results if result['Status'] == 'Failed']
 
-        log.event('SES Response: {}'.format(dumps(ses_response)))
+        if failed:
+            raise RuntimeError('Failed to forward {} of {} records: {}'.format(len(failed), len(results), dumps(failed)))
 
-    return None
+        return {'Records': results}
+    finally:
+        # Print the buffered log events and aggregated metrics once per invocation
+        log.flush()
+        metrics.flush()
 
 
 def local_test():
@@ -166,5 +848,5 @@ def local_test():
 
     lambda_handler(event, context)
 
-if testing_locally is True:
+if testing_locally and __name__ == '__main__':
     local_test()
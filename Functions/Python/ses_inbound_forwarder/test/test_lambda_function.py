@@ -0,0 +1,514 @@
+"""Created By: Andrew Ryan DeFilippis"""
+
+import contextlib
+import copy
+import email
+import unittest
+from email.policy import default as email_policy
+from io import BytesIO, StringIO
+from json import dumps, load
+from unittest import mock
+
+import context
+
+with contextlib.redirect_stdout(StringIO()):
+    import lambda_function
+
+from botocore.exceptions import ClientError
+
+
+with open('event.json', 'r') as f:
+    EVENT = load(f)
+
+MESSAGE = (
+    b'From: Jane Doe <janedoe@example.com>\r\n'
+    b'To: johndoe@example.com\r\n'
+    b'Subject: Test Subject\r\n'
+    b'Date: Wed, 7 Oct 2015 12:34:56 -0700\r\n'
+    b'MIME-Version: 1.0\r\n'
+    b'Content-Type: text/plain; charset=utf-8\r\n'
+    b'\r\n'
+    b'Hello there\r\n'
+)
+
+
+class LocalS3(object):
+    """Answer the S3 client calls of the Function from objects in memory.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self.requests = []
+
+    def put(self, key, body, etag=None):
+        self.objects[key] = (body, etag)
+
+    def get_object(self, Bucket, Key, Range=None, IfNoneMatch=None):
+        self.requests.append((Key, Range, IfNoneMatch))
+
+        if Key not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey'}}, 'GetObject')
+
+        body, etag = self.objects[Key]
+
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            raise ClientError({'Error': {'Code': '304'}}, 'GetObject')
+
+        if Range is not None:
+            body = body[:int(Range.rpartition('-')[2]) + 1]
+
+        return {'Body': BytesIO(body), 'ContentLength': len(self.objects[Key][0]), 'ETag': etag}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn):
+        return 'https://s3.example.com/{}?expires={}'.format(Params['Key'], ExpiresIn)
+
+
+class LocalSES(object):
+    """Record the emails sent through the SES client.
+    """
+
+    def __init__(self):
+        self.sent = []
+
+    def send_raw_email(self, Source, Destinations, RawMessage):
+        self.sent.append({'Source': Source, 'Destinations': Destinations, 'Data': bytes(RawMessage['Data'])})
+
+        return {'MessageId': 'ses-{}'.format(len(self.sent))}
+
+
+class FunctionTestCase(unittest.TestCase):
+    """Invoke the Function with local S3 and SES stand-ins, and a routing table that is loaded again by each test.
+    """
+
+    def setUp(self):
+        self.s3 = LocalS3()
+        self.ses = LocalSES()
+
+        patcher = mock.patch.dict(lambda_function.aws_clients, {'s3': self.s3, 'ses': self.ses})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.routing_table = lambda_function.RoutingTable(lambda_function.routing_table_ttl)
+        self.patch('routing_table', self.routing_table)
+        self.patch('routing_table_json', None)
+        self.patch('routing_table_s3_key', None)
+        self.patch('LOG_LEVEL', 'INFO')
+
+    def patch(self, name, value):
+        """Replace a module attribute of the Function until the end of the test.
+        """
+
+        patcher = mock.patch.object(lambda_function, name, value)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def event(self, recipients=None, message_id=None):
+        """Return the test event, with its recipients or message ID replaced.
+        """
+
+        event = copy.deepcopy(EVENT)
+        record = event['Records'][0]
+
+        if recipients is not None:
+            record['ses']['receipt']['recipients'] = recipients
+
+        if message_id is not None:
+            record['ses']['mail']['messageId'] = message_id
+
+        return event
+
+    def put_message(self, event, message=MESSAGE):
+        """Store the original message of each record of the event in S3.
+        """
+
+        for record in event['Records']:
+            username = record['ses']['receipt']['recipients'][0].split('@')[0]
+            key = lambda_function.s3_key_prefix.format(username) + record['ses']['mail']['messageId']
+            self.s3.put(key, message)
+
+    def invoke(self, event):
+        with contextlib.redirect_stdout(StringIO()):
+            return lambda_function.lambda_handler(event, context)
+
+
+class TestRoutingTable(FunctionTestCase):
+    """Test the routing of recipients to their destinations.
+    """
+
+    def test_exact_before_pattern(self):
+        """Verify that exact recipients are matched before patterns, patterns in order, and others go to the default.
+        """
+
+        self.patch('routing_table_json', dumps({
+            '*@example.com': ['any@domain.tld'],
+            'Sales@Example.com': ['jane@domain.tld', 'john@domain.tld'],
+            's*@example.com': ['s@domain.tld'],
+            'single@example.org': 'one@domain.tld'
+        }))
+        self.routing_table.refresh(lambda_function.CWLogs(context))
+
+        self.assertEqual(['jane@domain.tld', 'john@domain.tld'], self.routing_table.destinations(['sales@example.com']))
+        self.assertEqual(['any@domain.tld'], self.routing_table.destinations(['support@EXAMPLE.com']))
+        self.assertEqual(['one@domain.tld'], self.routing_table.destinations(['single@example.org']))
+        self.assertEqual([lambda_function.dest_email_addr], self.routing_table.destinations(['other@example.org']))
+        self.assertEqual(
+            ['jane@domain.tld', 'john@domain.tld', 'any@domain.tld'],
+            self.routing_table.destinations(['sales@example.com', 'other@example.com', 'SALES@example.com'])
+        )
+
+    def test_not_routed(self):
+        """Verify that an email whose recipients have no destinations is neither downloaded nor sent.
+        """
+
+        self.patch('routing_table_json', dumps({'noreply@example.com': []}))
+
+        event = self.event(recipients=['noreply@example.com'])
+        result = self.invoke(event)
+
+        self.assertEqual(
+            {'Records': [{'MessageId': event['Records'][0]['ses']['mail']['messageId'], 'Status': 'NotRouted'}]},
+            result
+        )
+        self.assertEqual([], self.s3.requests)
+        self.assertEqual([], self.ses.sent)
+
+    def test_max_destinations(self):
+        """Verify that a recipient with too many destinations is rejected, and that more are sent in groups.
+        """
+
+        with self.assertRaises(ValueError):
+            lambda_function.RoutingTable.parse(dumps({
+                'all@example.com': ['{}@domain.tld'.format(i) for i in range(lambda_function.max_destinations + 1)]
+            }))
+
+        self.patch('routing_table_json', dumps({
+            'a@example.com': ['a{}@domain.tld'.format(i) for i in range(40)],
+            'b@example.com': ['b{}@domain.tld'.format(i) for i in range(40)]
+        }))
+
+        event = self.event(recipients=['a@example.com', 'b@example.com'])
+        self.put_message(event)
+        result = self.invoke(event)
+
+        self.assertEqual(['ses-1', 'ses-2'], result['Records'][0]['SesMessageIds'])
+        self.assertEqual([50, 30], [len(sent['Destinations']) for sent in self.ses.sent])
+        self.assertEqual(80, len(set(sum((sent['Destinations'] for sent in self.ses.sent), []))))
+
+    def test_s3_refresh(self):
+        """Verify that the S3 routing table is reloaded after its TTL, and only downloaded again once changed.
+        """
+
+        log = lambda_function.CWLogs(context)
+        self.patch('routing_table_s3_key', 'routing.json')
+        self.s3.put('routing.json', dumps({'a@example.com': ['one@domain.tld']}).encode('utf-8'), etag='"1"')
+
+        now = [1000.0]
+        self.patch('time', lambda: now[0])
+
+        with contextlib.redirect_stdout(StringIO()):
+            self.routing_table.refresh(log)
+            self.routing_table.refresh(log)
+
+            self.assertEqual([('routing.json', None, None)], self.s3.requests)
+
+            now[0] += self.routing_table.ttl
+            self.routing_table.refresh(log)
+
+            self.assertEqual(('routing.json', None, '"1"'), self.s3.requests[-1])
+            self.assertEqual(['one@domain.tld'], self.routing_table.destinations(['a@example.com']))
+
+            self.s3.put('routing.json', dumps({'a@example.com': ['two@domain.tld']}).encode('utf-8'), etag='"2"')
+            now[0] += self.routing_table.ttl
+            self.routing_table.refresh(log)
+
+            self.assertEqual(['two@domain.tld'], self.routing_table.destinations(['a@example.com']))
+            self.assertEqual('"2"', self.routing_table.etag)
+
+            # A document that fails to load keeps the current table, and is read again in full once fixed
+            self.s3.put('routing.json', b'{', etag='"3"')
+            now[0] += self.routing_table.ttl
+            self.routing_table.refresh(log)
+
+            self.assertEqual(['two@domain.tld'], self.routing_table.destinations(['a@example.com']))
+            self.assertEqual('"2"', self.routing_table.etag)
+
+        self.assertEqual(4, len(self.s3.requests))
+
+
+class TestAttachedMessage(FunctionTestCase):
+    """Test the forwarded emails that attach the original message unchanged.
+    """
+
+    def test_attached_8bit(self):
+        """Verify that the original message, with raw UTF-8 headers, is attached byte for byte as an 8-bit part.
+        """
+
+        self.patch('forward_mode', 'attach')
+
+        message = MESSAGE.replace(b'Subject: Test Subject', 'Subject: Grüße'.encode('utf-8'))
+        event = self.event()
+        self.put_message(event, message)
+
+        self.assertEqual('Forwarded', self.invoke(event)['Records'][0]['Status'])
+
+        forwarded = email.message_from_bytes(self.ses.sent[0]['Data'], policy=email_policy)
+        attachment = forwarded.get_payload()[1]
+
+        self.assertEqual('message/rfc822', attachment.get_content_type())
+        self.assertEqual('8bit', attachment['Content-Transfer-Encoding'])
+        self.assertEqual('original.eml', attachment.get_filename())
+        self.assertIn(message, self.ses.sent[0]['Data'])
+
+
+class TestForwardedMessage(FunctionTestCase):
+    """Test the forwarded emails built from the original message, inline or attached.
+    """
+
+    MULTIPART = (
+        b'From: =?utf-8?q?Jos=C3=A9?= <jose@example.com>\r\n'
+        b'To: johndoe@example.com\r\n'
+        b'Subject: =?utf-8?b?R3LDvMOfZQ==?=\r\n'
+        b'Date: Wed, 7 Oct 2015 12:34:56 -0700\r\n'
+        b'MIME-Version: 1.0\r\n'
+        b'Content-Type: multipart/mixed; boundary=XX\r\n'
+        b'\r\n'
+        b'--XX\r\n'
+        b'Content-Type: text/plain; charset=utf-8\r\n'
+        b'\r\n'
+        b'Hello there\r\n'
+        b'--XX\r\n'
+        b'Content-Type: application/octet-stream\r\n'
+        b'Content-Transfer-Encoding: base64\r\n'
+        b'Content-Disposition: attachment; filename=a.bin\r\n'
+        b'\r\n'
+        b'AAECAwQ=\r\n'
+        b'--XX--\r\n'
+    )
+
+    def forward(self, message, event=None):
+        """Forward a message, and return the forwarded email as SES was sent it, and parsed.
+        """
+
+        event = event or self.event()
+        self.put_message(event, message)
+
+        self.assertEqual('Forwarded', self.invoke(event)['Records'][0]['Status'])
+
+        data = self.ses.sent[-1]['Data']
+
+        # The headers of the forwarded email are encoded for SES, whatever the headers of the original message were
+        data[:data.index(b'\n\n')].decode('ascii')
+
+        return data, email.message_from_bytes(data, policy=email_policy)
+
+    def test_inline_multipart(self):
+        """Verify that the parts of a multipart message, and its encoded-word headers, are forwarded inline.
+        """
+
+        data, forwarded = self.forward(self.MULTIPART)
+
+        self.assertEqual('Fwd: Grüße', forwarded['Subject'])
+        self.assertEqual('johndoe@example.com', forwarded['From'])
+        self.assertEqual(lambda_function.dest_email_addr, forwarded['To'])
+        self.assertEqual(
+            ['multipart/mixed', 'text/plain', 'multipart/alternative', 'text/plain', 'application/octet-stream'],
+            [part.get_content_type() for part in forwarded.walk()]
+        )
+
+        heading, inner = forwarded.get_payload()
+        self.assertIn('From: José <jose@example.com>\n', heading.get_content())
+        self.assertIn('Subject: Grüße\n', heading.get_content())
+        self.assertEqual('Hello there', inner.get_payload()[0].get_content())
+        self.assertEqual(b'\x00\x01\x02\x03\x04', inner.get_payload()[1].get_content())
+        self.assertEqual('a.bin', inner.get_payload()[1].get_filename())
+
+    def test_inline_raw_utf8(self):
+        """Verify that a single part message with raw UTF-8 headers is forwarded inline, without its other headers.
+        """
+
+        message = MESSAGE.replace(b'Subject: Test Subject', 'Subject: Grüße 🎲'.encode('utf-8'))
+        data, forwarded = self.forward(message)
+
+        self.assertEqual('Fwd: Grüße 🎲', forwarded['Subject'])
+        self.assertEqual(
+            ['multipart/mixed', 'text/plain', 'text/plain'],
+            [part.get_content_type() for part in forwarded.walk()]
+        )
+
+        heading, body = forwarded.get_payload()
+        self.assertIn('Subject: Grüße 🎲\n', heading.get_content())
+        self.assertEqual('Hello there\n', body.get_content())
+        self.assertIsNone(body['Subject'])
+
+    def test_attached(self):
+        """Verify that the attached original message is copied unchanged, with the heading from 'commonHeaders'.
+        """
+
+        self.patch('forward_mode', 'attach')
+
+        event = self.event()
+        event['Records'][0]['ses']['mail']['commonHeaders']['subject'] = 'Grüße'
+
+        with mock.patch.object(lambda_function, 'BytesFeedParser', side_effect=AssertionError('Parsed')):
+            data, forwarded = self.forward(self.MULTIPART, event)
+
+        self.assertEqual('Fwd: Grüße', forwarded['Subject'])
+        self.assertEqual(
+            ['text/plain', 'message/rfc822'],
+            [part.get_content_type() for part in forwarded.get_payload()]
+        )
+        self.assertIn('From: Jane Doe <janedoe@example.com>\n', forwarded.get_payload()[0].get_content())
+        self.assertIn(self.MULTIPART, data)
+
+    def test_attached_without_common_headers(self):
+        """Verify that a record without 'commonHeaders' is forwarded inline, even in the 'attach' mode.
+        """
+
+        self.patch('forward_mode', 'attach')
+
+        event = self.event()
+        del event['Records'][0]['ses']['mail']['commonHeaders']
+
+        data, forwarded = self.forward(self.MULTIPART, event)
+
+        self.assertEqual('Fwd: Grüße', forwarded['Subject'])
+        self.assertNotIn('message/rfc822', [part.get_content_type() for part in forwarded.walk()])
+
+
+class TestOversizedMessage(FunctionTestCase):
+    """Test the forwarded emails of messages too large to be forwarded, which link to the original message instead.
+    """
+
+    def setUp(self):
+        super(TestOversizedMessage, self).setUp()
+
+        self.patch('max_forward_size', 100)
+        self.patch('preview_size', 200)
+
+    def forward(self, event):
+        """Forward the oversized message of the event, and return the forwarded email as SES was sent it, and parsed.
+        """
+
+        message = TestForwardedMessage.MULTIPART + b'A' * 1000
+        self.put_message(event, message)
+
+        self.assertEqual('Forwarded', self.invoke(event)['Records'][0]['Status'])
+
+        data = self.ses.sent[-1]['Data']
+
+        # The headers of the forwarded email are encoded for SES, whatever the headers of the original message were
+        data[:data.index(b'\n\n')].decode('ascii')
+
+        return email.message_from_bytes(data, policy=email_policy)
+
+    def test_oversized(self):
+        """Verify that only the preview is downloaded, and that the forwarded email links to the original message.
+        """
+
+        event = self.event()
+        event['Records'][0]['ses']['mail']['commonHeaders']['subject'] = 'Grüße'
+        key = lambda_function.s3_key_prefix.format('johndoe') + event['Records'][0]['ses']['mail']['messageId']
+
+        forwarded = self.forward(event)
+        content = forwarded.get_content()
+
+        self.assertEqual([(key, None, None), (key, 'bytes=0-199', None)], self.s3.requests)
+        self.assertEqual('Fwd: Grüße', forwarded['Subject'])
+        self.assertEqual('text/plain', forwarded.get_content_type())
+        self.assertIn('Subject: Grüße\n', content)
+        self.assertIn('The original message ({:,} bytes) is too large'.format(len(self.s3.objects[key][0])), content)
+        self.assertIn(
+            'https://s3.example.com/{}?expires={}'.format(key, lambda_function.presigned_url_expiration),
+            content
+        )
+
+    def test_oversized_without_common_headers(self):
+        """Verify that the heading of a record without 'commonHeaders' is read from the preview, and the text preview
+        is the start of the first text part.
+        """
+
+        event = self.event()
+        del event['Records'][0]['ses']['mail']['commonHeaders']
+        self.patch('preview_size', 600)
+
+        forwarded = self.forward(event)
+        content = forwarded.get_content()
+
+        self.assertEqual('Fwd: Grüße', forwarded['Subject'])
+        self.assertIn('From: José <jose@example.com>\n', content)
+        self.assertIn('---------- Preview ----------\nHello there\n', content)
+
+
+class TestRecords(FunctionTestCase):
+    """Test the records of an event, which are forwarded independently.
+    """
+
+    def records(self, count, missing=()):
+        """Return an event of several records, storing the original message of each one but those 'missing'.
+        """
+
+        event = {'Records': [self.event(message_id='message-{}'.format(i))['Records'][0] for i in range(count)]}
+
+        self.put_message(event)
+
+        for i in missing:
+            key = lambda_function.s3_key_prefix.format('johndoe') + 'message-{}'.format(i)
+            del self.s3.objects[key]
+
+        return event
+
+    def test_records(self):
+        """Verify that every record is forwarded, and summarized in the order of the event.
+        """
+
+        for workers in (1, 4):
+            with self.subTest(record_workers=workers):
+                self.patch('record_workers', workers)
+                self.ses.sent = []
+
+                result = self.invoke(self.records(6))
+
+                self.assertEqual(
+                    ['message-{}'.format(i) for i in range(6)],
+                    [record['MessageId'] for record in result['Records']]
+                )
+                self.assertEqual({'Forwarded'}, {record['Status'] for record in result['Records']})
+                self.assertEqual(6, len(self.ses.sent))
+
+    def test_failed_record(self):
+        """Verify that a failed record does not stop the others from being forwarded, and then fails the invocation.
+        """
+
+        for workers in (1, 4):
+            with self.subTest(record_workers=workers):
+                self.patch('record_workers', workers)
+                self.ses.sent = []
+                output = StringIO()
+
+                with contextlib.redirect_stdout(output), self.assertRaises(RuntimeError) as raised:
+                    lambda_function.lambda_handler(self.records(4, missing=(1,)), context)
+
+                self.assertEqual(3, len(self.ses.sent))
+                self.assertIn('Failed to forward 1 of 4 records', str(raised.exception))
+                self.assertIn('"MessageId": "message-1", "Status": "Failed"', str(raised.exception))
+
+                # The log events and metrics of the failed invocation are still printed
+                self.assertIn('"EmailsFailed": 1', output.getvalue())
+                self.assertIn('"EmailsForwarded": 3', output.getvalue())
+
+    def test_invalid_record(self):
+        """Verify that a record missing its message ID is summarized as failed, without one.
+        """
+
+        event = self.records(2)
+        del event['Records'][0]['ses']['mail']
+
+        with self.assertRaises(RuntimeError) as raised:
+            self.invoke(event)
+
+        self.assertIn('"MessageId": null, "Status": "Failed"', str(raised.exception))
+        self.assertEqual(1, len(self.ses.sent))
+
+
+if __name__ == '__main__':
+    unittest.main()
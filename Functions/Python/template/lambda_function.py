@@ -2,39 +2,238 @@
 
 print('Lambda cold-start...')
 
+from collections import OrderedDict
+from contextlib import contextmanager
 from json import dumps, loads
+from threading import Lock
+from time import perf_counter, time
 
 # Disable 'testing_locally' when deploying to AWS Lambda
 testing_locally = True
 verbose = True
 
+# Define the logging of events: DEBUG level events are only logged when 'verbose' is enabled, and
+# events are printed together once per invocation, or sooner when LOG_BUFFER_SIZE events are waiting
+LOG_LEVEL = 'DEBUG' if verbose else 'INFO'
+LOG_BUFFER_SIZE = 100
+
+# Define the CloudWatch Metrics namespace of the metrics logged in Embedded Metric Format
+METRICS_NAMESPACE = 'aws-lambda'
+
 
 class CWLogs(object):
     """Define the structure of log events to match all other CloudWatch Log Events logged by AWS Lambda.
     """
 
-    def __init__(self, context):
-        """Define the instance of the context object.
+    # Log levels, in increasing order of severity.
+    LEVELS = {'DEBUG': 10, 'INFO': 20, 'ERROR': 40}
+
+    # Events waiting to be printed, shared by every instance as they share the same stdout stream.
+    buffer = []
+    buffer_lock = Lock()
+
+    def __init__(self, context, level='INFO', buffer_size=0):
+        """Define the instance of the context object, the lowest level logged, and the size of the buffer.
 
         :param context: The Lambda context object.
+        :param level: Events below this level are neither formatted nor printed (default 'INFO').
+        :param buffer_size: Number of events held before they are printed together (default 0, unbuffered).
         """
 
         self.context = context
+        self.level = self.LEVELS[level]
+        self.buffer_size = int(buffer_size)
+
+    def enabled(self, level):
+        # type: (str) -> bool
+        """Is an event of the specified level logged?
 
-    def event(self, message, event_prefix='LOG'):
-        # type: (any, str) -> None
+        :param level: The level of the event (required).
+        :return: True if the event would be logged.
+        """
+
+        return self.LEVELS[level] >= self.level
+
+    def event(self, message, *args, event_prefix='LOG', level='INFO'):
+        # type: (any, any, str, str) -> None
         """Print an event into the CloudWatch Logs stream for the Function's invocation.
 
-        :param message: The information to be logged (required).
+        The message is only rendered when the level is enabled, so a callable returning the message, or a
+        %-style format string with its arguments, defers any costly formatting until it is known to be needed.
+
+        :param message: The information to be logged, or a callable returning it (required).
+        :param args: Arguments for %-style formatting of the message.
         :param event_prefix: The prefix that appears before the 'RequestId' (default 'LOG').
+        :param level: The level of the event (default 'INFO').
         :return:
         """
 
-        print('{} RequestId: {}\t{}'.format(
-            event_prefix,
-            self.context.aws_request_id,
-            message
-        ))
+        if self.LEVELS[level] < self.level:
+            return None
+
+        if callable(message):
+            message = message()
+
+        if args:
+            message = message % args
+
+        with self.buffer_lock:
+            self.buffer.append('{} RequestId: {}\t{}'.format(
+                event_prefix,
+                self.context.aws_request_id,
+                message
+            ))
+
+            full = len(self.buffer) >= self.buffer_size
+
+        if full:
+            self.flush()
+
+        return None
+
+    def debug(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event that is only needed for debugging.
+
+        :param message: The information to be logged, or a callable returning it (required).
+        :param args: Arguments for %-style formatting of the message.
+        :return:
+        """
+
+        if self.level > self.LEVELS['DEBUG']:
+            return None
+
+        return self.event(message, *args, level='DEBUG')
+
+    def error(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event describing an error.
+
+        :param message: The information to be logged, or a callable returning it (required).
+        :param args: Arguments for %-style formatting of the message.
+        :return:
+        """
+
+        return self.event(message, *args, level='ERROR')
+
+    def flush(self):
+        # type: () -> None
+        """Print all buffered events with a single write to stdout.
+
+        :return:
+        """
+
+        with self.buffer_lock:
+            lines = self.buffer[:]
+            del self.buffer[:]
+
+        if lines:
+            print('\n'.join(lines))
+
+        return None
+
+
+class CWMetrics(object):
+    """Define the aggregation of metrics during an invocation, logged as one CloudWatch Embedded Metric Format event.
+    """
+
+    def __init__(self, namespace, dimensions=None):
+        """Define the metric namespace and dimensions.
+
+        :param namespace: The CloudWatch Metrics namespace (required).
+        :param dimensions: Dictionary of dimension names and values applied to every metric (default None).
+        """
+
+        self.namespace = namespace
+        self.dimensions = dict(dimensions or {})
+        self.metrics = OrderedDict()
+        self.lock = Lock()
+
+    def put(self, name, value, unit='None'):
+        # type: (str, float, str) -> None
+        """Add a value to a metric, which is logged with every other value of the metric in the invocation.
+
+        :param name: The metric name (required).
+        :param value: The metric value (required).
+        :param unit: The CloudWatch unit of the metric (default 'None').
+        :return:
+        """
+
+        with self.lock:
+            self.metrics.setdefault(name, (unit, []))[1].append(value)
+
+        return None
+
+    def count(self, name, value=1):
+        # type: (str, int) -> None
+        """Increment a counter metric, which is logged as a single value per invocation.
+
+        :param name: The metric name (required).
+        :param value: The amount added to the counter (default 1).
+        :return:
+        """
+
+        with self.lock:
+            values = self.metrics.setdefault(name, ('Count', [0]))[1]
+            values[0] += value
+
+        return None
+
+    @contextmanager
+    def timer(self, name):
+        # type: (str) -> None
+        """Time the enclosed block of code as a metric in milliseconds.
+
+        :param name: The metric name (required).
+        :return:
+        """
+
+        start = perf_counter()
+
+        try:
+            yield
+        finally:
+            self.put(name, round((perf_counter() - start) * 1000, 3), unit='Milliseconds')
+
+    def render(self):
+        # type: () -> dict
+        """Return the Embedded Metric Format event of the metrics aggregated so far.
+
+        :return: Dictionary of the metric definitions, dimensions, and values.
+        """
+
+        emf_event = {
+            '_aws': {
+                'Timestamp': int(time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [list(self.dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, (unit, _) in self.metrics.items()]
+                }]
+            }
+        }
+
+        emf_event.update(self.dimensions)
+
+        for name, (_, values) in self.metrics.items():
+            # A metric holds up to 100 values per event.
+            emf_event[name] = values[0] if len(values) == 1 else values[:100]
+
+        return emf_event
+
+    def flush(self):
+        # type: () -> None
+        """Print the aggregated metrics as a single log event, which CloudWatch Logs extracts into CloudWatch Metrics.
+
+        :return:
+        """
+
+        with self.lock:
+            emf_event = self.render() if self.metrics else None
+            self.metrics.clear()
+
+        if emf_event is not None:
+            print(dumps(emf_event))
 
         return None
 
@@ -48,17 +247,26 @@ def lambda_handler(event, context):
     """
 
     # Instantiate our CloudWatch logging class
-    log = CWLogs(context)
+    log = CWLogs(context, level=LOG_LEVEL, buffer_size=LOG_BUFFER_SIZE)
+
+    # Instantiate our CloudWatch metrics class
+    metrics = CWMetrics(METRICS_NAMESPACE, {'FunctionName': context.function_name})
+
+    try:
+        # Log the event object provided to the Lambda Function at invocation
+        log.debug(lambda: 'Event: {}'.format(dumps(event)))
 
-    # Log the event object provided to the Lambda Function at invocation
-    if verbose:
-        log.event('Event: {}'.format(dumps(event)))
+        log.event('Hello World!')
 
-    log.event('Hello World!')
+        response = {'Hello': 'World!'}
 
-    response = {'Hello': 'World!'}
+        metrics.count('HelloWorld')
 
-    return response
+        return response
+    finally:
+        # Print the buffered log events and aggregated metrics once per invocation, even if the invocation failed
+        log.flush()
+        metrics.flush()
 
 
 def local_test():
@@ -4,6 +4,8 @@ import contextlib
 import re
 import unittest
 from io import StringIO
+from json import loads
+from unittest import mock
 
 import context
 import lambda_function
@@ -36,6 +38,88 @@ class TestLambdaFunction(unittest.TestCase):
 
         self.assertIsNotNone(event)
 
+    def test_cwlogs_event_level(self):
+        """Verify that events below the log level are neither formatted nor printed.
+        """
+
+        log = lambda_function.CWLogs(context, level='INFO')
+
+        def message():
+            raise AssertionError('A DEBUG level message was formatted')
+
+        output = StringIO()
+
+        with contextlib.redirect_stdout(output):
+            log.debug(message)
+            log.event('Message %s', 1)
+
+        self.assertEqual(1, len(output.getvalue().splitlines()))
+        self.assertTrue(output.getvalue().strip().endswith('\tMessage 1'))
+
+    def test_cwlogs_event_buffer(self):
+        """Verify that buffered events are only printed once flushed, in the order they were logged.
+        """
+
+        log = lambda_function.CWLogs(context, buffer_size=10)
+
+        output = StringIO()
+
+        with contextlib.redirect_stdout(output):
+            log.event('First')
+            log.event('Second')
+
+            self.assertEqual('', output.getvalue())
+
+            log.flush()
+
+        lines = output.getvalue().splitlines()
+
+        self.assertEqual(2, len(lines))
+        self.assertTrue(lines[0].endswith('\tFirst'))
+        self.assertTrue(lines[1].endswith('\tSecond'))
+
+    def test_cwmetrics_emf_event(self):
+        """Verify the Embedded Metric Format event of the metrics aggregated during an invocation.
+        """
+
+        metrics = lambda_function.CWMetrics('Namespace', {'FunctionName': 'template'})
+
+        metrics.count('Requests')
+        metrics.count('Requests', 2)
+        metrics.put('Latency', 1.5, unit='Milliseconds')
+        metrics.put('Latency', 2.5, unit='Milliseconds')
+
+        with metrics.timer('Work'):
+            pass
+
+        output = StringIO()
+
+        with contextlib.redirect_stdout(output):
+            metrics.flush()
+            metrics.flush()
+
+        lines = output.getvalue().splitlines()
+
+        self.assertEqual(1, len(lines))
+
+        event = loads(lines[0])
+        directive = event['_aws']['CloudWatchMetrics'][0]
+
+        self.assertEqual('Namespace', directive['Namespace'])
+        self.assertEqual([['FunctionName']], directive['Dimensions'])
+        self.assertEqual(
+            [
+                {'Name': 'Requests', 'Unit': 'Count'},
+                {'Name': 'Latency', 'Unit': 'Milliseconds'},
+                {'Name': 'Work', 'Unit': 'Milliseconds'}
+            ],
+            directive['Metrics']
+        )
+        self.assertEqual('template', event['FunctionName'])
+        self.assertEqual(3, event['Requests'])
+        self.assertEqual([1.5, 2.5], event['Latency'])
+        self.assertGreaterEqual(event['Work'], 0)
+
     def test_invocation_response(self):
         """Verify successful invocation of the Function.
         """
@@ -45,6 +129,18 @@ class TestLambdaFunction(unittest.TestCase):
 
         self.assertEqual(expected_result, result)
 
+    def test_invocation_failure_flushed(self):
+        """Verify that the buffered log events are printed even if the invocation fails.
+        """
+
+        output = StringIO()
+
+        with mock.patch.object(lambda_function.CWMetrics, 'count', side_effect=RuntimeError('Failed')), \
+                contextlib.redirect_stdout(output), self.assertRaises(RuntimeError):
+            lambda_function.lambda_handler({}, context)
+
+        self.assertTrue(output.getvalue().strip().endswith('\tHello World!'))
+
 
 if __name__ == '__main__':
     unittest.main()
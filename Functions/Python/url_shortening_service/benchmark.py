@@ -0,0 +1,398 @@
+"""Created By: Andrew Ryan DeFilippis"""
+
+import argparse
+import contextlib
+import itertools
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import timeit
+from collections import Counter
+from json import dumps, loads
+
+# A region is required to build the boto3 DynamoDB client, although no request reaches AWS.
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-west-2')
+
+# The local runner, shared by the Functions, is one directory up.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import context
+import lambda_function
+import local_runner
+
+
+class LocalDynamoDB(object):
+    """Answer the DynamoDB client calls made by the Function without a network round trip, so that the Function of
+    any revision is timed against the same stand-in.
+    """
+
+    def __init__(self):
+        self.items = {'a1b2c3d': 'https://www.example.com/'}
+
+    def get_item(self, TableName, Key, **kwargs):
+        url_id = Key['ID']['S']
+
+        if url_id in self.items:
+            return {'Item': {'ID': {'S': url_id}, 'Endpoint': {'S': self.items[url_id]}}}
+
+        return {}
+
+    def put_item(self, TableName, Item, **kwargs):
+        self.items[Item['ID']['S']] = Item['Endpoint']['S']
+
+        return {}
+
+    def update_item(self, **kwargs):
+        return {}
+
+
+def baseline(revision):
+    # type: (str) -> object
+    """Import the Function as of a git revision, as it would be deployed, to compare its cost with the working tree.
+
+    :param revision: Git revision of the Function, such as 'HEAD~1'.
+    :return: The imported module.
+    """
+
+    function_dir = os.path.dirname(os.path.abspath(__file__))
+    source = subprocess.check_output(
+        ['git', 'show', '{}:./lambda_function.py'.format(revision)],
+        cwd=function_dir,
+        universal_newlines=True
+    )
+
+    # Revisions that run 'local_test' on import only skip it once 'testing_locally' is disabled, as when deployed.
+    source = re.sub(r'^testing_locally = True', 'testing_locally = False', source, count=1, flags=re.MULTILINE)
+
+    with tempfile.TemporaryDirectory() as baseline_dir:
+        with open(os.path.join(baseline_dir, 'lambda_function.py'), 'w') as f:
+            f.write(source)
+
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+            return local_runner.load_function(baseline_dir, 'lambda_function_baseline')
+
+
+def run(number=20000, repeat=5, module=lambda_function):
+    # type: (int, int, object) -> dict
+    """Time the per-invocation cost of 'lambda_handler' for the redirect, create, and rejected request paths.
+
+    :param number: Number of invocations timed per request path.
+    :param repeat: Number of timings taken per request path, of which the fastest is kept.
+    :param module: The Function, from the working tree or 'baseline'.
+    :return: Dictionary of each request path and its cost in microseconds per invocation.
+    """
+
+    # Every revision reaches DynamoDB through the module's 'ddbc' client, whether it is built at import or on use.
+    module.ddbc = LocalDynamoDB()
+    module.verbose = False
+
+    if hasattr(module, 'DynamoDBStorage'):
+        module.router.dynamodb.storage = module.DynamoDBStorage(module.log)
+
+    # Revisions with log levels still log INFO events, while older ones log nothing once 'verbose' is disabled.
+    if hasattr(module, 'log') and hasattr(module.CWLogs, 'LEVELS'):
+        module.log.level = module.CWLogs.LEVELS['INFO']
+
+    events = {
+        'GET /a1b2c3d (cached)': {'httpMethod': 'GET', 'resource': '/a1b2c3d'},
+        'GET /a1b2c3d (304)': {
+            'httpMethod': 'GET',
+            'resource': '/a1b2c3d',
+            'headers': {'If-Modified-Since': 'Sun, 06 Nov 1994 08:49:37 GMT'}
+        },
+        'GET /a1b2c3d (304 ETag)': {'httpMethod': 'GET', 'resource': '/a1b2c3d', 'headers': {}},
+        'GET /a/b/c (404)': {'httpMethod': 'GET', 'resource': '/a/b/c'},
+        'POST URL': {'httpMethod': 'POST', 'headers': {'URL': 'https://www.example.com/'}},
+        'DELETE (405)': {'httpMethod': 'DELETE', 'resource': '/a1b2c3d'}
+    }
+
+    results = {}
+
+    # Log events are discarded, so that terminal output does not dominate the timings.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        # Revalidate with the ETag of the redirect, as a browser does, where the revision sends one.
+        redirect = module.lambda_handler(events['GET /a1b2c3d (cached)'], context)
+        events['GET /a1b2c3d (304 ETag)']['headers']['If-None-Match'] = redirect['headers'].get('ETag', '')
+
+        for name, event in events.items():
+            seconds = min(timeit.repeat(
+                lambda: module.lambda_handler(event, context),
+                number=number,
+                repeat=repeat
+            ))
+            results[name] = seconds / number * 1e6
+
+    return results
+
+
+# Executed in a new Python process, as a new container: import the Function, then invoke it once with a request
+# that never reaches DynamoDB.
+COLD_START = r'''
+import contextlib
+import json
+import os
+import time
+
+with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+    import context
+
+    start = time.perf_counter()
+    import lambda_function
+    imported = time.perf_counter()
+
+    lambda_function.lambda_handler({'httpMethod': 'DELETE', 'resource': '/a1b2c3d'}, context)
+
+invoked = time.perf_counter()
+
+print(json.dumps({'init_ms': (imported - start) * 1000, 'first_ms': (invoked - imported) * 1000}))
+'''
+
+
+def cold_start(repeat=5):
+    # type: (int) -> dict
+    """Time the init phase and first invocation of new containers, with the DynamoDB client built on its first use
+    (on-demand), and during the init phase (provisioned concurrency).
+
+    :param repeat: Number of containers started per mode, of which the fastest is kept.
+    :return: Dictionary of each mode and its init and first invocation times in milliseconds.
+    """
+
+    results = {}
+
+    for name, initialization_type in (('on-demand', 'on-demand'), ('provisioned', 'provisioned-concurrency')):
+        env = dict(os.environ, AWS_LAMBDA_INITIALIZATION_TYPE=initialization_type)
+        timings = []
+
+        for _ in range(repeat):
+            output = subprocess.check_output(
+                [sys.executable, '-c', COLD_START],
+                cwd=os.path.dirname(os.path.abspath(__file__)),
+                env=env,
+                universal_newlines=True
+            )
+            timings.append(loads(output.strip().splitlines()[-1]))
+
+        results[name] = min(timings, key=lambda timing: timing['init_ms'] + timing['first_ms'])
+
+    return results
+
+
+def workload(invocations, get_share=0.9, miss_share=0.05, links=1000, seed='benchmark'):
+    # type: (int, float, float, int, any) -> list
+    """Generate a mixed workload of redirects and new URLs.
+
+    Redirects favor a few popular links, as real clicks do: the rank of the link clicked is log-uniform, so that the
+    first 1% of the links receive about a third of the clicks.
+
+    :param invocations: Number of events.
+    :param get_share: Share of the events that are redirects, rather than new URLs.
+    :param miss_share: Share of the redirects for IDs that do not exist.
+    :param links: Number of stored links that redirects are made to.
+    :param seed: Seed of the workload, so that runs can be compared.
+    :return: List of API Gateway events.
+    """
+
+    rng = random.Random(seed)
+    events = []
+
+    for number in range(invocations):
+        if rng.random() >= get_share:
+            events.append({'httpMethod': 'POST', 'headers': {'URL': 'https://www.example.com/{}'.format(number)}})
+        elif rng.random() < miss_share:
+            # Missing IDs are out of the range of the stored links.
+            url_id = lambda_function.id_encode(links + 1 + rng.randrange(links), lambda_function.ID_LENGTH)
+            events.append({'httpMethod': 'GET', 'resource': '/{}'.format(url_id)})
+        else:
+            url_id = lambda_function.id_encode(int(links ** rng.random()), lambda_function.ID_LENGTH)
+            events.append({'httpMethod': 'GET', 'resource': '/{}'.format(url_id)})
+
+    return events
+
+
+def load(invocations=20000, containers=1, get_share=0.9, miss_share=0.05, links=1000, latency=0.0, jitter=0.0,
+         collision_rate=0.0):
+    # type: (int, int, float, float, int, float, float, float) -> dict
+    """Drive a mixed workload through 'lambda_handler' of a number of containers, which share a table in memory.
+
+    :param invocations: Total number of invocations.
+    :param containers: Number of containers invoked at once, each invoked one event at a time.
+    :param get_share: Share of the invocations that are redirects, rather than new URLs.
+    :param miss_share: Share of the redirects for IDs that do not exist.
+    :param links: Number of links stored before the run.
+    :param latency: Seconds each storage request takes.
+    :param jitter: Maximum seconds added at random to the latency of each storage request.
+    :param collision_rate: Share of the new IDs treated as though they already existed.
+    :return: Report of the throughput, latency percentiles, and response status codes.
+    """
+
+    function_dir = os.path.dirname(os.path.abspath(__file__))
+    storage = lambda_function.MemoryStorage(
+        lambda_function.log,
+        latency=latency,
+        jitter=jitter,
+        collision_rate=collision_rate,
+        seed='benchmark'
+    )
+
+    for number in range(1, links + 1):
+        storage.items[lambda_function.id_encode(number, lambda_function.ID_LENGTH)] = 'https://www.example.com/'
+
+    # Each container is a separate import of the Function, with its own URL cache, writing to the shared table.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        modules = [
+            local_runner.load_function(function_dir, 'lambda_function_load_{}'.format(number))
+            for number in range(containers)
+        ]
+
+    for module in modules:
+        module.router.dynamodb.storage = storage
+        module.log.level = module.CWLogs.LEVELS['INFO']
+
+    event_queue = iter(workload(invocations, get_share, miss_share, links))
+    event_lock = threading.Lock()
+    timings = {'GET': [], 'POST': []}
+    statuses = Counter()
+
+    def invoke(module):
+        while True:
+            with event_lock:
+                event = next(event_queue, None)
+
+            if event is None:
+                return
+
+            invocation_context = local_runner.LocalContext('url_shortening_service')
+            start = time.perf_counter()
+            response = module.lambda_handler(event, invocation_context)
+            elapsed = time.perf_counter() - start
+
+            # Appending to a list and updating a Counter are atomic enough for reporting.
+            timings[event['httpMethod']].append(elapsed)
+            statuses[response['statusCode']] += 1
+
+    threads = [threading.Thread(target=invoke, args=(module,)) for module in modules]
+
+    # Log events are discarded, so that terminal output does not dominate the timings.
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        start = time.perf_counter()
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        wall_time = time.perf_counter() - start
+
+        # Write the click counts still waiting in each container, so that the storage counts every click.
+        for module in modules:
+            module.router.dynamodb.flush_clicks(force=True)
+
+    def latency_ms(values):
+        values = sorted(values)
+
+        return {
+            name: None if value is None else round(value * 1000, 3)
+            for name, value in (
+                ('p50', local_runner.percentile(values, 50)),
+                ('p95', local_runner.percentile(values, 95)),
+                ('p99', local_runner.percentile(values, 99)),
+                ('max', values[-1] if values else None)
+            )
+        }
+
+    all_timings = list(itertools.chain.from_iterable(timings.values()))
+
+    return {
+        'invocations': len(all_timings),
+        'containers': containers,
+        'throughput_per_second': round(len(all_timings) / wall_time, 1),
+        'latency_ms': {
+            'ALL': latency_ms(all_timings),
+            'GET': latency_ms(timings['GET']),
+            'POST': latency_ms(timings['POST'])
+        },
+        'statuses': dict(sorted(statuses.items())),
+        'storage': storage.stats()
+    }
+
+
+def main(argv=None):
+    """Run the benchmarks from the command line.
+
+    :param argv: Command line arguments (default sys.argv)
+    """
+
+    parser = argparse.ArgumentParser(description='Benchmark the Function against a table in memory.')
+    parser.add_argument('-n', '--invocations', type=int, default=20000, help='Invocations of the mixed load')
+    parser.add_argument('-c', '--containers', type=int, default=1, help='Containers invoked at once')
+    parser.add_argument('--get-share', type=float, default=0.9, help='Share of the invocations that are redirects')
+    parser.add_argument('--miss-share', type=float, default=0.05, help='Share of the redirects for missing IDs')
+    parser.add_argument('--links', type=int, default=1000, help='Links stored before the mixed load')
+    parser.add_argument('--latency-ms', type=float, default=0.0, help='Milliseconds each storage request takes')
+    parser.add_argument('--jitter-ms', type=float, default=0.0, help='Maximum milliseconds of jitter per request')
+    parser.add_argument('--collision-rate', type=float, default=0.0, help='Share of new IDs that collide')
+    parser.add_argument('--load-only', action='store_true', help='Only run the mixed load')
+    parser.add_argument('--baseline', metavar='REVISION', help='Compare each request path with a git revision')
+    parser.add_argument('--json', action='store_true', help='Print the mixed load report as JSON')
+    args = parser.parse_args(argv)
+
+    if args.baseline:
+        baseline_results = run(module=baseline(args.baseline))
+        results = run()
+
+        print('{:<24}{:>12}{:>12}{:>9}'.format('us/invocation', args.baseline, 'working', 'change'))
+
+        for name, microseconds in results.items():
+            print('{:<24}{:>12.2f}{:>12.2f}{:>+8.0%}'.format(
+                name,
+                baseline_results[name],
+                microseconds,
+                microseconds / baseline_results[name] - 1
+            ))
+
+        return
+
+    if not args.load_only:
+        for name, microseconds in run().items():
+            print('{:<24}{:>8.2f} us/invocation'.format(name, microseconds))
+
+        for name, timing in cold_start().items():
+            print('{:<24}{:>8.2f} ms init {:>8.2f} ms first invocation'.format(
+                name,
+                timing['init_ms'],
+                timing['first_ms']
+            ))
+
+    report = load(
+        invocations=args.invocations,
+        containers=args.containers,
+        get_share=args.get_share,
+        miss_share=args.miss_share,
+        links=args.links,
+        latency=args.latency_ms / 1000,
+        jitter=args.jitter_ms / 1000,
+        collision_rate=args.collision_rate
+    )
+
+    if args.json:
+        print(dumps(report, indent=2))
+        return
+
+    print('mixed load: {invocations} invocations, {containers} containers, {throughput_per_second} '
+          'invocations/second'.format(**report))
+
+    for name, latency_ms in report['latency_ms'].items():
+        print('  {:<5} (ms)   p50 {p50}  p95 {p95}  p99 {p99}  max {max}'.format(name, **latency_ms))
+
+    print('  statuses     {}'.format(', '.join('{}: {}'.format(*status) for status in report['statuses'].items())))
+    print('  storage      {}'.format(dumps(report['storage'])))
+
+
+if __name__ == '__main__':
+    main()
@@ -4,13 +4,19 @@ print('Lambda cold-start...')
 
 import random
 import re
+import secrets
 import string
+import time
+from hashlib import sha256
 
-import boto3
+import gzip
 import os
-from botocore.config import Config
-from botocore.exceptions import ClientError
+from base64 import b64decode, b64encode
+from collections import OrderedDict, deque, namedtuple
+from contextlib import contextmanager
 from json import dumps, loads
+from threading import Lock
+from urllib.parse import urlsplit, urlunsplit
 
 # Disable 'testing_locally' when deploying to AWS Lambda.
 testing_locally = True
@@ -23,42 +29,378 @@ DDB_TABLE = ""
 # Define length of unique IDs.
 ID_LENGTH = 7
 
+# Define how unique IDs are generated:
+#   'secrets' - Random IDs from the operating system's cryptographically secure source.
+#   'random'  - Random IDs from the (faster, but predictable) Mersenne Twister.
+#   'counter' - Sequential IDs from an atomic counter item in the DynamoDB table, which never collide.
+#   'hash'    - IDs derived from a hash of the normalized URL, so the same URL always shortens to the same
+#               ID and a repeat submission costs one read instead of a new item.
+ID_STRATEGY = 'secrets'
+# Random IDs grow by one character, up to ID_MAX_LENGTH, when the share of collisions among the
+# last ID_GROWTH_WINDOW writes in this container exceeds ID_GROWTH_RATE (the table is filling up).
+ID_MAX_LENGTH = 10
+ID_GROWTH_RATE = 0.05
+ID_GROWTH_WINDOW = 100
+# The DynamoDB item holding the 'counter' strategy's value; the '#' keeps it outside the ID alphabet.
+ID_COUNTER_KEY = '#counter'
+ID_ALPHABET = string.digits + string.ascii_letters
+
+# Define the retries of a URL whose generated ID already exists.
+SET_URL_MAX_ATTEMPTS = 5
+SET_URL_BACKOFF_BASE = 0.01
+
+# Precompiled request patterns.
+URL_PATTERN = re.compile('^[a-z0-9]+://')
+# Only "/a1b2c3d" and "/a1b2c3d/" are valid paths.
+ID_PATH_PATTERN = re.compile('^/([^/]+)/?$')
+
+# Define the in-memory URL cache, which persists across warm invocations of the same container.
+# A shortened ID never changes once stored, so positive entries may live without a TTL (None).
+# Negative entries (IDs not found in DynamoDB) always expire, since the ID may be created later, and are held apart
+# from the stored URLs, up to CACHE_MAX_MISSING, so that requests for random IDs never evict the popular links.
+CACHE_MAX_ITEMS = 10000
+CACHE_MAX_MISSING = 1000
+CACHE_TTL = None
+CACHE_NEGATIVE_TTL = 60
+
+# Define the click analytics: each redirect served by the Function adds one to the 'Clicks' attribute of its link.
+# Clicks are counted in the container's memory, and written with one atomic ADD per link, by CLICK_FLUSH_WORKERS
+# requests at once, at the end of the invocation that finds CLICK_FLUSH_THRESHOLD clicks, or CLICK_FLUSH_MAX_LINKS
+# links, waiting, or CLICK_FLUSH_INTERVAL seconds passed since the last write.  A container that is shut down loses
+# the clicks still waiting: fewer than CLICK_FLUSH_THRESHOLD, plus those of a failed write that wait to be retried.
+# One invocation writes at most CLICK_FLUSH_MAX_WRITES links, and leaves the rest to be written by the next one.
+CLICK_COUNTING = True
+CLICK_FLUSH_INTERVAL = 10
+CLICK_FLUSH_THRESHOLD = 100
+CLICK_FLUSH_MAX_LINKS = 500
+CLICK_FLUSH_MAX_WRITES = 64
+CLICK_FLUSH_WORKERS = 8
+
+# Define the limits for batch URL creation (a POST with a JSON body of {"URLs": [...]}).
+# Each chunk is written with a single TransactWriteItems call, so that every item keeps the
+# 'attribute_not_exists(ID)' condition which BatchWriteItem does not support.
+BATCH_MAX_URLS = 500
+BATCH_CHUNK_SIZE = 25
+BATCH_MAX_ATTEMPTS = 5
+BATCH_BACKOFF_BASE = 0.05
+
+# Define the redirect responses.  A stored URL never changes, so browsers, CloudFront, and proxies may cache the
+# redirect and answer repeat clicks without invoking the Function, and revalidate it with a 304 when it expires.
+#   301 - Moved Permanently.
+#   308 - Permanent Redirect, which keeps the request method and body.
+#   302 - Found, a temporary redirect, for links that may later point elsewhere.
+#   307 - Temporary Redirect, which keeps the request method and body.
+REDIRECT_STATUS = 301
+# Seconds a redirect may be cached by browsers (Cache-Control max-age, and Expires); None sends 'no-cache', so that
+# every use is revalidated.
+REDIRECT_MAX_AGE = 86400
+# Seconds a redirect may be cached by CloudFront and other shared caches (Cache-Control s-maxage), or None to use
+# REDIRECT_MAX_AGE.
+REDIRECT_SHARED_MAX_AGE = None
+# HTTP date names, which are fixed by RFC 7231 rather than taken from the locale.
+HTTP_DATE_DAYS = ('Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun')
+HTTP_DATE_MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+HTTP_DATE_PATTERN = re.compile(
+    r'^\s*(?:Mon|Tue|Wed|Thu|Fri|Sat|Sun), (\d{2}) (Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec) (\d{4}) '
+    r'(\d{2}):(\d{2}):(\d{2}) GMT\s*$'
+)
+
+# Define the HTML error pages, which are rendered once per container rather than on every response.
+ERROR_PAGES = {
+    400: 'Bad Request',
+    404: 'Page Not Found',
+    405: 'Method Not Allowed',
+    500: 'Internal Server Error'
+}
+ERROR_PAGE_BODY = '<html><head><title>{0} - {1}</head><body><center><h1>{0} - {1}</h1></center></body></html>'
+# Send error pages compressed (gzip, or brotli when the module is installed) to clients that accept it, for the pages
+# that are smaller compressed.
+COMPRESS_ERROR_PAGES = False
+
+# Brotli is optional; gzip is used whenever it is not installed.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
 # Debug level logging.
 if debug:
-    boto3.set_stream_logger(name='botocore')
     verbose = True
 
-# Initiate boto3 DynamoDB client.
-ddb_conf = Config(connect_timeout=0.5, read_timeout=1)
-ddbc = boto3.client('dynamodb', config=ddb_conf)
+# Define the logging of events: DEBUG level events are only logged when 'verbose' is enabled, and
+# events are printed together once per invocation, or sooner when LOG_BUFFER_SIZE events are waiting.
+LOG_LEVEL = 'DEBUG' if verbose else 'INFO'
+LOG_BUFFER_SIZE = 100
+
+# Define the CloudWatch Metrics namespace of the metrics logged in Embedded Metric Format.  The metrics of up to
+# METRICS_FLUSH_INVOCATIONS invocations, or METRICS_FLUSH_INTERVAL seconds, are aggregated into one event, so that
+# the invocations answered without DynamoDB do not each pay for rendering and printing it.  A container that is shut
+# down loses the metrics still waiting.
+METRICS_NAMESPACE = 'aws-lambda/url_shortening_service'
+METRICS_FLUSH_INVOCATIONS = 100
+METRICS_FLUSH_INTERVAL = 60
+
+# Define where shortened URLs are stored, unless the "STORAGE_BACKEND" environment variable names another backend:
+#   'dynamodb' - The DynamoDB table named by the "ddbTable" environment variable, or DDB_TABLE.
+#   'memory'   - A table held in the container's memory, for local testing and benchmarks without AWS.
+STORAGE_BACKEND = 'dynamodb'
+# Each request to the 'memory' backend takes MEMORY_STORAGE_LATENCY seconds, plus up to MEMORY_STORAGE_JITTER more,
+# and MEMORY_STORAGE_COLLISION_RATE of the new IDs are treated as though they already existed, so their writes fail.
+MEMORY_STORAGE_LATENCY = 0.0
+MEMORY_STORAGE_JITTER = 0.0
+MEMORY_STORAGE_COLLISION_RATE = 0.0
+
+# Initiate the boto3 DynamoDB client on its first use, so that requests which never reach DynamoDB, such as cached
+# redirects and rejected methods, do not wait on importing boto3 and building the client.  Set WARM_UP to build it
+# during the init phase instead, which is also done when the container is initialized for provisioned concurrency.
+WARM_UP = False
+ddbc = None
+ddbc_lock = Lock()
 
 
 class CWLogs(object):
     """Define the structure of log events to match all other CloudWatch Log Events logged by AWS Lambda.
     """
 
-    def __init__(self, context):
-        """Define the instance of the context object.
+    # Log levels, in increasing order of severity.
+    LEVELS = {'DEBUG': 10, 'INFO': 20, 'ERROR': 40}
+
+    # Events waiting to be printed, shared by every instance as they share the same stdout stream.
+    buffer = []
+    buffer_lock = Lock()
+
+    def __init__(self, context, level='INFO', buffer_size=0):
+        """Define the instance of the context object, the lowest level logged, and the size of the buffer.
 
         :param context: The Lambda context object.
+        :param level: Events below this level are neither formatted nor printed (default 'INFO').
+        :param buffer_size: Number of events held before they are printed together (default 0, unbuffered).
         """
 
         self.context = context
+        self.level = self.LEVELS[level]
+        self.buffer_size = int(buffer_size)
+
+    def enabled(self, level):
+        # type: (str) -> bool
+        """Is an event of the specified level logged?
 
-    def event(self, message, event_prefix='LOG'):
-        # type: (any, str) -> None
+        :param level: The level of the event (required).
+        :return: True if the event would be logged.
+        """
+
+        return self.LEVELS[level] >= self.level
+
+    def event(self, message, *args, event_prefix='LOG', level='INFO'):
+        # type: (any, any, str, str) -> None
         """Print an event into the CloudWatch Logs stream for the Function's invocation.
 
-        :param message: The information to be logged (required).
+        The message is only rendered when the level is enabled, so a callable returning the message, or a
+        %-style format string with its arguments, defers any costly formatting until it is known to be needed.
+
+        :param message: The information to be logged, or a callable returning it (required).
+        :param args: Arguments for %-style formatting of the message.
         :param event_prefix: The prefix that appears before the 'RequestId' (default 'LOG').
+        :param level: The level of the event (default 'INFO').
+        :return:
+        """
+
+        if self.LEVELS[level] < self.level:
+            return None
+
+        if callable(message):
+            message = message()
+
+        if args:
+            message = message % args
+
+        with self.buffer_lock:
+            self.buffer.append('{} RequestId: {}\t{}'.format(
+                event_prefix,
+                self.context.aws_request_id,
+                message
+            ))
+
+            full = len(self.buffer) >= self.buffer_size
+
+        if full:
+            self.flush()
+
+        return None
+
+    def debug(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event that is only needed for debugging.
+
+        :param message: The information to be logged, or a callable returning it (required).
+        :param args: Arguments for %-style formatting of the message.
+        :return:
+        """
+
+        if self.level > self.LEVELS['DEBUG']:
+            return None
+
+        return self.event(message, *args, level='DEBUG')
+
+    def error(self, message, *args):
+        # type: (any, any) -> None
+        """Log an event describing an error.
+
+        :param message: The information to be logged, or a callable returning it (required).
+        :param args: Arguments for %-style formatting of the message.
+        :return:
+        """
+
+        return self.event(message, *args, level='ERROR')
+
+    def flush(self):
+        # type: () -> None
+        """Print all buffered events with a single write to stdout.
+
+        :return:
+        """
+
+        with self.buffer_lock:
+            lines = self.buffer[:]
+            del self.buffer[:]
+
+        if lines:
+            print('\n'.join(lines))
+
+        return None
+
+
+class CWMetrics(object):
+    """Define the aggregation of metrics during one or more invocations, logged as one CloudWatch Embedded Metric
+    Format event.
+    """
+
+    # Most values of a metric in one event.
+    MAX_VALUES = 100
+
+    def __init__(self, namespace, dimensions=None, flush_invocations=1, flush_interval=None):
+        """Define the metric namespace and dimensions, and how many invocations are aggregated into one event.
+
+        :param namespace: The CloudWatch Metrics namespace (required).
+        :param dimensions: Dictionary of dimension names and values applied to every metric (default None).
+        :param flush_invocations: Number of invocations aggregated before the event is printed (default 1).
+        :param flush_interval: Seconds after the last event before the next is printed, or None (default None).
+        """
+
+        self.namespace = namespace
+        self.dimensions = dict(dimensions or {})
+        self.flush_invocations = int(flush_invocations)
+        self.flush_interval = flush_interval
+        self.metrics = OrderedDict()
+        self.invocations = 0
+        self.full = False
+        self.last_flush = time.time()
+        self.lock = Lock()
+
+    def put(self, name, value, unit='None'):
+        # type: (str, float, str) -> None
+        """Add a value to a metric, which is logged with every other value of the metric in the invocation.
+
+        :param name: The metric name (required).
+        :param value: The metric value (required).
+        :param unit: The CloudWatch unit of the metric (default 'None').
+        :return:
+        """
+
+        with self.lock:
+            values = self.metrics.setdefault(name, (unit, []))[1]
+            values.append(value)
+
+            # The event is printed early, rather than dropping the values that do not fit.
+            if len(values) >= self.MAX_VALUES:
+                self.full = True
+
+        return None
+
+    def count(self, name, value=1):
+        # type: (str, int) -> None
+        """Increment a counter metric, which is logged as a single value per invocation.
+
+        :param name: The metric name (required).
+        :param value: The amount added to the counter (default 1).
+        :return:
+        """
+
+        with self.lock:
+            values = self.metrics.setdefault(name, ('Count', [0]))[1]
+            values[0] += value
+
+        return None
+
+    @contextmanager
+    def timer(self, name):
+        # type: (str) -> None
+        """Time the enclosed block of code as a metric in milliseconds.
+
+        :param name: The metric name (required).
+        :return:
+        """
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.put(name, round((time.perf_counter() - start) * 1000, 3), unit='Milliseconds')
+
+    def render(self):
+        # type: () -> dict
+        """Return the Embedded Metric Format event of the metrics aggregated so far.
+
+        :return: Dictionary of the metric definitions, dimensions, and values.
+        """
+
+        emf_event = {
+            '_aws': {
+                'Timestamp': int(time.time() * 1000),
+                'CloudWatchMetrics': [{
+                    'Namespace': self.namespace,
+                    'Dimensions': [list(self.dimensions)],
+                    'Metrics': [{'Name': name, 'Unit': unit} for name, (unit, _) in self.metrics.items()]
+                }]
+            }
+        }
+
+        emf_event.update(self.dimensions)
+
+        for name, (_, values) in self.metrics.items():
+            emf_event[name] = values[0] if len(values) == 1 else values[:self.MAX_VALUES]
+
+        return emf_event
+
+    def flush(self, force=False):
+        # type: (bool) -> None
+        """Count the end of an invocation, and print the aggregated metrics as a single log event, which CloudWatch
+        Logs extracts into CloudWatch Metrics, once 'flush_invocations' invocations or 'flush_interval' seconds passed.
+
+        :param force: Print the aggregated metrics now.
         :return:
         """
 
-        print('{} RequestId: {}\t{}'.format(
-            event_prefix,
-            self.context.aws_request_id,
-            message
-        ))
+        with self.lock:
+            self.invocations += 1
+
+            if not (
+                force
+                or self.full
+                or self.invocations >= self.flush_invocations
+                or (self.flush_interval is not None and time.time() - self.last_flush >= self.flush_interval)
+            ):
+                return None
+
+            emf_event = self.render() if self.metrics else None
+            self.metrics.clear()
+            self.invocations = 0
+            self.full = False
+            self.last_flush = time.time()
+
+        if emf_event is not None:
+            print(dumps(emf_event))
 
         return None
 
@@ -68,12 +410,111 @@ class APIGWProxy(object):
     """
 
     def __init__(self, log):
-        """Define the instance of the log object.
+        """Define the instance of the log object, and render the static error responses.
         
         "param log: CloudWatch Logs context object.
         """
 
         self.log = log
+        self.static_responses = {}
+
+        # The 'Expires' header of redirects, rendered at most once per second.
+        self.expires = (None, None)
+
+        if REDIRECT_STATUS not in (301, 302, 307, 308):
+            raise ValueError('Invalid REDIRECT_STATUS: {}'.format(REDIRECT_STATUS))
+
+        # Render the redirects' Cache-Control header.
+        if REDIRECT_MAX_AGE is None:
+            self.redirect_cache_control = 'no-cache'
+        else:
+            self.redirect_cache_control = 'public, max-age={}'.format(REDIRECT_MAX_AGE)
+
+            if REDIRECT_SHARED_MAX_AGE is not None:
+                self.redirect_cache_control += ', s-maxage={}'.format(REDIRECT_SHARED_MAX_AGE)
+
+            # Only permanent redirects are marked immutable, as a temporary redirect may later point elsewhere.
+            if REDIRECT_STATUS in (301, 308):
+                self.redirect_cache_control += ', immutable'
+
+        for status_code, reason in ERROR_PAGES.items():
+            body = ERROR_PAGE_BODY.format(status_code, reason).encode('utf-8')
+            compressed = {'gzip': b64encode(gzip.compress(body, mtime=0))}
+
+            if brotli is not None:
+                compressed['br'] = b64encode(brotli.compress(body))
+
+            # A compressed page is only sent when its base64 encoded body is smaller than the page itself, as short
+            # pages grow once the compression header and base64 encoding are added.
+            compressed = {
+                encoding: data for encoding, data in compressed.items()
+                if COMPRESS_ERROR_PAGES and len(data) < len(body)
+            }
+            headers = {'Content-Type': 'text/html'}
+
+            if compressed:
+                headers['Vary'] = 'Accept-Encoding'
+
+            self.static_responses[status_code] = {
+                'identity': self.render(status_code, headers, body.decode('utf-8'))
+            }
+
+            for encoding, data in compressed.items():
+                self.static_responses[status_code][encoding] = self.render(
+                    status_code,
+                    {'Content-Type': 'text/html', 'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'},
+                    data.decode('ascii'),
+                    body_is_base64_encoded=True
+                )
+
+    @staticmethod
+    def render(status_code, headers, body, body_is_base64_encoded=False):
+        # type: (int, dict, str, bool) -> tuple
+        """Render a static API Gateway Lambda Proxy response object, and the log event describing it.
+
+        :param status_code: The response status code.
+        :param headers: The response headers.
+        :param body: The response body.
+        :param body_is_base64_encoded: Is the body a base64 encoded string?
+        :return: Tuple of the response object and its log event message.
+        """
+
+        response_object = {
+            'statusCode': int(status_code),
+            'headers': dict(headers),
+            'body': str(body),
+            'isBase64Encoded': bool(body_is_base64_encoded)
+        }
+
+        return response_object, 'Response: {}'.format(dumps(response_object))
+
+    def static_response(self, status_code, accept_encoding=None):
+        # type: (int, str) -> dict
+        """Return a copy of a pre-rendered response, compressed if enabled and accepted by the client.
+
+        :param status_code: The response status code, which must be one of ERROR_PAGES.
+        :param accept_encoding: The value of the request's 'Accept-Encoding' header.
+        :return: An API Gateway Lambda Proxy response object.
+        """
+
+        responses = self.static_responses[status_code]
+        encoding = 'identity'
+
+        if accept_encoding and len(responses) > 1:
+            encoding = accepted_encoding(accept_encoding, responses)
+
+        response_object, message = responses[encoding]
+
+        metrics.count('Status{}'.format(status_code))
+
+        # Log the API Gateway Lambda Proxy response object.
+        self.log.debug(message)
+
+        # Copy the template, so that changes by the caller are not kept for the next response.
+        response_object = dict(response_object)
+        response_object['headers'] = dict(response_object['headers'])
+
+        return response_object
 
     def response(self, status_code, body_is_base64_encoded=False, headers=None, body=None):
         # type: (int, bool, dict, str) -> dict
@@ -95,265 +536,1511 @@ class APIGWProxy(object):
             response_object['body'] = str(body)
             response_object['isBase64Encoded'] = bool(body_is_base64_encoded)
 
+        metrics.count('Status{}'.format(status_code))
+
         # Log the API Gateway Lambda Proxy response object.
-        if verbose:
-            self.log.event('Response: {}'.format(dumps(response_object)))
+        self.log.debug(lambda: 'Response: {}'.format(dumps(response_object)))
 
         return response_object
 
-    def status_301(self, location):
-        # type: (str) -> dict
-        """Return a response with a 301 status code.
-        
-        :param location: URL to be redirected to.
+    def status_redirect(self, redirect, if_none_match=None, if_modified_since=None):
+        # type: (Redirect, str, str) -> dict
+        """Return a redirect response with the REDIRECT_STATUS status code, or a response with a 304 status code when
+        the client's cached copy of the redirect is still current.
+
+        :param redirect: The Redirect from 'redirect_for', with the URL to be redirected to.
+        :param if_none_match: The value of the request's 'If-None-Match' header.
+        :param if_modified_since: The value of the request's 'If-Modified-Since' header.
         :return: An API Gateway Lambda Proxy response object.
         """
 
-        return self.response(
-            status_code=301,
-            headers={
-                'Content-Type': 'text/html',
-                'Location': location
-            }
-        )
+        headers = {
+            'Cache-Control': self.redirect_cache_control,
+            'ETag': redirect.etag,
+            'Last-Modified': redirect.last_modified
+        }
 
-    def status_400(self):
-        # type: () -> dict
+        if REDIRECT_MAX_AGE is not None:
+            now = int(time.time())
+
+            if self.expires[0] != now:
+                self.expires = (now, http_date(now + REDIRECT_MAX_AGE))
+
+            headers['Expires'] = self.expires[1]
+
+        if not_modified(redirect, if_none_match, if_modified_since):
+            return self.response(status_code=304, headers=headers)
+
+        headers['Content-Type'] = 'text/html'
+        headers['Location'] = redirect.location
+
+        return self.response(status_code=REDIRECT_STATUS, headers=headers)
+
+    def status_400(self, accept_encoding=None):
+        # type: (str) -> dict
         """Return a response with a 400 status code.
         
+        :param accept_encoding: The value of the request's 'Accept-Encoding' header.
         :return: An API Gateway Lambda Proxy response object.
         """
 
-        return self.response(
-            status_code=400,
-            headers={
-                'Content-Type': 'text/html'
-            },
-            body='<html><head><title>400 - Bad Request</head><body><center><h1>400 - Bad Request</h1></center></body></html>'
-        )
+        return self.static_response(400, accept_encoding)
 
-    def status_404(self):
-        # type: () -> dict
+    def status_404(self, accept_encoding=None):
+        # type: (str) -> dict
         """Return a response with a 404 status code.
         
+        :param accept_encoding: The value of the request's 'Accept-Encoding' header.
         :return: An API Gateway Lambda Proxy response object.
         """
 
-        return self.response(
-            status_code=404,
-            headers={
-                'Content-Type': 'text/html'
-            },
-            body='<html><head><title>404 - Page Not Found</head><body><center><h1>404 - Page Not Found</h1></center></body></html>'
-        )
+        return self.static_response(404, accept_encoding)
 
-    def status_405(self):
-        # type: () -> dict
+    def status_405(self, accept_encoding=None):
+        # type: (str) -> dict
         """Return a response with a 405 status code.
         
+        :param accept_encoding: The value of the request's 'Accept-Encoding' header.
         :return: An API Gateway Lambda Proxy response object.
         """
 
-        return self.response(
-            status_code=405,
-            headers={
-                'Content-Type': 'text/html'
-            },
-            body='<html><head><title>405 - Method Not Allowed</head><body><center><h1>405 - Method Not Allowed</h1></center></body></html>'
-        )
+        return self.static_response(405, accept_encoding)
 
-    def status_500(self):
-        # type: () -> dict
+    def status_500(self, accept_encoding=None):
+        # type: (str) -> dict
         """Return a response with a 500 status code.
         
+        :param accept_encoding: The value of the request's 'Accept-Encoding' header.
         :return: An API Gateway Lambda Proxy response object.
         """
 
-        return self.response(
-            status_code=500,
-            headers={
-                'Content-Type': 'text/html'
-            },
-            body='<html><head><title>500 - Internal Server Error</head><body><center><h1>500 - Internal Server Error</h1></center></body></html>'
-        )
+        return self.static_response(500, accept_encoding)
 
 
-class DynamoDBLogic(object):
-    """Define the get_item and put_item request structure for shortened IDs.
+class URLCache(object):
+    """Define a bounded, least recently used (LRU) cache of URL IDs and their stored URLs, with the IDs known to not
+    exist held apart in their own, smaller LRU cache.
     """
 
-    def __init__(self, event, log, id_length):
-        """Define the instance of the log object and id_length value.
-        
-        :param event: Ingested JSON event object provided at invocation.
-        :param log: CloudWatch Logs context object.
-        :param id_length: Length of the resource IDs being generated.
-        """
+    # Marker stored for IDs that are known to not exist in DynamoDB.
+    MISSING = object()
 
-        self.event = event
-        self.log = log
-        self.id_length = id_length
+    def __init__(self, max_items, ttl=None, negative_ttl=None, max_missing=None):
+        """Define the cache sizes and expiration values.
 
-    def get_url(self):
-        # type: (str) -> str
-        """Retrieve a stored URL from DynamoDB based on the resource ID.
-        
-        :return: URL stored in DynamoDB associated with the specified resource ID.
+        :param max_items: Maximum number of stored URLs held before the least recently used is evicted.
+        :param ttl: Seconds before a stored URL expires (None never expires).
+        :param negative_ttl: Seconds before a missing ID expires (None never expires).
+        :param max_missing: Maximum number of missing IDs held before the least recently used is evicted
+            (default max_items).
         """
 
-        try:
-            path = self.event['resource']
-            url_id = path.split("/")[1]
+        self.max_items = int(max_items)
+        self.max_missing = self.max_items if max_missing is None else int(max_missing)
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.items = OrderedDict()
+        self.missing = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def lookup(self, url_id):
+        # type: (str) -> any
+        """Return the cached value for an ID, without counting a hit or miss, and remove it once expired.
+
+        :param url_id: Unique resource ID.
+        :return: The cached value, or None when not cached.
+        """
 
+        for entries in (self.items, self.missing):
             try:
-                # The ID must match the expected length.
-                if len(url_id) != ID_LENGTH:
-                    raise ValueError('Invalid ID Length')
-                # Only "/a1b2c3d" and "/a1b2c3d/" are valid paths.
-                elif len(path.split("/")[2]) > 0:
-                    raise ValueError('Invalid Path')
-            except IndexError:
-                # The path is a match to what we expect to receive.
-                pass
+                value, expires = entries[url_id]
+            except KeyError:
+                continue
 
-            # Return the URL stored in DynamoDB.
-            ddb_response = ddbc.get_item(
-                TableName=os.getenv('ddbTable', DDB_TABLE),
-                Key={
-                    'ID': {'S': url_id}
-                }
-            )
+            if expires is not None and expires <= time.time():
+                del entries[url_id]
+                return None
 
-            # Log the DynamoDB response object.
-            if verbose:
-                self.log.event('DDB: {}'.format(ddb_response))
+            # Mark the ID as the most recently used.
+            entries.move_to_end(url_id)
 
-            try:
-                url = ddb_response['Item']['Endpoint']['S']
-            except KeyError:
-                raise KeyError('Item does not exist')
+            return value
 
-            return url
-        except Exception:
-            raise
+        return None
 
-    def set_url(self, url):
-        # type: (int, str) -> str
-        """Store a URL and unique ID in DynamoDB.
-        
-        :param url: URL to be stored in DynamoDB.
-        :return: Unique resource ID associated with the URL.
+    def get(self, url_id):
+        # type: (str) -> any
+        """Return the cached value for an ID, which may be the Redirect, URLCache.MISSING, or None when not cached, and
+        count it as a hit or miss.
+
+        :param url_id: Unique resource ID.
+        :return: The cached value or None.
         """
 
-        try:
-            url_id = id_gen(self.id_length)
-            location = url
+        value = self.lookup(url_id)
 
-            # Store the URL and unique resource ID in DynamoDB if the resource ID does not already exist.
-            ddb_response = ddbc.put_item(
-                TableName=os.getenv('ddbTable', DDB_TABLE),
-                Item={
-                    'ID': {'S': url_id},
-                    'Endpoint': {'S': location}
-                },
-                ConditionExpression='attribute_not_exists(ID)'
-            )
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
 
-            # Log the DynamoDB response object.
-            if verbose:
-                self.log.event('DDB: {}'.format(ddb_response))
+        return value
 
-            return url_id
-        except ClientError as e:
-            # If an item with the same unique resource ID already exists, then generate a new one.
-            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
-                self.set_url(url)
-            else:
-                raise
-        except Exception:
-            raise
+    def set(self, url_id, url):
+        # type: (str, str) -> None
+        """Store the URL for an ID, evicting the least recently used ID of its kind when the cache is full.
 
+        :param url_id: Unique resource ID.
+        :param url: Redirect to the URL associated with the ID, or URLCache.MISSING.
+        :return:
+        """
 
-def id_gen(id_length):
-    # type: (int) -> str
-    """Generate a unique alpha-numeric ID of a specified length.
-    
-    :param id_length: Length of unique string.
-    :return: Unique string.
-    """
+        if url is self.MISSING:
+            entries, other, ttl, max_items = self.missing, self.items, self.negative_ttl, self.max_missing
+        else:
+            entries, other, ttl, max_items = self.items, self.missing, self.ttl, self.max_items
 
-    selection = string.ascii_letters + string.digits
-    return ''.join(random.choice(selection) for _ in range(id_length))
+        # An ID is only ever held as one kind, as a newly stored ID replaces its negative entry.
+        other.pop(url_id, None)
 
+        entries[url_id] = (url, time.time() + ttl if ttl is not None else None)
+        entries.move_to_end(url_id)
 
-def lambda_handler(event, context):
-    """AWS Lambda executes the 'lambda_handler' function on invocation.
+        while len(entries) > max_items:
+            entries.popitem(last=False)
 
-    :param event: Ingested JSON event object provided at invocation.
-    :param context: Lambda context object, containing information specific to the invocation and Function.
-    :return: Final response to AWS Lambda, and passed to the invoker if the invocation type is RequestResponse.
+        return None
+
+    def clear(self):
+        # type: () -> None
+        """Remove all IDs from the cache and reset the counters.
+
+        :return:
+        """
+
+        self.items.clear()
+        self.missing.clear()
+        self.hits = 0
+        self.misses = 0
+
+        return None
+
+    def stats(self):
+        # type: () -> dict
+        """Return the cache counters.
+
+        :return: Dictionary of the cache sizes, hits, and misses.
+        """
+
+        return {'Items': len(self.items), 'Missing': len(self.missing), 'Hits': self.hits, 'Misses': self.misses}
+
+
+# Initiate the URL cache.
+url_cache = URLCache(CACHE_MAX_ITEMS, ttl=CACHE_TTL, negative_ttl=CACHE_NEGATIVE_TTL, max_missing=CACHE_MAX_MISSING)
+
+
+class CollisionMeter(object):
+    """Define the ID collision metrics, and the adaptive ID length, of the container.
     """
 
-    # Instantiate our CloudWatch logging class.
-    log = CWLogs(context)
+    def __init__(self, id_length, max_length, growth_rate, window):
+        """Define the ID length limits and the collision window.
 
-    # Instantiate our API Gateway Lambda Proxy class.
-    apigw = APIGWProxy(log)
+        :param id_length: Initial length of generated IDs.
+        :param max_length: Maximum length of generated IDs.
+        :param growth_rate: Collision rate over the window that increases the ID length.
+        :param window: Number of recent writes used to calculate the collision rate.
+        """
 
-    # Instantiate our DynamoDB URL logic class.
-    dynamodb = DynamoDBLogic(event, log, ID_LENGTH)
+        self.id_length = int(id_length)
+        self.max_length = int(max_length)
+        self.growth_rate = float(growth_rate)
+        self.recent = deque(maxlen=int(window))
+        self.writes = 0
+        self.collisions = 0
 
-    # Log the event object provided to the Lambda Function at invocation.
-    if verbose:
-        log.event('Event: {}'.format(dumps(event)))
+    def record(self, collided):
+        # type: (bool) -> None
+        """Record the outcome of a conditional write, and lengthen new IDs if collisions are too frequent.
 
-    # Request processing logic.
-    try:
-        if event['httpMethod'] == 'GET':
-            try:
-                # Request the URL from DynamoDB.
-                location = dynamodb.get_url()
-            except ValueError as e:
-                log.event('Error: {}'.format(e))
-                return apigw.status_404()
-            except KeyError as e:
-                log.event('Error: {}'.format(e))
-                return apigw.status_404()
-            except Exception:
-                raise
+        :param collided: Did the generated ID already exist?
+        :return:
+        """
 
-            # Return "301: Permanent Redirect" with the location stored in DynamoDB.
-            return apigw.status_301(location)
-        elif event['httpMethod'] == 'POST':
-            try:
-                url = event['headers']['URL']
+        self.writes += 1
+        self.collisions += int(collided)
 
-                # Check for a valid URL.
-                if not re.match('^[a-z0-9]+://.*', url):
-                    raise KeyError('Missing protocol prefix in URL')
+        metrics.count('IdCollisions', int(collided))
+        self.recent.append(collided)
 
-                # Store the URL in DynamoDB.
-                url_id = dynamodb.set_url(url=url)
-            except KeyError as e:
-                log.event('Error: {}'.format(e))
-                return apigw.status_400()
-            except Exception:
-                raise
+        if len(self.recent) == self.recent.maxlen and self.rate() > self.growth_rate \
+                and self.id_length < self.max_length:
+            self.id_length += 1
+            self.recent.clear()
 
-            # Return "200: Ok" with the shortened URL.
-            return apigw.response(
-                status_code=200,
-                headers={'Content-Type': 'application/json'},
-                body=dumps({'UrlId': url_id})
-            )
-        else:
-            # Return "405: Method Not Allowed".
-            return apigw.status_405()
-    except Exception as e:
-        log.event('Error: {}'.format(e))
+        return None
 
-        # Return "500: Internal Server Error".
-        return apigw.status_500()
+    def rate(self):
+        # type: () -> float
+        """Return the collision rate over the recent window of writes.
+
+        :return: Share of recent writes whose ID already existed.
+        """
+
+        return sum(self.recent) / float(len(self.recent)) if self.recent else 0.0
+
+    def stats(self):
+        # type: () -> dict
+        """Return the collision counters.
+
+        :return: Dictionary of the total writes and collisions, the recent collision rate, and the ID length.
+        """
+
+        return {
+            'Writes': self.writes,
+            'Collisions': self.collisions,
+            'CollisionRate': round(self.rate(), 4),
+            'IdLength': self.id_length
+        }
+
+
+# Initiate the ID collision metrics.
+id_collisions = CollisionMeter(ID_LENGTH, ID_MAX_LENGTH, ID_GROWTH_RATE, ID_GROWTH_WINDOW)
+
+
+class ClickCounter(object):
+    """Define the click counts of the container that are waiting to be written, and when they are due.
+    """
+
+    def __init__(self, interval, threshold, max_links, max_writes=None):
+        """Define the limits of the waiting click counts.
+
+        :param interval: Seconds after the last write that waiting clicks are due.
+        :param threshold: Number of waiting clicks that are due at once.
+        :param max_links: Number of links with waiting clicks that are due at once, and that may be waiting.
+        :param max_writes: Number of links taken to be written at once, or None for all of them.
+        """
+
+        self.interval = float(interval)
+        self.threshold = int(threshold)
+        self.max_links = int(max_links)
+        self.max_writes = None if max_writes is None else int(max_writes)
+        self.counts = {}
+        self.pending = 0
+        self.carried = False
+        self.written = 0
+        self.dropped = 0
+        self.last_flush = time.time()
+        self.lock = Lock()
+
+    def record(self, url_id):
+        # type: (str) -> None
+        """Count a click of a link, unless too many links are already waiting.
+
+        :param url_id: Unique resource ID of the link.
+        :return:
+        """
+
+        with self.lock:
+            if url_id not in self.counts and len(self.counts) >= self.max_links:
+                self.dropped += 1
+                return None
+
+            self.counts[url_id] = self.counts.get(url_id, 0) + 1
+            self.pending += 1
+
+        return None
+
+    def due(self):
+        # type: () -> bool
+        """Check whether the waiting clicks should be written.
+
+        :return: True if enough clicks or links are waiting, the last write left links behind,
+            or the interval has passed since the last write.
+        """
+
+        return self.pending >= self.threshold or len(self.counts) >= self.max_links or \
+            (self.pending > 0 and (self.carried or time.time() - self.last_flush >= self.interval))
+
+    def take(self, limit=True):
+        # type: (bool) -> dict
+        """Remove the waiting click counts, to be written.
+
+        The links waiting longest are taken first, and those beyond 'max_writes' are left for the next write.
+
+        :param limit: Take at most 'max_writes' links, or all of them if False.
+        :return: Dictionary of each link's unique resource ID and its number of clicks.
+        """
+
+        with self.lock:
+            if not limit or self.max_writes is None or len(self.counts) <= self.max_writes:
+                counts = self.counts
+                self.counts = {}
+            else:
+                url_ids = list(self.counts)
+                counts = {url_id: self.counts.pop(url_id) for url_id in url_ids[:self.max_writes]}
+
+            self.pending -= sum(counts.values())
+            self.carried = bool(self.counts)
+            self.last_flush = time.time()
+
+        return counts
+
+    def restore(self, counts):
+        # type: (dict) -> None
+        """Return click counts that could not be written, so that the next write retries them.
+
+        :param counts: Dictionary of each link's unique resource ID and its number of clicks.
+        :return:
+        """
+
+        with self.lock:
+            for url_id, count in counts.items():
+                if url_id not in self.counts and len(self.counts) >= self.max_links:
+                    self.dropped += count
+                    continue
+
+                self.counts[url_id] = self.counts.get(url_id, 0) + count
+                self.pending += count
+
+        return None
+
+    def stats(self):
+        # type: () -> dict
+        """Return the click counters.
+
+        :return: Dictionary of the waiting clicks and links, and the clicks written and dropped.
+        """
+
+        return {
+            'Pending': self.pending,
+            'Links': len(self.counts),
+            'Written': self.written,
+            'Dropped': self.dropped
+        }
+
+
+# Initiate the click counts.
+click_counts = ClickCounter(CLICK_FLUSH_INTERVAL, CLICK_FLUSH_THRESHOLD, CLICK_FLUSH_MAX_LINKS, CLICK_FLUSH_MAX_WRITES)
+
+
+class DynamoDBStorage(object):
+    """Define the storage of shortened URLs in a DynamoDB table, as items of the form {"ID": ..., "Endpoint": ...}.
+
+    Every storage backend provides the methods 'get', 'put', 'put_many', 'increment', 'add_clicks', and 'warm_up'.
+    """
+
+    def __init__(self, log):
+        """Define the instance of the log object.
+
+        :param log: CloudWatch Logs context object.
+        """
+
+        self.log = log
+
+    def get(self, url_id):
+        # type: (str) -> any
+        """Retrieve the URL stored for a resource ID.
+
+        :param url_id: Unique resource ID.
+        :return: The stored URL, or None if the ID does not exist.
+        """
+
+        ddb_response = dynamodb_client().get_item(
+            TableName=os.getenv('ddbTable', DDB_TABLE),
+            Key={
+                'ID': {'S': url_id}
+            }
+        )
+
+        # Log the DynamoDB response object.
+        self.log.debug('DDB: %s', ddb_response)
+
+        try:
+            return ddb_response['Item']['Endpoint']['S']
+        except KeyError:
+            return None
+
+    def put(self, url_id, url):
+        # type: (str, str) -> bool
+        """Store a URL under a resource ID, unless the ID already exists.
+
+        :param url_id: Unique resource ID.
+        :param url: URL to be stored.
+        :return: True if the URL was stored, or False if the ID already exists.
+        """
+
+        try:
+            ddb_response = dynamodb_client().put_item(
+                TableName=os.getenv('ddbTable', DDB_TABLE),
+                Item={
+                    'ID': {'S': url_id},
+                    'Endpoint': {'S': url}
+                },
+                ConditionExpression='attribute_not_exists(ID)'
+            )
+        except client_error() as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+            return False
+
+        # Log the DynamoDB response object.
+        self.log.debug('DDB: %s', ddb_response)
+
+        return True
+
+    def put_many(self, items):
+        # type: (dict) -> any
+        """Store URLs under resource IDs in a single transaction, so that none are stored if any ID already exists.
+
+        :param items: Dictionary of each unique resource ID and the URL to be stored under it.
+        :return: None if every URL was stored, or else the list of IDs that already exist, which is empty when the
+            transaction was cancelled for another reason, such as a conflicting transaction.
+        """
+
+        url_ids = list(items)
+
+        try:
+            ddb_response = dynamodb_client().transact_write_items(
+                TransactItems=[
+                    {
+                        'Put': {
+                            'TableName': os.getenv('ddbTable', DDB_TABLE),
+                            'Item': {
+                                'ID': {'S': url_id},
+                                'Endpoint': {'S': items[url_id]}
+                            },
+                            'ConditionExpression': 'attribute_not_exists(ID)'
+                        }
+                    } for url_id in url_ids
+                ]
+            )
+        except client_error() as e:
+            if e.response['Error']['Code'] != 'TransactionCanceledException':
+                raise
+
+            return [
+                url_id for url_id, reason in zip(url_ids, e.response.get('CancellationReasons', []))
+                if reason.get('Code') == 'ConditionalCheckFailed'
+            ]
+
+        # Log the DynamoDB response object.
+        self.log.debug('DDB: %s', ddb_response)
+
+        return None
+
+    def increment(self, key, count):
+        # type: (str, int) -> int
+        """Atomically add to the value of a counter item.
+
+        :param key: ID of the counter item.
+        :param count: Number added to the counter.
+        :return: The new value of the counter.
+        """
+
+        ddb_response = dynamodb_client().update_item(
+            TableName=os.getenv('ddbTable', DDB_TABLE),
+            Key={
+                'ID': {'S': key}
+            },
+            UpdateExpression='ADD #v :count',
+            ExpressionAttributeNames={'#v': 'Value'},
+            ExpressionAttributeValues={':count': {'N': str(count)}},
+            ReturnValues='UPDATED_NEW'
+        )
+
+        return int(ddb_response['Attributes']['Value']['N'])
+
+    def add_clicks(self, counts):
+        # type: (dict) -> dict
+        """Atomically add click counts to the 'Clicks' attribute of stored links, with an UpdateItem per link, made by
+        up to CLICK_FLUSH_WORKERS threads at once.
+
+        :param counts: Dictionary of each link's unique resource ID and its number of clicks.
+        :return: Dictionary of the click counts that were not written, as their request failed.
+        """
+
+        # Imported on use, as only the invocations writing clicks need it.
+        from concurrent.futures import ThreadPoolExecutor
+
+        client = dynamodb_client()
+
+        def add(url_id):
+            try:
+                client.update_item(
+                    TableName=os.getenv('ddbTable', DDB_TABLE),
+                    Key={
+                        'ID': {'S': url_id}
+                    },
+                    UpdateExpression='ADD Clicks :count',
+                    ConditionExpression='attribute_exists(ID)',
+                    ExpressionAttributeValues={':count': {'N': str(counts[url_id])}}
+                )
+            except Exception as e:
+                # Clicks of a link that does not exist are not counted, so that no item is created for it.
+                if isinstance(e, client_error()) and e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                    return None
+
+                return e
+
+            return None
+
+        if not counts:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(CLICK_FLUSH_WORKERS, len(counts))) as executor:
+            errors = dict(zip(counts, executor.map(add, counts)))
+
+        unwritten = {url_id: counts[url_id] for url_id, error in errors.items() if error is not None}
+
+        if unwritten:
+            self.log.error('Error: Click counts of %s links not written: %s', len(unwritten), next(
+                error for error in errors.values() if error is not None
+            ))
+
+        return unwritten
+
+    @staticmethod
+    def warm_up():
+        # type: () -> None
+        """Build the DynamoDB client and import botocore's exceptions ahead of the first request.
+
+        :return:
+        """
+
+        dynamodb_client()
+        client_error()
+
+
+class MemoryStorage(object):
+    """Define the storage of shortened URLs in the container's memory, with the semantics of DynamoDBStorage:
+    writes of IDs that already exist fail, transactions store all of their URLs or none, and counters are atomic.
+
+    Latency and ID collisions may be injected, so that the Function can be measured without a DynamoDB table.
+    """
+
+    def __init__(self, log, latency=None, jitter=None, collision_rate=None, seed=None):
+        """Define the stored items, and the injected latency and collisions.
+
+        :param log: CloudWatch Logs context object.
+        :param latency: Seconds each request takes (default MEMORY_STORAGE_LATENCY).
+        :param jitter: Maximum seconds added at random to the latency (default MEMORY_STORAGE_JITTER).
+        :param collision_rate: Share of the new IDs treated as though they already existed, so their writes fail
+            (default MEMORY_STORAGE_COLLISION_RATE).
+        :param seed: Seed of the random jitter and collisions, or None for an unpredictable seed.
+        """
+
+        self.log = log
+        self.latency = MEMORY_STORAGE_LATENCY if latency is None else latency
+        self.jitter = MEMORY_STORAGE_JITTER if jitter is None else jitter
+        self.collision_rate = MEMORY_STORAGE_COLLISION_RATE if collision_rate is None else collision_rate
+        self.random = random.Random(seed)
+        self.items = {}
+        self.counters = {}
+        self.clicks = {}
+        self.injected = {}
+        self.requests = 0
+        self.collisions = 0
+        self.lock = Lock()
+
+    def request(self):
+        # type: () -> None
+        """Wait for the injected latency of a request.
+
+        :return:
+        """
+
+        with self.lock:
+            self.requests += 1
+            delay = self.latency + (self.random.uniform(0, self.jitter) if self.jitter else 0)
+
+        if delay > 0:
+            time.sleep(delay)
+
+    def collides(self, url_id):
+        # type: (str) -> bool
+        """Check whether the write of an ID fails, because it exists or a collision is injected.
+
+        Whether a collision is injected is decided once per ID, as though the ID were stored by someone else, so that
+        retrying the write of an ID that did not collide succeeds, as it would with DynamoDB.
+
+        :param url_id: Unique resource ID.
+        :return: True if the ID collides.
+        """
+
+        if url_id not in self.injected:
+            self.injected[url_id] = bool(self.collision_rate) and self.random.random() < self.collision_rate
+
+        if url_id in self.items or self.injected[url_id]:
+            self.collisions += 1
+            return True
+
+        return False
+
+    def get(self, url_id):
+        # type: (str) -> any
+        """Retrieve the URL stored for a resource ID.
+
+        :param url_id: Unique resource ID.
+        :return: The stored URL, or None if the ID does not exist.
+        """
+
+        self.request()
+
+        return self.items.get(url_id)
+
+    def put(self, url_id, url):
+        # type: (str, str) -> bool
+        """Store a URL under a resource ID, unless the ID already exists.
+
+        :param url_id: Unique resource ID.
+        :param url: URL to be stored.
+        :return: True if the URL was stored, or False if the ID already exists.
+        """
+
+        self.request()
+
+        with self.lock:
+            if self.collides(url_id):
+                return False
+
+            self.items[url_id] = url
+
+        return True
+
+    def put_many(self, items):
+        # type: (dict) -> any
+        """Store URLs under resource IDs in a single transaction, so that none are stored if any ID already exists.
+
+        :param items: Dictionary of each unique resource ID and the URL to be stored under it.
+        :return: None if every URL was stored, or else the list of IDs that already exist.
+        """
+
+        self.request()
+
+        with self.lock:
+            collided = [url_id for url_id in items if self.collides(url_id)]
+
+            if collided:
+                return collided
+
+            self.items.update(items)
+
+        return None
+
+    def increment(self, key, count):
+        # type: (str, int) -> int
+        """Atomically add to the value of a counter.
+
+        :param key: Name of the counter.
+        :param count: Number added to the counter.
+        :return: The new value of the counter.
+        """
+
+        self.request()
+
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + count
+
+            return self.counters[key]
+
+    def add_clicks(self, counts):
+        # type: (dict) -> dict
+        """Atomically add click counts to stored links.
+
+        :param counts: Dictionary of each link's unique resource ID and its number of clicks.
+        :return: Dictionary of the click counts that were not written, which is always empty.
+        """
+
+        self.request()
+
+        with self.lock:
+            for url_id, count in counts.items():
+                if url_id in self.items:
+                    self.clicks[url_id] = self.clicks.get(url_id, 0) + count
+
+        return {}
+
+    def warm_up(self):
+        # type: () -> None
+        """Nothing is built ahead of the first request.
+
+        :return:
+        """
+
+        pass
+
+    def stats(self):
+        # type: () -> dict
+        """Return the number of stored items, requests, collisions, and clicks.
+
+        :return: Dictionary of the storage statistics.
+        """
+
+        return {
+            'Items': len(self.items),
+            'Requests': self.requests,
+            'Collisions': self.collisions,
+            'Clicks': sum(self.clicks.values())
+        }
+
+
+# Define the storage backends selectable by STORAGE_BACKEND.
+STORAGE_BACKENDS = {
+    'dynamodb': DynamoDBStorage,
+    'memory': MemoryStorage
+}
+
+
+class DynamoDBLogic(object):
+    """Define the storage and lookup of shortened IDs, on top of a storage backend.
+    """
+
+    def __init__(self, log, id_length, storage):
+        """Define the instance of the log object, id_length value, and storage backend.
+        
+        :param log: CloudWatch Logs context object.
+        :param id_length: Length of the resource IDs being generated.
+        :param storage: Storage backend, such as DynamoDBStorage or MemoryStorage.
+        """
+
+        self.log = log
+        self.id_length = id_length
+        self.storage = storage
+
+    def get_url(self, url_id):
+        # type: (str) -> Redirect
+        """Retrieve a stored URL from DynamoDB based on the resource ID.
+        
+        :param url_id: Unique resource ID taken from the request path.
+        :return: The Redirect to the URL stored in DynamoDB associated with the specified resource ID.
+        """
+
+        try:
+            # The ID must be within the range of generated lengths.
+            if not ID_LENGTH <= len(url_id) <= ID_MAX_LENGTH:
+                raise ValueError('Invalid ID Length')
+
+            # Return the URL from the cache when this container has already looked up the ID.
+            cached = url_cache.get(url_id)
+
+            metrics.count('CacheHits' if cached is not None else 'CacheMisses')
+
+            self.log.debug(lambda: 'Cache: {}'.format(dumps(url_cache.stats())))
+
+            if cached is URLCache.MISSING:
+                raise KeyError('Item does not exist')
+            elif cached is not None:
+                return cached
+
+            # Return the URL stored in DynamoDB.
+            with metrics.timer('DynamoDBGetItemLatency'):
+                url = self.storage.get(url_id)
+
+            if url is None:
+                url_cache.set(url_id, URLCache.MISSING)
+                raise KeyError('Item does not exist')
+
+            redirect = redirect_for(url)
+            url_cache.set(url_id, redirect)
+
+            return redirect
+        except Exception:
+            raise
+
+    def set_url(self, url):
+        # type: (int, str) -> str
+        """Store a URL and unique ID in DynamoDB.
+        
+        :param url: URL to be stored in DynamoDB.
+        :return: Unique resource ID associated with the URL.
+        """
+
+        if ID_STRATEGY == 'hash':
+            return self._set_hashed_url(url)
+
+        location = url
+
+        for attempt in range(SET_URL_MAX_ATTEMPTS):
+            url_id = self.new_ids(1)[0]
+
+            # Store the URL and unique resource ID in DynamoDB if the resource ID does not already exist.
+            with metrics.timer('DynamoDBPutItemLatency'):
+                stored = self.storage.put(url_id, location)
+
+            if not stored:
+                # An item with the same unique resource ID already exists, so generate a new one.
+                id_collisions.record(True)
+
+                self.log.event('Error: ID collision, attempt {} of {}'.format(attempt + 1, SET_URL_MAX_ATTEMPTS))
+
+                if attempt + 1 < SET_URL_MAX_ATTEMPTS:
+                    time.sleep(random.uniform(0, SET_URL_BACKOFF_BASE * 2 ** attempt))
+
+                continue
+
+            id_collisions.record(False)
+
+            # Log the ID collision metrics.
+            self.log.debug(lambda: 'IDs: {}'.format(dumps(id_collisions.stats())))
+
+            # Replace any negative cache entry for the new ID.
+            url_cache.set(url_id, redirect_for(location))
+
+            return url_id
+
+        raise RuntimeError('No unique ID found after {} attempts'.format(SET_URL_MAX_ATTEMPTS))
+
+    def set_urls(self, urls):
+        # type: (list) -> dict
+        """Store multiple URLs and unique IDs in DynamoDB, in chunks of transactional writes.
+
+        :param urls: URLs to be stored in DynamoDB.
+        :return: Dictionary of each URL and the unique resource ID associated with it.
+        """
+
+        # Each distinct URL is stored once, in the order it was received.
+        urls = list(OrderedDict.fromkeys(urls))
+        url_ids = OrderedDict()
+
+        # Hashed IDs are looked up before they are written, one URL at a time.
+        if ID_STRATEGY == 'hash':
+            for url in urls:
+                url_ids[url] = self._set_hashed_url(url)
+
+            return url_ids
+
+        for start in range(0, len(urls), BATCH_CHUNK_SIZE):
+            url_ids.update(self._set_url_chunk(urls[start:start + BATCH_CHUNK_SIZE]))
+
+        return url_ids
+
+    def _set_url_chunk(self, urls):
+        # type: (list) -> dict
+        """Store a chunk of URLs in a single transaction, retrying the IDs that collide with existing items.
+
+        :param urls: URLs to be stored in DynamoDB (at most BATCH_CHUNK_SIZE).
+        :return: Dictionary of each URL and the unique resource ID associated with it.
+        """
+
+        url_ids = dict(zip(urls, self.new_ids(len(urls))))
+
+        for attempt in range(BATCH_MAX_ATTEMPTS):
+            # Store every URL, or none of them, if none of the resource IDs already exist.
+            with metrics.timer('DynamoDBTransactWriteItemsLatency'):
+                collided_ids = self.storage.put_many(OrderedDict((url_ids[url], url) for url in urls))
+
+            if collided_ids is None:
+                for url in urls:
+                    id_collisions.record(False)
+                    url_cache.set(url_ids[url], redirect_for(url))
+
+                self.log.debug(lambda: 'IDs: {}'.format(dumps(id_collisions.stats())))
+
+                return url_ids
+
+            # Generate new IDs for the items that collided; all others are retried as they are.
+            collided_ids = set(collided_ids)
+            collided = [url for url in urls if url_ids[url] in collided_ids]
+            collisions = len(collided)
+
+            for url, url_id in zip(collided, self.new_ids(collisions, exclude=url_ids.values())):
+                id_collisions.record(True)
+                url_ids[url] = url_id
+
+            self.log.event('Error: Batch write cancelled with {} ID collisions, attempt {} of {}'.format(
+                collisions,
+                attempt + 1,
+                BATCH_MAX_ATTEMPTS
+            ))
+
+            # Back off exponentially, with jitter, before retrying throttled or conflicting transactions.
+            if attempt + 1 < BATCH_MAX_ATTEMPTS:
+                time.sleep(random.uniform(0, BATCH_BACKOFF_BASE * 2 ** attempt))
+
+        raise RuntimeError('Batch write cancelled after {} attempts'.format(BATCH_MAX_ATTEMPTS))
+
+    def _set_hashed_url(self, url):
+        # type: (str) -> str
+        """Store a URL under an ID derived from its hash, unless the same URL is already stored.
+
+        :param url: URL to be stored in DynamoDB.
+        :return: Unique resource ID associated with the URL.
+        """
+
+        normalized = url_normalize(url)
+        digest = id_hash(normalized, ID_MAX_LENGTH)
+
+        # Should a different URL already own the ID, the next longer prefix of the same hash is tried.
+        for id_length in range(self.id_length, ID_MAX_LENGTH + 1):
+            url_id = digest[:id_length]
+
+            # The cache is only consulted, so that storing URLs does not count towards the hits and misses of lookups.
+            cached = url_cache.lookup(url_id)
+            stored = cached.location if isinstance(cached, Redirect) else self._get_endpoint(url_id)
+
+            if stored is None:
+                # Store the URL and hashed resource ID in DynamoDB if the resource ID does not already exist.
+                with metrics.timer('DynamoDBPutItemLatency'):
+                    written = self.storage.put(url_id, url)
+
+                if written:
+                    id_collisions.record(False)
+                    url_cache.set(url_id, redirect_for(url))
+
+                    return url_id
+
+                # Another request stored the same ID first, so compare against what it stored.
+                stored = self._get_endpoint(url_id)
+
+            if stored is not None and url_normalize(stored) == normalized:
+                if not isinstance(cached, Redirect):
+                    url_cache.set(url_id, redirect_for(stored))
+
+                return url_id
+
+            id_collisions.record(True)
+
+            self.log.event('Error: Hashed ID collision at length {}'.format(id_length))
+
+        raise RuntimeError('No unique hashed ID found up to length {}'.format(ID_MAX_LENGTH))
+
+    def _get_endpoint(self, url_id):
+        # type: (str) -> any
+        """Retrieve the URL stored in DynamoDB for a resource ID.
+
+        :param url_id: Unique resource ID.
+        :return: The stored URL, or None if the ID does not exist.
+        """
+
+        with metrics.timer('DynamoDBGetItemLatency'):
+            return self.storage.get(url_id)
+
+    def count_click(self, url_id):
+        # type: (str) -> None
+        """Count a click of a link in memory, to be written later by 'flush_clicks'.
+
+        :param url_id: Unique resource ID of the link.
+        :return:
+        """
+
+        if CLICK_COUNTING:
+            click_counts.record(url_id)
+
+        return None
+
+    def flush_clicks(self, force=False):
+        # type: (bool) -> None
+        """Write the waiting click counts if they are due, and restore those that could not be written.
+
+        The writes are made within the invocation, as AWS Lambda freezes the container once the invocation returns,
+        so at most CLICK_FLUSH_MAX_WRITES links are written per invocation, and the rest by the following ones.
+
+        :param force: Write all the waiting click counts now, even if they are not due.
+        :return:
+        """
+
+        if not click_counts.pending or not (force or click_counts.due()):
+            return None
+
+        counts = click_counts.take(limit=not force)
+
+        try:
+            unwritten = self.storage.add_clicks(counts)
+        except Exception as e:
+            self.log.error('Error: Click counts not written: %s', e)
+            unwritten = counts
+
+        click_counts.written += sum(counts.values()) - sum(unwritten.values())
+        click_counts.restore(unwritten)
+
+        return None
+
+    def new_ids(self, count, exclude=()):
+        # type: (int, any) -> list
+        """Generate distinct unique resource IDs using the configured ID strategy.
+
+        :param count: Number of IDs to generate.
+        :param exclude: IDs that must not be generated, such as those already in the same transaction.
+        :return: List of unique resource IDs.
+        """
+
+        if count < 1:
+            return []
+
+        if ID_STRATEGY == 'counter':
+            # Reserve a block of sequential values from the atomic counter in a single request.
+            with metrics.timer('DynamoDBUpdateItemLatency'):
+                last = self.storage.increment(ID_COUNTER_KEY, count)
+
+            return [id_encode(number, self.id_length) for number in range(last - count + 1, last + 1)]
+
+        # Random IDs use the longer of the configured length and the container's adaptive length.
+        id_length = max(self.id_length, id_collisions.id_length)
+        url_ids = []
+        excluded = set(exclude)
+
+        while len(url_ids) < count:
+            url_id = id_gen(id_length)
+            if url_id not in excluded:
+                excluded.add(url_id)
+                url_ids.append(url_id)
+
+        return url_ids
+
+
+def dynamodb_client():
+    # type: () -> object
+    """Return the boto3 DynamoDB client, building it on the first call in this container.
+
+    :return: boto3 DynamoDB client.
+    """
+
+    global ddbc
+
+    if ddbc is None:
+        with ddbc_lock:
+            if ddbc is None:
+                import boto3
+                from botocore.config import Config
+
+                if debug:
+                    boto3.set_stream_logger(name='botocore')
+
+                ddbc = boto3.client('dynamodb', config=Config(connect_timeout=0.5, read_timeout=1))
+
+    return ddbc
+
+
+def client_error():
+    # type: () -> type
+    """Return botocore's ClientError for an 'except' clause, which is only evaluated once an exception is raised.
+
+    :return: botocore.exceptions.ClientError class.
+    """
+
+    from botocore.exceptions import ClientError
+
+    return ClientError
+
+
+def id_gen(id_length, strategy=None):
+    # type: (int, str) -> str
+    """Generate a unique alpha-numeric ID of a specified length.
+    
+    :param id_length: Length of unique string.
+    :param strategy: 'secrets' or 'random' source of randomness (default ID_STRATEGY).
+    :return: Unique string.
+    """
+
+    if (strategy or ID_STRATEGY) == 'random':
+        choice = random.choice
+    else:
+        choice = secrets.choice
+
+    return ''.join(choice(ID_ALPHABET) for _ in range(id_length))
+
+
+def accepted_encoding(accept_encoding, available):
+    # type: (str, dict) -> str
+    """Select the preferred content encoding that is both accepted by the client and available.
+
+    :param accept_encoding: The value of the request's 'Accept-Encoding' header.
+    :param available: The available encodings, which always include 'identity'.
+    :return: 'br', 'gzip', or 'identity'.
+    """
+
+    accepted = set()
+    rejected = set()
+
+    for coding in accept_encoding.lower().split(','):
+        params = coding.split(';')
+        quality = next((param.strip()[2:] for param in params[1:] if param.strip().startswith('q=')), '1')
+
+        # A quality value of zero means "not acceptable", even where '*' accepts every other encoding.
+        if quality.strip().strip('0.') == '':
+            rejected.add(params[0].strip())
+        else:
+            accepted.add(params[0].strip())
+
+    for encoding in ('br', 'gzip'):
+        if encoding in available and (encoding in accepted or ('*' in accepted and encoding not in rejected)):
+            return encoding
+
+    return 'identity'
+
+
+def header_value(event, name):
+    # type: (dict, str) -> any
+    """Return the value of a request header, regardless of the letter case the client sent it in.
+
+    :param event: Ingested JSON event object provided at invocation.
+    :param name: Header name.
+    :return: The header value, or None if the header was not sent.
+    """
+
+    headers = event.get('headers') or {}
+
+    if name in headers:
+        return headers[name]
+
+    name = name.lower()
+
+    for key, value in headers.items():
+        if key.lower() == name:
+            return value
+
+    return None
+
+
+def http_date(seconds):
+    # type: (float) -> str
+    """Format a time as an HTTP date, such as "Sun, 06 Nov 1994 08:49:37 GMT".
+
+    :param seconds: Seconds since the epoch.
+    :return: HTTP date string.
+    """
+
+    t = time.gmtime(seconds)
+
+    return '{}, {:02d} {} {:04d} {:02d}:{:02d}:{:02d} GMT'.format(
+        HTTP_DATE_DAYS[t.tm_wday], t.tm_mday, HTTP_DATE_MONTHS[t.tm_mon - 1], t.tm_year, t.tm_hour, t.tm_min, t.tm_sec
+    )
+
+
+# A stored URL, with the validators of its redirect, which are computed once per cached URL.
+Redirect = namedtuple('Redirect', ('location', 'etag', 'last_modified'))
+
+
+def redirect_for(location):
+    # type: (str) -> Redirect
+    """Compute the validators of the redirect to a URL, which are cached with it.
+
+    :param location: URL to be redirected to.
+    :return: The URL, its entity tag, and the time it was cached as an HTTP date.
+    """
+
+    # The ETag changes with the redirect status, so that changing REDIRECT_STATUS replaces cached redirects.
+    etag = '"{}"'.format(sha256('{} {}'.format(REDIRECT_STATUS, location).encode('utf-8')).hexdigest()[:32])
+
+    return Redirect(location, etag, http_date(time.time()))
+
+
+def parse_http_date(value):
+    # type: (str) -> any
+    """Parse an HTTP date, such as "Sun, 06 Nov 1994 08:49:37 GMT".
+
+    :param value: HTTP date string.
+    :return: Seconds since the epoch, or None if the value is not a valid HTTP date.
+    """
+
+    match = HTTP_DATE_PATTERN.match(value)
+
+    if match is None:
+        return None
+
+    # Imported on use, as only revalidation requests carry dates.
+    from calendar import timegm
+
+    day, month, year, hour, minute, second = (
+        HTTP_DATE_MONTHS.index(group) + 1 if group in HTTP_DATE_MONTHS else int(group) for group in match.groups()
+    )
+    seconds = timegm((year, month, day, hour, minute, second))
+
+    # timegm() accepts out of range fields, such as "31 Feb", by carrying them into the next field.
+    if time.gmtime(seconds)[:6] != (year, month, day, hour, minute, second):
+        return None
+
+    return seconds
+
+
+def not_modified(redirect, if_none_match=None, if_modified_since=None):
+    # type: (Redirect, str, str) -> bool
+    """Evaluate the conditional request headers against a redirect (RFC 7232).
+
+    A stored URL never changes, so any valid 'If-Modified-Since' date that is not in the future means that the client
+    already has the current redirect.  'If-Modified-Since' is ignored when 'If-None-Match' is sent.  The headers that
+    repeat the redirect's own 'ETag' or 'Last-Modified' are matched as strings, before any other value is parsed.
+
+    :param redirect: The Redirect from 'redirect_for'.
+    :param if_none_match: The value of the request's 'If-None-Match' header.
+    :param if_modified_since: The value of the request's 'If-Modified-Since' header.
+    :return: True if a 304 response should be returned instead of the redirect.
+    """
+
+    etag = redirect.etag
+
+    if if_none_match is not None:
+        if if_none_match == etag or if_none_match.strip() == '*':
+            return True
+
+        # Entity tags are compared weakly, so that 'W/"..."' matches '"..."'.
+        for tag in if_none_match.split(','):
+            tag = tag.strip()
+
+            if tag.startswith('W/'):
+                tag = tag[2:]
+
+            if tag == etag:
+                return True
+
+        return False
+
+    if if_modified_since is not None:
+        if if_modified_since == redirect.last_modified:
+            return True
+
+        since = parse_http_date(if_modified_since)
+
+        return since is not None and since <= time.time()
+
+    return False
+
+
+def id_hash(url, id_length):
+    # type: (str, int) -> str
+    """Generate an alpha-numeric ID of a specified length from the SHA-256 hash of a URL.
+
+    :param url: Normalized URL.
+    :param id_length: Length of the ID.
+    :return: String that is always the same for the same URL.
+    """
+
+    number = int.from_bytes(sha256(url.encode('utf-8')).digest(), 'big')
+    base = len(ID_ALPHABET)
+    characters = []
+
+    for _ in range(id_length):
+        number, remainder = divmod(number, base)
+        characters.append(ID_ALPHABET[remainder])
+
+    return ''.join(characters)
+
+
+def url_normalize(url):
+    # type: (str) -> str
+    """Normalize the parts of a URL that do not change where it leads.
+
+    The scheme and host are lower-cased, the default port is removed, an empty path becomes "/",
+    and the fragment is kept, since it may be meaningful to the page being redirected to.
+
+    :param url: URL to be normalized.
+    :return: Normalized URL.
+    """
+
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    userinfo, at, host = parts.netloc.rpartition('@')
+    host = host.lower()
+
+    if (scheme, host.rpartition(':')[2]) in (('http', '80'), ('https', '443')):
+        host = host.rpartition(':')[0]
+
+    return urlunsplit((scheme, userinfo + at + host, parts.path or '/', parts.query, parts.fragment))
+
+
+def id_encode(number, id_length):
+    # type: (int, int) -> str
+    """Encode a counter value as an alpha-numeric ID, padded to a minimum length.
+
+    :param number: Non-negative counter value.
+    :param id_length: Minimum length of the ID.
+    :return: Unique string.
+    """
+
+    base = len(ID_ALPHABET)
+    characters = []
+
+    while number:
+        number, remainder = divmod(number, base)
+        characters.append(ID_ALPHABET[remainder])
+
+    return ''.join(reversed(characters)).rjust(id_length, ID_ALPHABET[0])
+
+
+class Router(object):
+    """Define the dispatch of API Gateway requests to the logic for each HTTP method.
+    """
+
+    def __init__(self, log, apigw, dynamodb):
+        """Define the instances of the helper objects, and the method dispatch table.
+
+        :param log: CloudWatch Logs context object.
+        :param apigw: API Gateway Lambda Proxy object.
+        :param dynamodb: DynamoDB URL logic object.
+        """
+
+        self.log = log
+        self.apigw = apigw
+        self.dynamodb = dynamodb
+        self.routes = {
+            'GET': self.get,
+            'POST': self.post
+        }
+
+    def dispatch(self, event):
+        # type: (dict) -> dict
+        """Return the response of the logic registered for the request's HTTP method.
+
+        :param event: Ingested JSON event object provided at invocation.
+        :return: An API Gateway Lambda Proxy response object.
+        """
+
+        route = self.routes.get(event['httpMethod'])
+
+        if route is None:
+            # Return "405: Method Not Allowed".
+            return self.apigw.status_405(header_value(event, 'Accept-Encoding'))
+
+        return route(event)
+
+    def get(self, event):
+        # type: (dict) -> dict
+        """Redirect to the URL stored for the resource ID in the request path.
+
+        :param event: Ingested JSON event object provided at invocation.
+        :return: An API Gateway Lambda Proxy response object.
+        """
+
+        try:
+            match = ID_PATH_PATTERN.match(event['resource'])
+
+            if match is None:
+                raise ValueError('Invalid Path')
+
+            # Request the URL from DynamoDB.
+            redirect = self.dynamodb.get_url(match.group(1))
+        except (ValueError, KeyError) as e:
+            self.log.event('Error: {}'.format(e))
+            return self.apigw.status_404(header_value(event, 'Accept-Encoding'))
+
+        # Count the click in memory; the counts are written once they are due, after the response.
+        self.dynamodb.count_click(match.group(1))
+
+        # Return the redirect to the location stored in DynamoDB, or "304: Not Modified" if the client has it cached.
+        return self.apigw.status_redirect(
+            redirect,
+            header_value(event, 'If-None-Match'),
+            header_value(event, 'If-Modified-Since')
+        )
+
+    def post(self, event):
+        # type: (dict) -> dict
+        """Store the URL in the 'URL' header, or the list of URLs in the JSON body.
+
+        :param event: Ingested JSON event object provided at invocation.
+        :return: An API Gateway Lambda Proxy response object.
+        """
+
+        headers = event.get('headers') or {}
+
+        if 'URL' not in headers:
+            return self.post_batch(event)
+
+        try:
+            url = headers['URL']
+
+            # Check for a valid URL.
+            if not URL_PATTERN.match(url):
+                raise KeyError('Missing protocol prefix in URL')
+
+            # Store the URL in DynamoDB.
+            url_id = self.dynamodb.set_url(url=url)
+        except KeyError as e:
+            self.log.event('Error: {}'.format(e))
+            return self.apigw.status_400(header_value(event, 'Accept-Encoding'))
+
+        # Return "200: Ok" with the shortened URL.
+        return self.apigw.response(
+            status_code=200,
+            headers={'Content-Type': 'application/json'},
+            body=dumps({'UrlId': url_id})
+        )
+
+    def post_batch(self, event):
+        # type: (dict) -> dict
+        """Store the list of URLs in the JSON body of the request.
+
+        :param event: Ingested JSON event object provided at invocation.
+        :return: An API Gateway Lambda Proxy response object.
+        """
+
+        try:
+            body = event['body']
+            if event.get('isBase64Encoded'):
+                body = b64decode(body).decode('utf-8')
+
+            urls = loads(body)['URLs']
+
+            # Check for a valid list of URLs.
+            if not isinstance(urls, list) or not 0 < len(urls) <= BATCH_MAX_URLS:
+                raise KeyError('Expected 1 to {} URLs'.format(BATCH_MAX_URLS))
+
+            for url in urls:
+                if not isinstance(url, str) or not URL_PATTERN.match(url):
+                    raise KeyError('Missing protocol prefix in URL')
+
+            # Store the URLs in DynamoDB.
+            url_ids = self.dynamodb.set_urls(urls=urls)
+        except (KeyError, TypeError, ValueError) as e:
+            self.log.event('Error: {}'.format(e))
+            return self.apigw.status_400(header_value(event, 'Accept-Encoding'))
+
+        # Return "200: Ok" with the shortened URLs.
+        return self.apigw.response(
+            status_code=200,
+            headers={'Content-Type': 'application/json'},
+            body=dumps({'UrlIds': url_ids})
+        )
+
+
+# Instantiate the logging, metrics, API Gateway, storage, DynamoDB, and routing objects once per container.
+# They hold no request state; the log is bound to each invocation's context by 'lambda_handler'.
+log = CWLogs(None, level=LOG_LEVEL, buffer_size=LOG_BUFFER_SIZE)
+metrics = CWMetrics(
+    METRICS_NAMESPACE,
+    flush_invocations=METRICS_FLUSH_INVOCATIONS,
+    flush_interval=METRICS_FLUSH_INTERVAL
+)
+storage = STORAGE_BACKENDS[os.getenv('STORAGE_BACKEND', STORAGE_BACKEND)](log)
+router = Router(log, APIGWProxy(log), DynamoDBLogic(log, ID_LENGTH, storage))
+
+if WARM_UP or os.getenv('AWS_LAMBDA_INITIALIZATION_TYPE') == 'provisioned-concurrency':
+    storage.warm_up()
+
+
+def lambda_handler(event, context):
+    """AWS Lambda executes the 'lambda_handler' function on invocation.
+
+    :param event: Ingested JSON event object provided at invocation.
+    :param context: Lambda context object, containing information specific to the invocation and Function.
+    :return: Final response to AWS Lambda, and passed to the invoker if the invocation type is RequestResponse.
+    """
+
+    # Bind our CloudWatch logging and metrics objects to the invocation.
+    log.context = context
+    metrics.dimensions['FunctionName'] = context.function_name
+
+    # Log the event object provided to the Lambda Function at invocation.
+    log.debug(lambda: 'Event: {}'.format(dumps(event)))
+
+    # Request processing logic.
+    try:
+        return router.dispatch(event)
+    except Exception as e:
+        log.error('Error: %s', e)
+
+        # Return "500: Internal Server Error".
+        return router.apigw.status_500(header_value(event, 'Accept-Encoding'))
+    finally:
+        # Write the click counts if they are due, before the container is frozen.
+        router.dynamodb.flush_clicks()
+
+        # Print the buffered log events once per invocation, and the metrics once enough invocations are aggregated.
+        log.flush()
+        metrics.flush()
 
 
 def local_test():
@@ -370,5 +2057,5 @@ def local_test():
     lambda_handler(event, context)
 
 
-if testing_locally:
+if testing_locally and __name__ == '__main__':
     local_test()
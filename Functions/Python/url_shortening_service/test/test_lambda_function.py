@@ -0,0 +1,705 @@
+"""Created By: Andrew Ryan DeFilippis"""
+
+import contextlib
+import gzip
+import unittest
+from base64 import b64decode
+from io import StringIO
+from json import dumps, loads
+from unittest import mock
+
+import context
+
+with contextlib.redirect_stdout(StringIO()):
+    import lambda_function
+
+
+class LocalDynamoDB(object):
+    """Answer the DynamoDB client calls of DynamoDBStorage from a table in memory.
+    """
+
+    def __init__(self):
+        self.items = {}
+
+    def get_item(self, TableName, Key):
+        item = self.items.get(Key['ID']['S'])
+
+        return {'Item': item} if item is not None else {}
+
+    def put_item(self, TableName, Item, ConditionExpression):
+        if Item['ID']['S'] in self.items:
+            raise lambda_function.client_error()(
+                {'Error': {'Code': 'ConditionalCheckFailedException'}},
+                'PutItem'
+            )
+
+        self.items[Item['ID']['S']] = Item
+
+        return {}
+
+    def update_item(self, TableName, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues,
+                    ReturnValues):
+        item = self.items.setdefault(Key['ID']['S'], {'ID': Key['ID'], 'Value': {'N': '0'}})
+        item['Value'] = {'N': str(int(item['Value']['N']) + int(ExpressionAttributeValues[':count']['N']))}
+
+        return {'Attributes': {'Value': item['Value']}}
+
+
+class FunctionTestCase(unittest.TestCase):
+    """Run each test against an empty table in memory, with an empty URL cache.
+    """
+
+    def setUp(self):
+        self.storage = lambda_function.MemoryStorage(lambda_function.log, seed='test')
+        lambda_function.router.dynamodb.storage = self.storage
+        lambda_function.log.context = context
+        lambda_function.log.level = lambda_function.CWLogs.LEVELS['INFO']
+        lambda_function.url_cache.clear()
+        lambda_function.id_collisions = lambda_function.CollisionMeter(
+            lambda_function.ID_LENGTH,
+            lambda_function.ID_MAX_LENGTH,
+            lambda_function.ID_GROWTH_RATE,
+            lambda_function.ID_GROWTH_WINDOW
+        )
+
+        # Back-off delays between retries are skipped.
+        patcher = mock.patch.object(lambda_function.time, 'sleep')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def invoke(self, event):
+        """Invoke the Function, discarding its log events and metrics.
+        """
+
+        with contextlib.redirect_stdout(StringIO()):
+            return lambda_function.lambda_handler(event, context)
+
+
+class TestURLCache(unittest.TestCase):
+    """Test the bounded cache of stored URLs and missing IDs.
+    """
+
+    def test_lru_eviction(self):
+        """Verify that the least recently used URL is evicted once the cache is full.
+        """
+
+        cache = lambda_function.URLCache(2)
+
+        cache.set('a', 'https://a/')
+        cache.set('b', 'https://b/')
+        cache.get('a')
+        cache.set('c', 'https://c/')
+
+        self.assertEqual('https://a/', cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual('https://c/', cache.get('c'))
+
+    def test_negative_ttl_expiry(self):
+        """Verify that missing IDs expire after the negative TTL, while stored URLs are kept.
+        """
+
+        cache = lambda_function.URLCache(10, negative_ttl=60)
+
+        with mock.patch.object(lambda_function.time, 'time', return_value=1000):
+            cache.set('a', 'https://a/')
+            cache.set('b', lambda_function.URLCache.MISSING)
+
+        with mock.patch.object(lambda_function.time, 'time', return_value=1059):
+            self.assertIs(lambda_function.URLCache.MISSING, cache.get('b'))
+
+        with mock.patch.object(lambda_function.time, 'time', return_value=1060):
+            self.assertIsNone(cache.get('b'))
+            self.assertEqual('https://a/', cache.get('a'))
+
+    def test_missing_ids_do_not_evict_urls(self):
+        """Verify that missing IDs are evicted within their own cap, and never evict stored URLs.
+        """
+
+        cache = lambda_function.URLCache(2, negative_ttl=60, max_missing=2)
+
+        cache.set('a', 'https://a/')
+        cache.set('b', 'https://b/')
+
+        for number in range(100):
+            cache.set('missing{}'.format(number), lambda_function.URLCache.MISSING)
+
+        self.assertEqual({'Items': 2, 'Missing': 2, 'Hits': 0, 'Misses': 0}, cache.stats())
+        self.assertEqual('https://a/', cache.get('a'))
+        self.assertEqual('https://b/', cache.get('b'))
+
+        # A stored ID replaces its negative entry.
+        cache.set('missing99', 'https://c/')
+
+        self.assertEqual({'Items': 2, 'Missing': 1}, {k: cache.stats()[k] for k in ('Items', 'Missing')})
+        self.assertEqual('https://c/', cache.get('missing99'))
+
+    def test_hit_and_miss_counters(self):
+        """Verify that lookups by 'get' are counted, and those by 'lookup' are not.
+        """
+
+        cache = lambda_function.URLCache(10, negative_ttl=60)
+
+        cache.set('a', 'https://a/')
+        cache.set('b', lambda_function.URLCache.MISSING)
+
+        cache.get('a')
+        cache.get('b')
+        cache.get('c')
+        cache.lookup('a')
+        cache.lookup('c')
+
+        self.assertEqual({'Items': 1, 'Missing': 1, 'Hits': 2, 'Misses': 1}, cache.stats())
+
+
+class TestCWMetrics(unittest.TestCase):
+    """Test the aggregation of metrics across invocations.
+    """
+
+    def test_flush_invocations(self):
+        """Verify that the metrics of a number of invocations are printed as one event, with their counters summed.
+        """
+
+        metrics = lambda_function.CWMetrics('Namespace', flush_invocations=3)
+        output = StringIO()
+
+        with contextlib.redirect_stdout(output):
+            for _ in range(3):
+                metrics.count('Status404')
+                metrics.put('Latency', 1.0, unit='Milliseconds')
+                metrics.flush()
+
+                if metrics.invocations:
+                    self.assertEqual('', output.getvalue())
+
+        lines = output.getvalue().splitlines()
+
+        self.assertEqual(1, len(lines))
+        self.assertEqual(3, loads(lines[0])['Status404'])
+        self.assertEqual([1.0, 1.0, 1.0], loads(lines[0])['Latency'])
+
+    def test_flush_full(self):
+        """Verify that the event is printed early once a metric holds as many values as one event can.
+        """
+
+        metrics = lambda_function.CWMetrics('Namespace', flush_invocations=1000)
+        output = StringIO()
+
+        with contextlib.redirect_stdout(output):
+            for _ in range(metrics.MAX_VALUES):
+                metrics.put('Latency', 1.0)
+                metrics.flush()
+
+        lines = output.getvalue().splitlines()
+
+        self.assertEqual(1, len(lines))
+        self.assertEqual(metrics.MAX_VALUES, len(loads(lines[0])['Latency']))
+
+
+class TestGetURL(FunctionTestCase):
+    """Test the lookup of stored URLs through the URL cache.
+    """
+
+    def test_lookups_are_cached(self):
+        """Verify that stored URLs and missing IDs are read from storage once.
+        """
+
+        self.storage.items['a1b2c3d'] = 'https://www.example.com/'
+
+        for _ in range(3):
+            self.assertEqual(301, self.invoke({'httpMethod': 'GET', 'resource': '/a1b2c3d'})['statusCode'])
+            self.assertEqual(404, self.invoke({'httpMethod': 'GET', 'resource': '/zzzzzzz'})['statusCode'])
+
+        self.assertEqual(2, self.storage.requests)
+        self.assertEqual(
+            {'Items': 1, 'Missing': 1, 'Hits': 4, 'Misses': 2},
+            lambda_function.url_cache.stats()
+        )
+
+    def test_hashed_urls_are_not_counted(self):
+        """Verify that storing URLs under hashed IDs does not count towards the hits and misses of lookups.
+        """
+
+        with mock.patch.object(lambda_function, 'ID_STRATEGY', 'hash'):
+            for _ in range(2):
+                self.invoke({'httpMethod': 'POST', 'headers': {'URL': 'https://www.example.com/'}})
+
+        self.assertEqual(0, lambda_function.url_cache.hits)
+        self.assertEqual(0, lambda_function.url_cache.misses)
+
+
+class TestRedirect(FunctionTestCase):
+    """Test the redirect responses and their validators.
+    """
+
+    def test_redirect_validators(self):
+        """Verify that the validators of a redirect are computed once per cached URL, and answer conditional requests.
+        """
+
+        self.storage.items['a1b2c3d'] = 'https://www.example.com/'
+
+        with mock.patch.object(lambda_function, 'redirect_for', wraps=lambda_function.redirect_for) as redirect_for:
+            response = self.invoke({'httpMethod': 'GET', 'resource': '/a1b2c3d'})
+            headers = response['headers']
+
+            self.assertEqual(lambda_function.REDIRECT_STATUS, response['statusCode'])
+            self.assertEqual('https://www.example.com/', headers['Location'])
+
+            for conditional in (
+                {'If-None-Match': headers['ETag']},
+                {'If-None-Match': 'W/' + headers['ETag']},
+                {'If-Modified-Since': headers['Last-Modified']}
+            ):
+                response = self.invoke({'httpMethod': 'GET', 'resource': '/a1b2c3d', 'headers': conditional})
+
+                self.assertEqual(304, response['statusCode'])
+                self.assertEqual(headers['ETag'], response['headers']['ETag'])
+                self.assertNotIn('Location', response['headers'])
+
+            response = self.invoke({'httpMethod': 'GET', 'resource': '/a1b2c3d', 'headers': {'If-None-Match': '"x"'}})
+
+            self.assertEqual(lambda_function.REDIRECT_STATUS, response['statusCode'])
+            self.assertEqual(1, redirect_for.call_count)
+
+    def test_not_modified_dates(self):
+        """Verify that any valid past 'If-Modified-Since' date is current, as a stored URL never changes.
+        """
+
+        redirect = lambda_function.redirect_for('https://www.example.com/')
+
+        self.assertTrue(lambda_function.not_modified(redirect, if_modified_since='Sun, 06 Nov 1994 08:49:37 GMT'))
+        self.assertFalse(lambda_function.not_modified(redirect, if_modified_since='Sun, 06 Nov 2994 08:49:37 GMT'))
+        self.assertFalse(lambda_function.not_modified(redirect, if_modified_since='Mon, 31 Feb 1994 08:49:37 GMT'))
+        self.assertFalse(lambda_function.not_modified(
+            redirect,
+            if_none_match='"x"',
+            if_modified_since=redirect.last_modified
+        ))
+
+
+class TestBatch(FunctionTestCase):
+    """Test the creation of many URLs in transactional chunks.
+    """
+
+    def post_urls(self, urls):
+        """Store a list of URLs, and return the response status code and body.
+        """
+
+        response = self.invoke({'httpMethod': 'POST', 'body': dumps({'URLs': urls})})
+
+        return response['statusCode'], loads(response['body']) if response['statusCode'] == 200 else None
+
+    def test_chunks(self):
+        """Verify that the URLs are written in chunks of BATCH_CHUNK_SIZE, and each receives its own ID.
+        """
+
+        urls = ['https://www.example.com/{}'.format(number) for number in range(60)]
+
+        with mock.patch.object(lambda_function, 'BATCH_CHUNK_SIZE', 25), \
+                mock.patch.object(self.storage, 'put_many', wraps=self.storage.put_many) as put_many:
+            status_code, body = self.post_urls(urls)
+
+        self.assertEqual(200, status_code)
+        self.assertEqual([25, 25, 10], [len(call.args[0]) for call in put_many.call_args_list])
+        self.assertEqual(urls, list(body['UrlIds']))
+        self.assertEqual(60, len(set(body['UrlIds'].values())))
+        self.assertEqual({url_id: url for url, url_id in body['UrlIds'].items()}, self.storage.items)
+
+    def test_duplicates(self):
+        """Verify that a URL listed more than once is stored once, in the order it was first listed.
+        """
+
+        status_code, body = self.post_urls(['https://b/', 'https://a/', 'https://b/'])
+
+        self.assertEqual(200, status_code)
+        self.assertEqual(['https://b/', 'https://a/'], list(body['UrlIds']))
+        self.assertEqual(2, len(self.storage.items))
+
+    def test_collisions_regenerated(self):
+        """Verify that only the IDs that collided are regenerated, and the chunk is written again.
+        """
+
+        self.storage.items['aaaaaaa'] = 'https://existing/'
+
+        with mock.patch.object(lambda_function, 'id_gen', side_effect=['aaaaaaa', 'bbbbbbb', 'ccccccc']), \
+                mock.patch.object(self.storage, 'put_many', wraps=self.storage.put_many) as put_many:
+            status_code, body = self.post_urls(['https://a/', 'https://b/'])
+
+        self.assertEqual(200, status_code)
+        self.assertEqual({'https://a/': 'ccccccc', 'https://b/': 'bbbbbbb'}, body['UrlIds'])
+        self.assertEqual(2, put_many.call_count)
+        self.assertEqual('https://existing/', self.storage.items['aaaaaaa'])
+
+    def test_attempts_exhausted(self):
+        """Verify that a chunk still colliding after BATCH_MAX_ATTEMPTS is answered with "500: Internal Server Error".
+        """
+
+        self.storage.collision_rate = 1.0
+
+        status_code, _ = self.post_urls(['https://a/', 'https://b/'])
+
+        self.assertEqual(500, status_code)
+        self.assertEqual(lambda_function.BATCH_MAX_ATTEMPTS, self.storage.requests)
+        self.assertEqual({}, self.storage.items)
+
+    def test_invalid_batches(self):
+        """Verify that empty, oversized, and invalid lists of URLs are answered with "400: Bad Request".
+        """
+
+        for urls in ([], ['https://a/'] * (lambda_function.BATCH_MAX_URLS + 1), ['www.example.com'], [1], 'https://a/'):
+            self.assertEqual(400, self.post_urls(urls)[0])
+
+        self.assertEqual(0, self.storage.requests)
+
+
+class TestSetURL(FunctionTestCase):
+    """Test the creation of single URLs, and the ID strategies.
+    """
+
+    def post_url(self, url):
+        """Store a URL, and return the response status code and the ID of the URL.
+        """
+
+        response = self.invoke({'httpMethod': 'POST', 'headers': {'URL': url}})
+
+        return response['statusCode'], loads(response['body'])['UrlId'] if response['statusCode'] == 200 else None
+
+    def test_attempts_exhausted(self):
+        """Verify that a URL whose IDs collide SET_URL_MAX_ATTEMPTS times is answered with "500: Internal Server Error".
+        """
+
+        self.storage.collision_rate = 1.0
+
+        with self.assertRaises(RuntimeError):
+            lambda_function.router.dynamodb.set_url('https://a/')
+
+        self.assertEqual(500, self.post_url('https://a/')[0])
+        self.assertEqual(2 * lambda_function.SET_URL_MAX_ATTEMPTS, self.storage.requests)
+        self.assertEqual({}, self.storage.items)
+
+    def test_collision_retried(self):
+        """Verify that a colliding ID is replaced by a new one.
+        """
+
+        self.storage.items['aaaaaaa'] = 'https://existing/'
+
+        with mock.patch.object(lambda_function, 'id_gen', side_effect=['aaaaaaa', 'bbbbbbb']):
+            self.assertEqual((200, 'bbbbbbb'), self.post_url('https://a/'))
+
+        self.assertEqual('https://existing/', self.storage.items['aaaaaaa'])
+        self.assertEqual('https://a/', self.storage.items['bbbbbbb'])
+
+    def test_counter_ids(self):
+        """Verify that the counter strategy generates sequential IDs, in single and batch writes.
+        """
+
+        with mock.patch.object(lambda_function, 'ID_STRATEGY', 'counter'):
+            self.assertEqual((200, '0000001'), self.post_url('https://a/'))
+            self.assertEqual((200, '0000002'), self.post_url('https://b/'))
+
+            response = self.invoke({'httpMethod': 'POST', 'body': dumps({'URLs': ['https://c/', 'https://d/']})})
+
+        self.assertEqual({'https://c/': '0000003', 'https://d/': '0000004'}, loads(response['body'])['UrlIds'])
+        self.assertEqual('https://b/', self.storage.items['0000002'])
+
+    def test_counter_item_not_found(self):
+        """Verify that the counter item, which is stored in the table like the URLs, is never redirected to.
+        """
+
+        lambda_function.router.dynamodb.storage = lambda_function.DynamoDBStorage(lambda_function.log)
+
+        with mock.patch.object(lambda_function, 'ddbc', LocalDynamoDB()) as table, \
+                mock.patch.object(lambda_function, 'ID_STRATEGY', 'counter'):
+            self.assertEqual((200, '0000001'), self.post_url('https://a/'))
+
+            self.assertIn(lambda_function.ID_COUNTER_KEY, table.items)
+            self.assertEqual(
+                404,
+                self.invoke({'httpMethod': 'GET', 'resource': '/' + lambda_function.ID_COUNTER_KEY})['statusCode']
+            )
+            self.assertEqual(301, self.invoke({'httpMethod': 'GET', 'resource': '/0000001'})['statusCode'])
+
+
+class TestHashedURL(FunctionTestCase):
+    """Test the hash ID strategy, which stores each URL once.
+    """
+
+    def setUp(self):
+        super(TestHashedURL, self).setUp()
+
+        patcher = mock.patch.object(lambda_function, 'ID_STRATEGY', 'hash')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def post_url(self, url):
+        """Store a URL, and return the ID of the URL.
+        """
+
+        response = self.invoke({'httpMethod': 'POST', 'headers': {'URL': url}})
+        self.assertEqual(200, response['statusCode'])
+
+        return loads(response['body'])['UrlId']
+
+    def test_duplicate_single_read(self):
+        """Verify that storing a URL again costs a single read, and none while the URL is cached.
+        """
+
+        url = 'https://www.example.com/a'
+        url_id = self.post_url(url)
+
+        self.assertEqual(lambda_function.id_hash(lambda_function.url_normalize(url), lambda_function.ID_MAX_LENGTH)[
+            :lambda_function.ID_LENGTH
+        ], url_id)
+
+        requests = self.storage.requests
+        self.assertEqual(url_id, self.post_url(url))
+        self.assertEqual(requests, self.storage.requests)
+
+        lambda_function.url_cache.clear()
+
+        with mock.patch.object(self.storage, 'put', wraps=self.storage.put) as put:
+            self.assertEqual(url_id, self.post_url('https://WWW.example.com:443/a'))
+
+        self.assertEqual(requests + 1, self.storage.requests)
+        put.assert_not_called()
+        self.assertEqual({url_id: url}, self.storage.items)
+
+    def test_collision_longer_prefix(self):
+        """Verify that a different URL owning the hashed ID moves the URL to the next longer prefix of its hash.
+        """
+
+        url = 'https://www.example.com/a'
+        digest = lambda_function.id_hash(lambda_function.url_normalize(url), lambda_function.ID_MAX_LENGTH)
+        self.storage.items[digest[:lambda_function.ID_LENGTH]] = 'https://www.example.com/b'
+
+        self.assertEqual(digest[:lambda_function.ID_LENGTH + 1], self.post_url(url))
+        self.assertEqual('https://www.example.com/b', self.storage.items[digest[:lambda_function.ID_LENGTH]])
+
+        lambda_function.url_cache.clear()
+        requests = self.storage.requests
+
+        self.assertEqual(digest[:lambda_function.ID_LENGTH + 1], self.post_url(url))
+        self.assertEqual(requests + 2, self.storage.requests)
+
+
+class TestClickCounter(unittest.TestCase):
+    """Test the click counts waiting to be written.
+    """
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = mock.patch.object(lambda_function.time, 'time', side_effect=lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.counter = lambda_function.ClickCounter(interval=10, threshold=5, max_links=3, max_writes=2)
+
+    def test_due(self):
+        """Verify that the clicks are due after the threshold, the links limit, or the interval.
+        """
+
+        self.assertFalse(self.counter.due())
+
+        for _ in range(4):
+            self.counter.record('a')
+
+        self.assertFalse(self.counter.due())
+        self.counter.record('a')
+        self.assertTrue(self.counter.due())
+
+        self.counter.take(limit=False)
+        self.assertFalse(self.counter.due())
+
+        for url_id in 'abc':
+            self.counter.record(url_id)
+
+        self.assertTrue(self.counter.due())
+
+        self.counter.take(limit=False)
+        self.counter.record('a')
+        self.now += 9
+        self.assertFalse(self.counter.due())
+        self.now += 1
+        self.assertTrue(self.counter.due())
+
+    def test_take_carried(self):
+        """Verify that at most 'max_writes' links are taken, longest waiting first, and the rest stay due.
+        """
+
+        for url_id in 'abc':
+            self.counter.record(url_id)
+
+        self.counter.record('c')
+
+        self.assertEqual({'a': 1, 'b': 1}, self.counter.take())
+        self.assertEqual({'Pending': 2, 'Links': 1, 'Written': 0, 'Dropped': 0}, self.counter.stats())
+        self.assertTrue(self.counter.due())
+
+        self.assertEqual({'c': 2}, self.counter.take())
+        self.assertEqual(0, self.counter.pending)
+        self.assertFalse(self.counter.due())
+
+    def test_restore(self):
+        """Verify that restored clicks are added to those recorded since, and dropped beyond the links limit.
+        """
+
+        self.counter.record('a')
+        self.counter.record('b')
+        counts = self.counter.take()
+
+        self.counter.record('b')
+        self.counter.record('c')
+        self.counter.record('d')
+        self.counter.restore({'a': 2, 'b': 3})
+
+        self.assertEqual({'b': 4, 'c': 1, 'd': 1}, self.counter.counts)
+        self.assertEqual({'Pending': 6, 'Links': 3, 'Written': 0, 'Dropped': 2}, self.counter.stats())
+        self.assertEqual({'a': 1, 'b': 1}, counts)
+
+    def test_dropped(self):
+        """Verify that the clicks of new links are dropped while 'max_links' links are waiting.
+        """
+
+        for url_id in 'abcdd':
+            self.counter.record(url_id)
+
+        self.counter.record('a')
+
+        self.assertEqual({'a': 2, 'b': 1, 'c': 1}, self.counter.counts)
+        self.assertEqual({'Pending': 4, 'Links': 3, 'Written': 0, 'Dropped': 2}, self.counter.stats())
+
+
+class TestFlushClicks(FunctionTestCase):
+    """Test the writes of the click counts at the end of the invocations.
+    """
+
+    def setUp(self):
+        super(TestFlushClicks, self).setUp()
+
+        self.click_counts = lambda_function.ClickCounter(interval=60, threshold=3, max_links=10, max_writes=2)
+        patcher = mock.patch.object(lambda_function, 'click_counts', self.click_counts)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        for url_id in ('a1b2c3d', 'b1b2c3d', 'c1b2c3d'):
+            self.storage.items[url_id] = 'https://www.example.com/' + url_id
+
+    def redirect(self, url_id):
+        self.assertEqual(301, self.invoke({'httpMethod': 'GET', 'resource': '/' + url_id})['statusCode'])
+
+    def test_flush_capped(self):
+        """Verify that one invocation writes at most 'max_writes' links, and the next one writes the rest.
+        """
+
+        self.redirect('a1b2c3d')
+        self.redirect('b1b2c3d')
+        self.assertEqual({}, self.storage.clicks)
+
+        self.redirect('c1b2c3d')
+        self.assertEqual({'a1b2c3d': 1, 'b1b2c3d': 1}, self.storage.clicks)
+        self.assertEqual({'c1b2c3d': 1}, self.click_counts.counts)
+
+        self.assertEqual(404, self.invoke({'httpMethod': 'GET', 'resource': '/d1b2c3d'})['statusCode'])
+        self.assertEqual({'a1b2c3d': 1, 'b1b2c3d': 1, 'c1b2c3d': 1}, self.storage.clicks)
+        self.assertEqual({'Pending': 0, 'Links': 0, 'Written': 3, 'Dropped': 0}, self.click_counts.stats())
+
+    def test_flush_failed(self):
+        """Verify that the clicks of a failed write are restored, and written by a later invocation.
+        """
+
+        with mock.patch.object(self.storage, 'add_clicks', side_effect=RuntimeError('Throttled')):
+            for _ in range(3):
+                self.redirect('a1b2c3d')
+
+        self.assertEqual({}, self.storage.clicks)
+        self.assertEqual({'Pending': 3, 'Links': 1, 'Written': 0, 'Dropped': 0}, self.click_counts.stats())
+
+        self.redirect('a1b2c3d')
+        self.assertEqual({'a1b2c3d': 4}, self.storage.clicks)
+        self.assertEqual(4, self.click_counts.written)
+
+    def test_flush_force(self):
+        """Verify that a forced write takes every waiting link.
+        """
+
+        self.redirect('a1b2c3d')
+        self.redirect('b1b2c3d')
+        lambda_function.router.dynamodb.flush_clicks(force=True)
+
+        self.assertEqual({'a1b2c3d': 1, 'b1b2c3d': 1}, self.storage.clicks)
+        self.assertEqual(0, self.click_counts.pending)
+
+
+class TestAcceptedEncoding(unittest.TestCase):
+    """Test the selection of the content encoding of a response.
+    """
+
+    def test_accepted_encoding(self):
+        """Verify the preferred encoding, and that an explicit quality value of zero is not overridden by '*'.
+        """
+
+        available = {'identity': None, 'gzip': None, 'br': None}
+        gzip_only = {'identity': None, 'gzip': None}
+        cases = [
+            (available, '', 'identity'),
+            (available, 'gzip', 'gzip'),
+            (available, 'gzip, br', 'br'),
+            (available, 'GZIP;Q=1.0', 'gzip'),
+            (available, 'br;q=0, gzip;q=0.5', 'gzip'),
+            (available, 'gzip;q=0.000', 'identity'),
+            (available, '*', 'br'),
+            (available, 'br;q=0, *', 'gzip'),
+            (available, 'br; level=4; q=0, *;q=0.1', 'gzip'),
+            (gzip_only, 'gzip;q=0, *', 'identity'),
+            (gzip_only, '*, gzip;q=0', 'identity'),
+            (gzip_only, '*;q=0, gzip', 'gzip'),
+            (gzip_only, 'br', 'identity')
+        ]
+
+        for available_encodings, accept_encoding, expected in cases:
+            with self.subTest(accept_encoding=accept_encoding, available=sorted(available_encodings)):
+                self.assertEqual(expected, lambda_function.accepted_encoding(accept_encoding, available_encodings))
+
+
+class TestErrorPages(FunctionTestCase):
+    """Test the error pages, which are rendered once per container.
+    """
+
+    def test_compressed(self):
+        """Verify that error pages that are smaller compressed are sent compressed, to the clients that accept it.
+        """
+
+        body = '<html><body>{0} - {1}' + ' ' * 1000 + '</body></html>'
+
+        with mock.patch.object(lambda_function, 'COMPRESS_ERROR_PAGES', True), \
+                mock.patch.object(lambda_function, 'ERROR_PAGE_BODY', body), \
+                mock.patch.object(lambda_function, 'brotli', None):
+            apigw = lambda_function.APIGWProxy(lambda_function.log)
+
+        response = apigw.status_404('gzip, deflate')
+
+        self.assertTrue(response['isBase64Encoded'])
+        self.assertEqual('gzip', response['headers']['Content-Encoding'])
+        self.assertEqual('Accept-Encoding', response['headers']['Vary'])
+        self.assertEqual(body.format(404, 'Page Not Found'), gzip.decompress(b64decode(response['body'])).decode())
+
+        for accept_encoding in (None, 'br', 'gzip;q=0, *'):
+            with self.subTest(accept_encoding=accept_encoding):
+                response = apigw.status_404(accept_encoding)
+
+                self.assertNotIn('Content-Encoding', response['headers'])
+                self.assertEqual('Accept-Encoding', response['headers']['Vary'])
+                self.assertEqual(body.format(404, 'Page Not Found'), response['body'])
+
+    def test_uncompressed(self):
+        """Verify that the error pages are sent uncompressed by default, without a Vary header.
+        """
+
+        response = self.invoke({'httpMethod': 'GET', 'resource': '/z9z9z9z', 'headers': {'Accept-Encoding': 'gzip'}})
+
+        self.assertEqual(404, response['statusCode'])
+        self.assertNotIn('Content-Encoding', response['headers'])
+        self.assertNotIn('Vary', response['headers'])
+
+
+if __name__ == '__main__':
+    unittest.main()